@@ -0,0 +1,34 @@
+"""Lazy loading of package attributes (PEP 562)
+
+Package ``__init__`` modules map their public names to the submodules defining them, the submodule is
+imported on first access so importing the package does not pull in the dependencies of all of them::
+
+    __getattr__, __dir__ = lazy_attributes(__name__, {"get_session": ".session"})
+
+Keep the eager imports under ``if TYPE_CHECKING:`` so that type checkers and IDEs see the names.
+"""
+
+from typing import Any, Callable, List, Mapping, Tuple
+import importlib
+import sys
+
+
+def lazy_attributes(
+    package: str, attributes: Mapping[str, str]
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """Module __getattr__ and __dir__ for package, attributes maps names to (relative) module names"""
+    namespace = sys.modules[package].__dict__
+
+    def __getattr__(name: str) -> Any:  # pylint: disable=C0103
+        module = attributes.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module, package), name)
+        # Cache so that __getattr__ is not called again for this name
+        namespace[name] = value
+        return value
+
+    def __dir__() -> List[str]:  # pylint: disable=C0103
+        return sorted(set(namespace) | set(attributes))
+
+    return __getattr__, __dir__
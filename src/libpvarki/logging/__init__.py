@@ -1,15 +1,41 @@
 """Logging helpers"""
 
-from typing import Dict, Any, cast
+from typing import TYPE_CHECKING, Dict, Any, Mapping, Optional, Union, cast
+from pathlib import Path
 import logging
 import logging.config
 import copy
 import os
 import json
+import sys
 
 
 from .common import DEFAULT_LOGGING_CONFIG, UTCISOFormatter, DEFAULT_LOG_FORMAT, AddExtrasFilter
 from .levels import add_logging_level
+from .ecs import ECSFormatter
+from .labels import set_global_labels, install_label_factory, bind_labels, reset_labels, labels_context
+from .structured import get_logger, Lazy, StructuredLogger
+from .._lazy import lazy_attributes
+
+if TYPE_CHECKING:
+    from .ratelimit import RateLimitFilter
+    from .flightrecorder import FlightRecorderHandler, dump_flight_recorders
+    from .audit import AuditLogHandler, iter_audit_records
+    from .multiprocess import AggregatingHandler, start_aggregator
+
+# The optional handlers and their dependencies are imported when used
+__getattr__, __dir__ = lazy_attributes(
+    __name__,
+    {
+        "RateLimitFilter": ".ratelimit",
+        "FlightRecorderHandler": ".flightrecorder",
+        "dump_flight_recorders": ".flightrecorder",
+        "AuditLogHandler": ".audit",
+        "iter_audit_records": ".audit",
+        "AggregatingHandler": ".multiprocess",
+        "start_aggregator": ".multiprocess",
+    },
+)
 
 
 def add_trace_and_audit() -> None:
@@ -18,27 +44,109 @@ def add_trace_and_audit() -> None:
     add_logging_level("AUDIT", logging.CRITICAL + 5)
 
 
-def init_logging(level: int = logging.INFO) -> None:
-    """Initialize logging, call this if you don't know any better logging arrangements"""
+def _close_ratelimit_filters() -> None:
+    """Log what the rate limiters of the handlers about to be replaced still hold, handlers don't close filters"""
+    ratelimit = sys.modules.get(f"{__name__}.ratelimit")
+    if ratelimit is None:
+        return
+    for handler in logging.getLogger().handlers:
+        for old in handler.filters:
+            if isinstance(old, ratelimit.RateLimitFilter):
+                old.close()
+
+
+def init_logging(  # pylint: disable=R0914
+    level: int = logging.INFO,
+    *,
+    ratelimit: Optional[Mapping[str, Any]] = None,
+    flight_recorder: Optional[int] = None,
+    audit_dir: Optional[Union[str, Path]] = None,
+    aggregator_socket: Optional[Union[str, Path]] = None,
+) -> None:
+    """Initialize logging, call this if you don't know any better logging arrangements
+
+    ratelimit is a mapping of RateLimitFilter arguments, if given (or ENV LOG_RATELIMIT_JSON is set) the
+    console handler will rate-limit repeated records and sample low-level ones
+
+    flight_recorder is the number of records below level to keep in memory (ENV LOG_FLIGHT_RECORDER_SIZE),
+    they are output when an ERROR (or worse) is logged or dump_flight_recorders() is called
+
+    audit_dir (ENV LOG_AUDIT_DIR) enables durable AuditLogHandler for AUDIT records in that directory
+
+    aggregator_socket (ENV LOG_AGGREGATOR_SOCKET) makes the console handler send the formatted records to the
+    log aggregator (see start_aggregator) listening on that unix socket instead of writing to stdout directly"""
     labels_json = os.environ.get("LOG_GLOBAL_LABELS_JSON")
+    ratelimit_json = os.environ.get("LOG_RATELIMIT_JSON")
+    if flight_recorder is None:
+        flight_recorder = int(os.environ.get("LOG_FLIGHT_RECORDER_SIZE", "0"))
+    if audit_dir is None:
+        audit_dir = os.environ.get("LOG_AUDIT_DIR") or None
+    if aggregator_socket is None:
+        aggregator_socket = os.environ.get("LOG_AGGREGATOR_SOCKET") or None
     console_formatter = os.environ.get("LOG_CONSOLE_FORMATTER", "ecs")
     config = cast(Dict[str, Any], copy.deepcopy(DEFAULT_LOGGING_CONFIG))
-    # If we have the labels env set, apply filter that sets these labels to all log records
-    if labels_json:
-        config["filters"] = {
-            "global_labels": {
-                "()": AddExtrasFilter,
-                "extras": json.loads(labels_json),
-            },
-        }
-        for key in config["handlers"]:
-            if "filters" not in config["handlers"][key]:
-                config["handlers"][key]["filters"] = []
-            config["handlers"][key]["filters"].append("global_labels")
+    # Global labels are attached once per record by the record factory, not by a filter on every handler
+    set_global_labels(json.loads(labels_json) if labels_json else None)
+    install_label_factory()
+    if ratelimit is None and ratelimit_json:
+        ratelimit = json.loads(ratelimit_json)
+    if ratelimit is not None:
+        from .ratelimit import RateLimitFilter  # pylint: disable=C0415,W0621
+
+        config["filters"] = {"ratelimit": {"()": RateLimitFilter, **ratelimit}}
+        config["handlers"]["console"]["filters"] = ["ratelimit"]
     # Set root loglevel to desired
     config["root"]["level"] = level
     config["handlers"]["console"]["formatter"] = console_formatter
+    if aggregator_socket:
+        # Workers send their lines to the single writer process instead of writing to stdout themselves
+        from .multiprocess import AggregatingHandler  # pylint: disable=C0415,W0621
+
+        console = config["handlers"]["console"]
+        del console["class"]
+        console["()"] = AggregatingHandler
+        console["socket_path"] = str(aggregator_socket)
+    if audit_dir:
+        from .audit import AuditLogHandler  # pylint: disable=C0415,W0621
+
+        config["handlers"]["audit"] = {"()": AuditLogHandler, "directory": audit_dir, "formatter": "ecs"}
+        config["root"]["handlers"].append("audit")
+    record_level = getattr(logging, "TRACE", logging.DEBUG)
+    if flight_recorder and level > record_level:
+        # Let the low-level records through to the recorder, the console still only gets the desired level
+        config["root"]["level"] = record_level
+        config["handlers"]["console"]["level"] = level
+    _close_ratelimit_filters()
     logging.config.dictConfig(config)
+    if flight_recorder and level > record_level:
+        from .flightrecorder import FlightRecorderHandler  # pylint: disable=C0415,W0621
+
+        root = logging.getLogger()
+        console = next(handler for handler in root.handlers if handler.name == "console")
+        # First so the context is output before the record that triggered the dump
+        root.handlers.insert(0, FlightRecorderHandler(flight_recorder, console, record_below=level))
 
 
-__all__ = ["DEFAULT_LOG_FORMAT", "UTCISOFormatter", "DEFAULT_LOGGING_CONFIG", "init_logging", "add_trace_and_audit"]
+__all__ = [
+    "DEFAULT_LOG_FORMAT",
+    "UTCISOFormatter",
+    "ECSFormatter",
+    "DEFAULT_LOGGING_CONFIG",
+    "init_logging",
+    "add_trace_and_audit",
+    "AddExtrasFilter",
+    "set_global_labels",
+    "bind_labels",
+    "reset_labels",
+    "labels_context",
+    "RateLimitFilter",
+    "FlightRecorderHandler",
+    "dump_flight_recorders",
+    "AuditLogHandler",
+    "iter_audit_records",
+    "get_logger",
+    "Lazy",
+    "StructuredLogger",
+    "AggregatingHandler",
+    "start_aggregator",
+]
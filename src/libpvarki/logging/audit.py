@@ -0,0 +1,372 @@
+"""Durable, batched sink for AUDIT records
+
+Records are appended to segment files in a directory with group commit: a writer thread collects the records
+of all callers and writes + fsyncs them in one go once batch_size records are pending or commit_interval has
+passed since the first one. Callers block until their record is durable (unless wait_for_commit=False) so a
+returned logging call means the audit record is on disk, but the fsync cost is shared by the whole batch.
+
+Every record is framed as::
+
+    <payload length, 8 hex digits> <CRC32 of payload, 8 hex digits> <payload>\\n
+
+so a torn write at the end of a segment (crash mid-batch) is detected and truncated away when the handler
+is started again, :py:func:`iter_audit_records` verifies the checksums when reading. A failed write while
+running is cut away right away (or the writer moves on to a new segment) so later records are not stuck behind
+a torn frame. Every caller whose record was in a failed batch gets the error (through handleError), the failed
+records and batches are also counted in :py:meth:`AuditLogHandler.stats`.
+"""
+
+from typing import Deque, Dict, Iterator, List, Optional, Tuple, Union
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+import logging
+import os
+import threading
+import time
+import zlib
+
+from .ecs import ECSFormatter
+
+LOGGER = logging.getLogger(__name__)
+SEGMENT_PREFIX = "audit-"
+SEGMENT_SUFFIX = ".log"
+HEADER_SIZE = 18  # 8 hex length + space + 8 hex crc + space
+LATENCY_WINDOW = 4096
+_fsync = getattr(os, "fdatasync", os.fsync)
+
+
+def encode_frame(payload: bytes) -> bytes:
+    """Frame a record"""
+    return b"%08x %08x " % (len(payload), zlib.crc32(payload)) + payload + b"\n"
+
+
+def _read_frames(path: Path) -> Tuple[List[bytes], int]:
+    """Read valid frames from a segment, returns the payloads and the offset where valid data ends"""
+    data = path.read_bytes()
+    payloads = []
+    offset = 0
+    while offset + HEADER_SIZE <= len(data):
+        try:
+            length = int(data[offset : offset + 8], 16)
+            crc = int(data[offset + 9 : offset + 17], 16)
+        except ValueError:
+            break
+        start = offset + HEADER_SIZE
+        end = start + length
+        if end + 1 > len(data) or data[end : end + 1] != b"\n":
+            break
+        payload = data[start:end]
+        if zlib.crc32(payload) != crc:
+            break
+        payloads.append(payload)
+        offset = end + 1
+    return payloads, offset
+
+
+def segment_paths(directory: Union[str, Path]) -> List[Path]:
+    """Segments in the directory, oldest first"""
+    return sorted(Path(directory).glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+
+def iter_audit_records(directory: Union[str, Path]) -> Iterator[str]:
+    """Read back the audit records, stops at the first corrupt frame of each segment"""
+    for path in segment_paths(directory):
+        payloads, offset = _read_frames(path)
+        if offset != path.stat().st_size:
+            LOGGER.error("Corrupt or truncated audit data in {} at offset {}".format(path, offset))
+        for payload in payloads:
+            yield payload.decode("utf-8")
+
+
+@dataclass(frozen=True)
+class AuditStats:  # pylint: disable=R0902
+    """Throughput and latency figures of the sink"""
+
+    records: int
+    batches: int
+    bytes: int
+    segments: int
+    records_per_second: float
+    mean_batch_size: float
+    latency_p50: float
+    latency_p99: float
+    latency_max: float
+    failed_records: int
+    failed_batches: int
+
+
+class AuditLogHandler(logging.Handler):  # pylint: disable=R0902
+    """Append AUDIT records durably to segment files with group commit"""
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        directory: Union[str, Path],
+        *,
+        level: Optional[int] = None,
+        batch_size: int = 256,
+        commit_interval: float = 0.02,
+        segment_size: int = 64 * 1024 * 1024,
+        wait_for_commit: bool = True,
+    ) -> None:
+        """commit_interval is in seconds, level defaults to AUDIT (or CRITICAL+5 if it's not registered),
+        records are formatted as ECS JSON unless another formatter is set"""
+        super().__init__(level if level is not None else getattr(logging, "AUDIT", logging.CRITICAL + 5))
+        self.formatter = ECSFormatter()
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.segment_size = segment_size
+        self.wait_for_commit = wait_for_commit
+        self._mutex = threading.Lock()
+        self._work = threading.Condition(self._mutex)
+        self._done = threading.Condition(self._mutex)
+        self._pending: List[Tuple[bytes, float]] = []
+        self._first_pending = 0.0
+        self._enqueued = 0
+        self._committed = 0
+        # (first seq, last seq, error) of failed batches not yet seen by all the callers waiting on them
+        self._failed: List[Tuple[int, int, BaseException]] = []
+        # seq -> number of callers waiting for it
+        self._waiting: Dict[int, int] = {}
+        self._closing = False
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._counters: Dict[str, int] = {
+            "records": 0,
+            "batches": 0,
+            "bytes": 0,
+            "segments": 0,
+            "failed_records": 0,
+            "failed_batches": 0,
+        }
+        self._started = time.monotonic()
+        self._fd = -1
+        self._segment_no = 0
+        self._segment_bytes = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._open_segment(recover=True)
+        self._writer = threading.Thread(target=self._run, name="AuditLogWriter", daemon=True)
+        self._writer.start()
+
+    # Segment management, only called from __init__ and the writer thread
+    def _open_segment(self, recover: bool = False) -> None:
+        """Open the latest segment (truncating torn tail) or a new one"""
+        existing = segment_paths(self.directory)
+        if recover and existing:
+            path = existing[-1]
+            self._segment_no = int(path.name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+            _, valid_end = _read_frames(path)
+            if valid_end != path.stat().st_size:
+                LOGGER.warning("Truncating torn audit data in {} at offset {}".format(path, valid_end))
+                os.truncate(path, valid_end)
+        else:
+            self._segment_no += 1
+            path = self.directory / f"{SEGMENT_PREFIX}{self._segment_no:08d}{SEGMENT_SUFFIX}"
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._segment_bytes = os.fstat(self._fd).st_size
+        self._counters["segments"] += 1
+        # Make the new directory entry durable too
+        dirfd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dirfd)
+        finally:
+            os.close(dirfd)
+
+    def _write_batch(self, frames: List[bytes]) -> None:
+        """Write and sync, rotating segments when they grow too large"""
+        if self._fd < 0:
+            self._open_segment()
+        try:
+            self._write_frames(frames)
+        except Exception:
+            self._discard_torn()
+            raise
+
+    def _write_frames(self, frames: List[bytes]) -> None:
+        """See _write_batch"""
+        chunk: List[bytes] = []
+        chunk_size = 0
+        for frame in frames:
+            if chunk and self._segment_bytes + chunk_size + len(frame) > self.segment_size:
+                self._write_chunk(chunk, chunk_size)
+                self._rotate()
+                chunk, chunk_size = [], 0
+            chunk.append(frame)
+            chunk_size += len(frame)
+        if chunk:
+            self._write_chunk(chunk, chunk_size)
+        if self._segment_bytes >= self.segment_size:
+            self._rotate()
+
+    def _write_chunk(self, chunk: List[bytes], size: int) -> None:
+        """Write all of it and fsync"""
+        view = memoryview(b"".join(chunk))
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+        _fsync(self._fd)
+        self._segment_bytes += size
+        self._counters["bytes"] += size
+
+    def _rotate(self) -> None:
+        """Close current segment and start a new one"""
+        os.close(self._fd)
+        self._fd = -1
+        self._open_segment()
+
+    def _discard_torn(self) -> None:
+        """After a failed write cut the segment back to the last synced frame, if that fails start a new segment"""
+        if self._fd >= 0:
+            try:
+                os.ftruncate(self._fd, self._segment_bytes)
+                return
+            except OSError as exc:
+                LOGGER.error("Could not truncate audit segment, starting a new one: {}".format(exc))
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = -1
+        try:
+            self._open_segment()
+        except OSError as exc:
+            # Retried by the next batch
+            LOGGER.error("Could not open a new audit segment: {}".format(exc))
+
+    def _run(self) -> None:
+        """The group commit loop"""
+        while True:
+            with self._mutex:
+                while not self._pending and not self._closing:
+                    self._work.wait()
+                if not self._pending:
+                    return
+                deadline = self._first_pending + self.commit_interval
+                while len(self._pending) < self.batch_size and not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._work.wait(remaining)
+                batch, self._pending = self._pending, []
+                last_seq = self._enqueued
+            try:
+                self._write_batch([frame for frame, _ in batch])
+                failure: Optional[BaseException] = None
+            except Exception as exc:  # pylint: disable=W0703
+                # Anything else would kill this thread and leave the callers waiting forever
+                failure = exc
+            now = time.monotonic()
+            with self._mutex:
+                if failure is not None:
+                    self._failed.append((last_seq - len(batch) + 1, last_seq, failure))
+                    self._counters["failed_records"] += len(batch)
+                    self._counters["failed_batches"] += 1
+                else:
+                    self._latencies.extend(now - enqueued for _, enqueued in batch)
+                    self._counters["records"] += len(batch)
+                    self._counters["batches"] += 1
+                self._committed = last_seq
+                self._prune_failed()
+                self._done.notify_all()
+
+    def _prune_failed(self) -> None:
+        """Forget failed ranges below the lowest seq someone still waits for, call with the mutex held"""
+        if self._failed:
+            lowest = min(self._waiting, default=self._committed + 1)
+            self._failed = [failed for failed in self._failed if failed[1] >= lowest]
+
+    def _enqueue(self, payload: bytes, wait: bool) -> int:
+        """Queue the frame for the writer, returns its sequence number, with wait the caller must _wait_committed"""
+        frame = encode_frame(payload)
+        with self._mutex:
+            if self._closing:
+                raise RuntimeError("Handler is closed")
+            if not self._pending:
+                self._first_pending = time.monotonic()
+            self._pending.append((frame, time.monotonic()))
+            self._enqueued += 1
+            if wait:
+                self._waiting[self._enqueued] = self._waiting.get(self._enqueued, 0) + 1
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._work.notify()
+            return self._enqueued
+
+    def _wait_committed(self, seq: int) -> None:
+        """Block until seq (registered in _waiting) is on disk, raise if the writer failed to write it"""
+        with self._mutex:
+            try:
+                while self._committed < seq:
+                    self._done.wait()
+                for first, last, exc in self._failed:
+                    if first <= seq <= last:
+                        raise exc
+            finally:
+                if self._waiting[seq] == 1:
+                    del self._waiting[seq]
+                else:
+                    self._waiting[seq] -= 1
+                self._prune_failed()
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        """Like the parent but without holding the handler lock while waiting, so callers can share a commit"""
+        passed = self.filter(record)
+        if isinstance(passed, logging.LogRecord):
+            record = passed
+        if passed:
+            self.emit(record)
+        return bool(passed)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Queue the formatted record and wait for it to become durable"""
+        try:
+            seq = self._enqueue(self.format(record).encode("utf-8"), self.wait_for_commit)
+            if self.wait_for_commit:
+                self._wait_committed(seq)
+        except Exception:  # pylint: disable=W0703
+            self.handleError(record)
+
+    def flush(self) -> None:
+        """Wait until everything queued so far is durable"""
+        with self._mutex:
+            seq = self._enqueued
+            self._waiting[seq] = self._waiting.get(seq, 0) + 1
+        self._wait_committed(seq)
+
+    def close(self) -> None:
+        """Commit what is pending, stop the writer and close the segment"""
+        with self._mutex:
+            if self._closing:
+                return
+            self._closing = True
+            self._work.notify()
+        self._writer.join()
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        super().close()
+
+    def stats(self) -> AuditStats:
+        """Throughput, commit latency (seconds, over the last LATENCY_WINDOW records) and failed writes"""
+        with self._mutex:
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+
+        def percentile(fraction: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        return AuditStats(
+            records=counters["records"],
+            batches=counters["batches"],
+            bytes=counters["bytes"],
+            segments=counters["segments"],
+            records_per_second=counters["records"] / elapsed,
+            mean_batch_size=counters["records"] / counters["batches"] if counters["batches"] else 0.0,
+            latency_p50=percentile(0.5),
+            latency_p99=percentile(0.99),
+            latency_max=latencies[-1] if latencies else 0.0,
+            failed_records=counters["failed_records"],
+            failed_batches=counters["failed_batches"],
+        )
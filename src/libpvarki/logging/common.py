@@ -1,6 +1,6 @@
 """Things common for all handlers"""
 
-from typing import Optional, Mapping, Any
+from typing import Optional, Mapping, Any, Dict, Tuple, Literal
 import logging.config
 import time
 import datetime
@@ -9,12 +9,72 @@ import datetime
 import ecs_logging
 
 
+class TimestampPrefixCache:  # pylint: disable=R0903
+    """Format the whole-second part of UTC timestamps only once per second
+
+    Timestamps of consecutive records nearly always share the same second so we keep the last formatted value
+    around. The cache is a single tuple that is swapped atomically so this is safe to share between threads."""
+
+    __slots__ = ("datefmt", "_cached")
+
+    def __init__(self, datefmt: str = "%Y-%m-%dT%H:%M:%S") -> None:
+        """datefmt must not contain sub-second directives"""
+        if "%f" in datefmt:
+            raise ValueError("Sub-second directives cannot be cached")
+        self.datefmt = datefmt
+        self._cached: Tuple[int, str] = (-1, "")
+
+    def __call__(self, seconds: int) -> str:
+        """Return the formatted timestamp for the given second"""
+        cached = self._cached
+        if cached[0] == seconds:
+            return cached[1]
+        formatted = (
+            datetime.datetime.fromtimestamp(seconds, tz=datetime.timezone.utc)
+            .strftime(self.datefmt)
+            .replace("+00:00", "Z")
+        )
+        self._cached = (seconds, formatted)
+        return formatted
+
+
 class UTCISOFormatter(logging.Formatter):
-    """Output timestamps in UTC ISO timestamps"""
+    """Output timestamps in UTC ISO timestamps
+
+    By default the formatted second is cached and only the milliseconds are added per record, set
+    cache_timestamps=False to format the full datetime for every record."""
 
     converter = time.gmtime  # type: ignore[assignment]  # false positive
 
+    def __init__(  # pylint: disable=R0913
+        self,
+        fmt: Optional[str] = None,
+        datefmt: Optional[str] = None,
+        style: Literal["%", "{", "$"] = "%",
+        validate: bool = True,
+        *,
+        cache_timestamps: bool = True,
+    ) -> None:
+        """init"""
+        super().__init__(fmt=fmt, datefmt=datefmt, style=style, validate=validate)
+        self._prefix_caches: Dict[Optional[str], TimestampPrefixCache] = {}
+        self.cache_timestamps = cache_timestamps
+
     def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        if self.cache_timestamps and not (datefmt and "%f" in datefmt):
+            # Round to microseconds the same way datetime.fromtimestamp does
+            seconds = int(record.created)
+            micros = round((record.created - seconds) * 1_000_000)
+            if micros >= 1_000_000:
+                seconds += 1
+                micros -= 1_000_000
+            try:
+                cache = self._prefix_caches[datefmt]
+            except KeyError:
+                cache = self._prefix_caches.setdefault(datefmt, TimestampPrefixCache(datefmt or "%Y-%m-%dT%H:%M:%S"))
+            if datefmt:
+                return cache(seconds)
+            return "%s.%03dZ" % (cache(seconds), micros // 1000)
         converted = datetime.datetime.fromtimestamp(record.created, tz=datetime.timezone.utc)
         if datefmt:
             formatted = converted.strftime(datefmt)
@@ -31,6 +91,9 @@ DEFAULT_LOGGING_CONFIG = {
     "disable_existing_loggers": False,
     "formatters": {
         "ecs": {
+            "()": "libpvarki.logging.ecs.ECSFormatter",
+        },
+        "ecs_stdlib": {
             "()": ecs_logging.StdlibFormatter,
         },
         "utc": {
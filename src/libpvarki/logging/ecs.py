@@ -0,0 +1,300 @@
+"""Native ECS JSON formatter
+
+Output compatible with :py:class:`ecs_logging.StdlibFormatter` (same fields, same key order) but does a lot less
+work per record: static fragments are encoded once and cached, and the document is assembled from pre-encoded
+pieces instead of de-dotting and merging every field into nested dicts on every call.
+
+If orjson_ is installed it is used for encoding the structured extras.
+
+.. _orjson: https://github.com/ijl/orjson
+"""
+
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+import json
+import logging
+import sys
+import time
+from traceback import format_tb
+
+import ecs_logging
+
+from .common import DEFAULT_RECORD_DIR, TimestampPrefixCache
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+
+ECS_VERSION = ecs_logging.ECS_VERSION
+#: Top level keys the formatter itself produces, extras colliding with these go through the slow path
+BUILTIN_KEYS = frozenset(("ecs.version", "error", "log", "process"))
+#: Elastic APM extras are renamed to standard tracing ECS fields, just like ecs_logging does
+APM_RENAMES = {
+    "elasticapm_span_id": "span.id",
+    "elasticapm_transaction_id": "transaction.id",
+    "elasticapm_trace_id": "trace.id",
+    "elasticapm_service_name": "service.name",
+    "elasticapm_service_environment": "service.environment",
+}
+#: Soft limit for the per call-site caches, they are cleared when full
+FRAGMENT_CACHE_SIZE = 4096
+ORJSON_OPTIONS = (
+    (
+        orjson.OPT_SORT_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_PASSTHROUGH_SUBCLASS
+    )
+    if orjson
+    else 0
+)
+
+
+def _json_fallback(value: Any) -> Any:
+    """Same fallback as ecs_logging uses for things json does not know how to serialize"""
+    try:
+        return value.__structlog__()
+    except AttributeError:
+        return repr(value)
+
+
+def _iter_leaves(key: str, value: Any) -> List[Tuple[str, Any]]:
+    """Flatten mapping values to dotted keys, drop None leaves"""
+    if isinstance(value, Mapping):
+        ret: List[Tuple[str, Any]] = []
+        for subkey, subvalue in value.items():
+            ret += _iter_leaves(f"{key}.{subkey}", subvalue)
+        return ret
+    if value is None:
+        return []
+    return [(key, value)]
+
+
+def _merge_dotted(into: Dict[str, Any], dotted: str, value: Any) -> None:
+    """Set value to the nested position described by dotted key, raise TypeError on conflicts"""
+    path = dotted.split(".")
+    target = into
+    for part in path[:-1]:
+        target = target.setdefault(part, {})
+        if not isinstance(target, dict):
+            raise TypeError(f"Type mismatch at key `{part}` when merging `{dotted}`")
+    if path[-1] in target:
+        raise TypeError(f"Type mismatch at key `{path[-1]}` when merging `{dotted}`")
+    target[path[-1]] = value
+
+
+class ECSFormatter(logging.Formatter):  # pylint: disable=R0902
+    """ECS JSON formatter, drop-in replacement for ecs_logging.StdlibFormatter"""
+
+    converter = time.gmtime  # type: ignore[assignment]  # false positive
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        fmt: Optional[str] = None,
+        datefmt: Optional[str] = None,
+        *,
+        stack_trace_limit: Optional[int] = None,
+        extra: Optional[Mapping[str, Any]] = None,
+        ensure_ascii: bool = True,
+        use_orjson: bool = True,
+    ) -> None:
+        """Init, extra is a mapping of static (dotted) fields to add to all records, for example service labels"""
+        super().__init__(fmt=fmt, datefmt=datefmt)
+        if stack_trace_limit is not None and (not isinstance(stack_trace_limit, int) or stack_trace_limit < 0):
+            raise ValueError("'stack_trace_limit' must be None, or a non-negative integer")
+        self._stack_trace_limit = stack_trace_limit
+        self.ensure_ascii = ensure_ascii
+        self._use_orjson = bool(orjson) and use_orjson
+        self._encode_str: Callable[[str], str] = (
+            json.encoder.encode_basestring_ascii if ensure_ascii else json.encoder.encode_basestring
+        )
+        self._encoder = json.JSONEncoder(
+            sort_keys=True, separators=(",", ":"), default=_json_fallback, ensure_ascii=ensure_ascii
+        )
+        self._ecs_version_fragment = '"ecs.version":' + self._encode_str(ECS_VERSION)
+        self._timestamp_prefix = TimestampPrefixCache()
+        self._level_cache: Dict[str, str] = {}
+        self._log_cache: Dict[Tuple[str, str, Optional[str], int], str] = {}
+        self._process_cache: Dict[Tuple[Optional[str], Optional[int], Optional[str], Optional[int]], str] = {}
+        # Pre-encode the static fields
+        self._static_leaves: List[Tuple[str, Any]] = []
+        for key, value in (extra or {}).items():
+            self._static_leaves += _iter_leaves(key, value)
+        static_tree: Dict[str, Any] = {}
+        for key, value in self._static_leaves:
+            _merge_dotted(static_tree, key, value)
+        if BUILTIN_KEYS.intersection(static_tree):
+            raise ValueError(f"extra must not contain any of {sorted(BUILTIN_KEYS)}")
+        self._static_fragments = {key: self._fragment(key, value) for key, value in static_tree.items()}
+
+    def _dumps(self, value: Any) -> str:
+        """Serialize with orjson if we can, fall back to stdlib json"""
+        if self._use_orjson:
+            try:
+                encoded = orjson.dumps(value, default=_json_fallback, option=ORJSON_OPTIONS).decode("utf-8")
+                if not self.ensure_ascii or encoded.isascii():
+                    return encoded
+            except TypeError:  # orjson.JSONEncodeError is a TypeError, things like huge ints and non-str keys
+                pass
+        return self._encoder.encode(value)
+
+    def _fragment(self, key: str, value: Any) -> str:
+        """Encode a top-level "key":value pair"""
+        return self._encode_str(key) + ":" + self._dumps(value)
+
+    def _cached_level(self, record: logging.LogRecord) -> str:
+        """JSON encoded lowercase level name"""
+        try:
+            return self._level_cache[record.levelname]
+        except KeyError:
+            encoded = self._encode_str(record.levelname.lower())
+            self._level_cache[record.levelname] = encoded
+            return encoded
+
+    def _cached_log_prefix(self, record: logging.LogRecord) -> str:
+        """The "log" object up to the original message, depends only on logger name and call site"""
+        key = (record.name, record.filename, record.funcName, record.lineno)
+        try:
+            return self._log_cache[key]
+        except KeyError:
+            if len(self._log_cache) >= FRAGMENT_CACHE_SIZE:
+                self._log_cache.clear()
+            origin: Dict[str, Any] = {"file": {"line": record.lineno, "name": record.filename}}
+            if record.funcName is not None:
+                origin["function"] = record.funcName
+            encoded = (
+                '"log":{"logger":' + self._encode_str(record.name) + ',"origin":' + self._dumps(origin) + ',"original":'
+            )
+            self._log_cache[key] = encoded
+            return encoded
+
+    def _cached_process(self, record: logging.LogRecord) -> str:
+        """The "process" object, depends only on process and thread"""
+        key = (record.processName, record.process, record.threadName, record.thread)
+        try:
+            return self._process_cache[key]
+        except KeyError:
+            if len(self._process_cache) >= FRAGMENT_CACHE_SIZE:
+                self._process_cache.clear()
+            encoded = self._fragment("process", self._process_dict(record))
+            self._process_cache[key] = encoded
+            return encoded
+
+    @staticmethod
+    def _process_dict(record: logging.LogRecord) -> Dict[str, Any]:
+        """The process fields, None values dropped"""
+        thread = {
+            key: value for key, value in (("id", record.thread), ("name", record.threadName)) if value is not None
+        }
+        process: Dict[str, Any] = {
+            key: value for key, value in (("name", record.processName), ("pid", record.process)) if value is not None
+        }
+        if thread:
+            process["thread"] = thread
+        return process
+
+    def _record_timestamp(self, record: logging.LogRecord) -> str:
+        """ISO timestamp with milliseconds"""
+        return "%s.%03dZ" % (self._timestamp_prefix(int(record.created)), record.msecs)
+
+    def _record_error(self, record: logging.LogRecord) -> Optional[Dict[str, Any]]:
+        """Error fields from exc_info and stack_info"""
+        error: Dict[str, Any] = {}
+        exc_info = record.exc_info
+        if exc_info:
+            if isinstance(exc_info, bool):
+                exc_info = sys.exc_info()
+            if isinstance(exc_info, (list, tuple)):
+                if exc_info[0] is not None:
+                    error["type"] = exc_info[0].__name__
+                if exc_info[1]:
+                    error["message"] = str(exc_info[1])
+        if (
+            exc_info
+            and isinstance(exc_info, (list, tuple))
+            and exc_info[2] is not None
+            and (self._stack_trace_limit is None or self._stack_trace_limit > 0)
+        ):
+            stack_trace = "".join(format_tb(exc_info[2], limit=self._stack_trace_limit))
+            if stack_trace:
+                error["stack_trace"] = stack_trace
+        elif record.stack_info:
+            error["stack_trace"] = str(record.stack_info)
+        return error or None
+
+    def _extra_leaves(self, record: logging.LogRecord) -> List[Tuple[str, Any]]:
+        """Extras given to the logging call (or added by filters and factories) as dotted leaves"""
+        available = record.__dict__
+        leaves: List[Tuple[str, Any]] = []
+        for key in available.keys() - DEFAULT_RECORD_DIR:
+            if key.startswith("elasticapm_labels."):
+                continue
+            leaves += _iter_leaves(APM_RENAMES.get(key, key), available[key])
+        return leaves
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format the record as ECS JSON"""
+        message = record.getMessage()
+        record.message = message
+        encoded_message = self._encode_str(message)
+        prefix = (
+            '{"@timestamp":"'
+            + self._record_timestamp(record)
+            + '","log.level":'
+            + self._cached_level(record)
+            + ',"message":'
+            + encoded_message
+            + ","
+        )
+
+        error = self._record_error(record) if record.exc_info or record.stack_info else None
+        leaves = self._extra_leaves(record)
+        fragments = {
+            "ecs.version": self._ecs_version_fragment,
+            "log": self._cached_log_prefix(record) + encoded_message + "}",
+            "process": self._cached_process(record),
+        }
+        if error:
+            fragments["error"] = self._fragment("error", error)
+        if not leaves:
+            fragments.update(self._static_fragments)
+            return prefix + ",".join(fragments[key] for key in sorted(fragments)) + "}"
+
+        tree: Dict[str, Any] = {}
+        for key, value in leaves:
+            _merge_dotted(tree, key, value)
+        if BUILTIN_KEYS.intersection(tree):
+            return prefix + self._dumps(self._full_document(record, message, error, leaves))[1:]
+        for key, value in self._static_leaves:
+            if key.split(".", 1)[0] in tree:
+                _merge_dotted(tree, key, value)
+        for key, fragment in self._static_fragments.items():
+            if key not in tree:
+                fragments[key] = fragment
+        for key, value in tree.items():
+            fragments[key] = self._fragment(key, value)
+        return prefix + ",".join(fragments[key] for key in sorted(fragments)) + "}"
+
+    def _full_document(
+        self,
+        record: logging.LogRecord,
+        message: str,
+        error: Optional[Dict[str, Any]],
+        leaves: List[Tuple[str, Any]],
+    ) -> Dict[str, Any]:
+        """Build the whole document (sans the ordered first keys) as nested dicts, used when extras
+        need to be merged into the fields we produce ourselves"""
+        origin: Dict[str, Any] = {"file": {"line": record.lineno, "name": record.filename}}
+        if record.funcName is not None:
+            origin["function"] = record.funcName
+        result: Dict[str, Any] = {
+            "ecs.version": ECS_VERSION,
+            "log": {"logger": record.name, "origin": origin, "original": message},
+            "process": self._process_dict(record),
+        }
+        if error:
+            result["error"] = error
+        for key, value in leaves + self._static_leaves:
+            _merge_dotted(result, key, value)
+        return result
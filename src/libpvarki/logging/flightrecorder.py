@@ -0,0 +1,164 @@
+"""In-memory flight recorder for low-level log records
+
+Keeps the last N records below the emitting level (TRACE/DEBUG in production) in a preallocated ring buffer
+as compact unformatted tuples. Nothing is formatted unless the buffer is dumped, which happens when a record at
+or above trigger_level (ERROR, CRITICAL and AUDIT by default) passes through the handler, or when
+:py:func:`dump_flight_recorders` is called.
+
+NOTE: Messages are formatted at dump time, mutable objects passed as arguments are formatted as they are then.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import operator
+import weakref
+
+from .common import DEFAULT_RECORD_DIR
+
+#: Record attributes we keep, in this order
+CAPTURED_ATTRIBUTES = (
+    "created",
+    "name",
+    "levelno",
+    "pathname",
+    "lineno",
+    "funcName",
+    "msg",
+    "args",
+    "exc_info",
+    "stack_info",
+    "thread",
+    "threadName",
+    "process",
+    "processName",
+)
+_capture = operator.attrgetter(*CAPTURED_ATTRIBUTES)
+#: Dumped records get this attribute set to True
+DUMPED_ATTRIBUTE = "flight_recorder"
+_RECORDERS: "weakref.WeakSet[FlightRecorderHandler]" = weakref.WeakSet()
+
+
+class FlightRecorderHandler(logging.Handler):
+    """Ring buffer of low-level records, dumped to target when something goes wrong"""
+
+    def __init__(
+        self,
+        capacity: int = 1000,
+        target: Optional[logging.Handler] = None,
+        *,
+        record_below: int = logging.INFO,
+        trigger_level: int = logging.ERROR,
+    ) -> None:
+        """Records with level below record_below are kept, records at or above trigger_level trigger a dump"""
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        super().__init__(logging.NOTSET)
+        self.capacity = capacity
+        self.target = target
+        self.record_below = record_below
+        self.trigger_level = trigger_level
+        self._buffer: List[Optional[Tuple[Tuple[Any, ...], Optional[Dict[str, Any]]]]] = [None] * capacity
+        self._next = 0
+        self._count = 0
+        _RECORDERS.add(self)
+
+    def __len__(self) -> int:
+        """Number of records in the buffer"""
+        return self._count
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Store low-level records, dump on trigger level"""
+        if record.levelno < self.record_below:
+            available = record.__dict__
+            extra_keys = available.keys() - DEFAULT_RECORD_DIR
+            self._buffer[self._next] = (
+                _capture(record),
+                {key: available[key] for key in extra_keys} if extra_keys else None,
+            )
+            self._next = (self._next + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+        elif record.levelno >= self.trigger_level:
+            self._dump_locked(self.target)
+
+    def snapshot(self) -> List[logging.LogRecord]:
+        """Rebuild the buffered records (oldest first) without clearing the buffer"""
+        with self.lock:  # type: ignore[union-attr]  # created in __init__
+            return [self._rebuild(entry) for entry in self._entries()]
+
+    def dump(self, target: Optional[logging.Handler] = None) -> int:
+        """Send the buffered records to target (or the configured one) and clear the buffer, returns count"""
+        with self.lock:  # type: ignore[union-attr]  # created in __init__
+            return self._dump_locked(target or self.target)
+
+    def clear(self) -> None:
+        """Drop everything"""
+        with self.lock:  # type: ignore[union-attr]  # created in __init__
+            self._clear_locked()
+
+    def _entries(self) -> List[Tuple[Tuple[Any, ...], Optional[Dict[str, Any]]]]:
+        """Buffered entries oldest first, call with lock held"""
+        start = (self._next - self._count) % self.capacity
+        entries = []
+        for idx in range(self._count):
+            entry = self._buffer[(start + idx) % self.capacity]
+            assert entry is not None  # nosec
+            entries.append(entry)
+        return entries
+
+    def _clear_locked(self) -> None:
+        """Reset the ring, call with lock held"""
+        for idx in range(self.capacity):
+            self._buffer[idx] = None
+        self._next = 0
+        self._count = 0
+
+    def _dump_locked(self, target: Optional[logging.Handler]) -> int:
+        """Dump, call with lock held"""
+        if target is None or not self._count:
+            return 0
+        entries = self._entries()
+        self._clear_locked()
+        for entry in entries:
+            target.handle(self._rebuild(entry))
+        return len(entries)
+
+    @staticmethod
+    def _rebuild(entry: Tuple[Tuple[Any, ...], Optional[Dict[str, Any]]]) -> logging.LogRecord:
+        """Make a LogRecord out of the compact tuple"""
+        values, extras = entry
+        fields = dict(zip(CAPTURED_ATTRIBUTES, values))
+        # Use the constructor directly, the record factory could add labels of the current context
+        record = logging.LogRecord(
+            fields["name"],
+            fields["levelno"],
+            fields["pathname"],
+            fields["lineno"],
+            fields["msg"],
+            fields["args"],
+            fields["exc_info"],
+            fields["funcName"],
+            fields["stack_info"],
+        )
+        created = fields["created"]
+        record.created = created
+        record.msecs = int((created - int(created)) * 1000) + 0.0
+        record.relativeCreated = (created - logging._startTime) * 1000  # type: ignore[attr-defined]  # pylint: disable=W0212
+        for key in ("thread", "threadName", "process", "processName"):
+            setattr(record, key, fields[key])
+        if extras:
+            record.__dict__.update(extras)
+        setattr(record, DUMPED_ATTRIBUTE, True)
+        return record
+
+    def close(self) -> None:
+        """Forget the target"""
+        with self.lock:  # type: ignore[union-attr]  # created in __init__
+            self.target = None
+        _RECORDERS.discard(self)
+        super().close()
+
+
+def dump_flight_recorders() -> int:
+    """Dump all live flight recorders to their targets, returns number of records dumped"""
+    return sum(recorder.dump() for recorder in list(_RECORDERS))
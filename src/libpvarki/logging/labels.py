@@ -0,0 +1,92 @@
+"""Attach labels to log records when they are created
+
+Global labels (like the ones from LOG_GLOBAL_LABELS_JSON) and per-context labels (request id, user CN etc.)
+are added once per record when the record is made (``Logger.makeRecord`` is wrapped) instead of by a filter on
+every handler.
+
+Per-context labels live in a :py:class:`contextvars.ContextVar` so they follow asyncio tasks::
+
+    with labels_context({"http.request.id": request_id, "user.name": certdn["CN"]}):
+        LOGGER.info("Handling request")
+
+Extras given to the logging call win over the labels with the same key, context labels win over global ones.
+"""
+
+from typing import Any, Callable, Iterator, Mapping, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from types import MappingProxyType
+import logging
+import threading
+
+EMPTY_LABELS: Mapping[str, Any] = MappingProxyType({})
+CONTEXT_LABELS: ContextVar[Mapping[str, Any]] = ContextVar("libpvarki_log_labels", default=EMPTY_LABELS)
+_GLOBAL_LABELS: Mapping[str, Any] = EMPTY_LABELS
+_ORIGINAL_MAKE_RECORD: Optional[Callable[..., logging.LogRecord]] = None
+_INSTALL_LOCK = threading.Lock()
+
+
+def set_global_labels(labels: Optional[Mapping[str, Any]]) -> None:
+    """Set (replace) the labels added to all records, None or empty mapping removes them"""
+    global _GLOBAL_LABELS  # pylint: disable=W0603
+    _GLOBAL_LABELS = MappingProxyType(dict(labels)) if labels else EMPTY_LABELS
+
+
+def get_global_labels() -> Mapping[str, Any]:
+    """Get the current global labels"""
+    return _GLOBAL_LABELS
+
+
+def bind_labels(labels: Mapping[str, Any]) -> Token[Mapping[str, Any]]:
+    """Add labels to the current context, returns token for :py:func:`reset_labels`"""
+    merged = dict(CONTEXT_LABELS.get())
+    merged.update(labels)
+    return CONTEXT_LABELS.set(MappingProxyType(merged))
+
+
+def reset_labels(token: Token[Mapping[str, Any]]) -> None:
+    """Restore the context labels to what they were before :py:func:`bind_labels`"""
+    CONTEXT_LABELS.reset(token)
+
+
+@contextmanager
+def labels_context(labels: Mapping[str, Any]) -> Iterator[None]:
+    """Context manager for binding labels for the duration of the block"""
+    token = bind_labels(labels)
+    try:
+        yield None
+    finally:
+        reset_labels(token)
+
+
+def _make_labelled_record(self: logging.Logger, *args: Any, **kwargs: Any) -> logging.LogRecord:
+    """Make the record (extras included) with the original makeRecord, then add the labels it does not have"""
+    assert _ORIGINAL_MAKE_RECORD is not None  # nosec
+    record = _ORIGINAL_MAKE_RECORD(self, *args, **kwargs)
+    context_labels = CONTEXT_LABELS.get()
+    if not _GLOBAL_LABELS and not context_labels:
+        return record
+    attrs = record.__dict__
+    for labels in (context_labels, _GLOBAL_LABELS):
+        for key, value in labels.items():
+            if key not in attrs:
+                attrs[key] = value
+    return record
+
+
+def install_label_factory() -> None:
+    """Wrap Logger.makeRecord with one that adds the labels, safe to call multiple times"""
+    global _ORIGINAL_MAKE_RECORD  # pylint: disable=W0603
+    with _INSTALL_LOCK:
+        if logging.Logger.makeRecord is _make_labelled_record:
+            return
+        _ORIGINAL_MAKE_RECORD = logging.Logger.makeRecord
+        logging.Logger.makeRecord = _make_labelled_record  # type: ignore[method-assign]
+
+
+def uninstall_label_factory() -> None:
+    """Restore the makeRecord we wrapped"""
+    with _INSTALL_LOCK:
+        if logging.Logger.makeRecord is not _make_labelled_record or _ORIGINAL_MAKE_RECORD is None:
+            return
+        logging.Logger.makeRecord = _ORIGINAL_MAKE_RECORD  # type: ignore[method-assign]
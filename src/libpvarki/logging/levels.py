@@ -126,24 +126,21 @@ def add_logging_level(  # pylint: disable=R0912,R0915,R0913,R0914
     # This method was inspired by the answers to Stack Overflow post
     # http://stackoverflow.com/q/2183233/2988730, especially
     # http://stackoverflow.com/a/13638084/2988730
+    # The level is checked first (isEnabledFor caches the result per logger) so that disabled levels cost
+    # the same as a disabled logger.debug() call, the defaults are merged only for records we actually create.
+    defaults = {"exc_info": exc_info, "stack_info": stack_info, "stacklevel": 2}
+
     def for_logger_adapter(self: Any, msg: Any, *args: Any, **kwargs: Any) -> None:
-        kwargs.setdefault("exc_info", exc_info)
-        kwargs.setdefault("stack_info", stack_info)
-        kwargs.setdefault("stacklevel", 2)
-        self.log(level_num, msg, *args, **kwargs)
+        if self.isEnabledFor(level_num):
+            self.log(level_num, msg, *args, **({**defaults, **kwargs} if kwargs else defaults))
 
     def for_logger_class(self: Any, msg: Any, *args: Any, **kwargs: Any) -> None:
         if self.isEnabledFor(level_num):
-            kwargs.setdefault("exc_info", exc_info)
-            kwargs.setdefault("stack_info", stack_info)
-            kwargs.setdefault("stacklevel", 2)
-            self._log(level_num, msg, args, **kwargs)  # pylint: disable=W0212
+            self._log(level_num, msg, args, **({**defaults, **kwargs} if kwargs else defaults))  # pylint: disable=W0212
 
     def for_logging_module(*args: Any, **kwargs: Any) -> None:
-        kwargs.setdefault("exc_info", exc_info)
-        kwargs.setdefault("stack_info", stack_info)
-        kwargs.setdefault("stacklevel", 2)
-        logging.log(level_num, *args, **kwargs)
+        if logging.root.isEnabledFor(level_num):
+            logging.log(level_num, *args, **({**defaults, **kwargs} if kwargs else defaults))
 
     if not method_name:
         method_name = level_name.lower()
@@ -0,0 +1,356 @@
+"""Multi-process safe log aggregation for pre-forked workers
+
+Workers (gunicorn/uvicorn) format their records as usual but instead of writing to stdout themselves they send
+them to a single writer process over a unix socket. The writer is the only one touching stdout so lines from
+different workers never interleave, and both ends batch: a worker sends many records with one syscall and the
+writer outputs everything it has received with one write.
+
+Records are sent as length-prefixed frames::
+
+    <payload length, 4 bytes big-endian> <payload (the formatted line, with newline)>
+
+Start the writer in the master process before the workers are forked (for example in gunicorn's on_starting
+hook) with :py:func:`start_aggregator`, or run ``python -m libpvarki.logging.multiprocess /path/to/socket``.
+The workers then call init_logging with ENV LOG_AGGREGATOR_SOCKET (or ``aggregator_socket`` argument) set.
+If the writer can't be reached the worker writes the lines directly to stderr (each batch with one write).
+"""
+
+from typing import Dict, List, Optional, Union
+from pathlib import Path
+import logging
+import multiprocessing
+import os
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+import weakref
+
+LOGGER = logging.getLogger(__name__)
+FRAME_HEADER = struct.Struct(">I")
+#: Frames larger than this are considered corrupt and the connection is dropped
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+RECV_SIZE = 256 * 1024
+_HANDLERS: "weakref.WeakSet[AggregatingHandler]" = weakref.WeakSet()
+
+
+def encode_frames(payloads: List[bytes]) -> bytes:
+    """Frame the payloads into one buffer"""
+    return b"".join(FRAME_HEADER.pack(len(payload)) + payload for payload in payloads)
+
+
+def _write_all(fileno: int, data: bytes) -> None:
+    """os.write until everything is written"""
+    view = memoryview(data)
+    while view:
+        written = os.write(fileno, view)
+        view = view[written:]
+
+
+class LogAggregator:  # pylint: disable=R0902
+    """The single writer, reads frames from the workers and writes the payloads to output_fd"""
+
+    def __init__(self, socket_path: Union[str, Path], output_fd: Optional[int] = None) -> None:
+        """Bind the socket (removing a stale one), output defaults to stdout"""
+        self.socket_path = str(socket_path)
+        self.output_fd = output_fd if output_fd is not None else sys.stdout.fileno()
+        self.counters: Dict[str, int] = {"connections": 0, "frames": 0, "writes": 0, "bytes": 0, "dropped": 0}
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.socket_path)
+        self._listener.listen(128)
+        self._listener.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._buffers: Dict[socket.socket, bytearray] = {}
+        self._stopping = False
+
+    def serve_forever(self) -> None:
+        """Run until shutdown() is called"""
+        try:
+            while not self._stopping:
+                self._poll(None)
+            # Write out what the workers have already sent
+            while self._poll(0):
+                pass
+        finally:
+            self.close()
+
+    def _poll(self, timeout: Optional[float]) -> bool:
+        """One round of select, returns True if there was something to read"""
+        payloads: List[bytes] = []
+        events = self._selector.select(timeout)
+        for key, _ in events:
+            if key.fileobj is self._listener:
+                self._accept()
+            elif key.fileobj == self._wakeup_r:
+                os.read(self._wakeup_r, 64)
+            else:
+                assert isinstance(key.fileobj, socket.socket)  # nosec
+                self._read(key.fileobj, payloads)
+        if payloads:
+            self._output(payloads)
+        return bool(events)
+
+    def shutdown(self) -> None:
+        """Make serve_forever return (after writing what is already in the socket buffers)"""
+        if self._stopping:
+            return
+        self._stopping = True
+        os.write(self._wakeup_w, b"x")
+
+    def _accept(self) -> None:
+        """New worker connection"""
+        try:
+            conn, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+        conn.setblocking(False)
+        self._buffers[conn] = bytearray()
+        self._selector.register(conn, selectors.EVENT_READ)
+        self.counters["connections"] += 1
+
+    def _drop(self, conn: socket.socket) -> None:
+        """Forget the connection, partial frames are lost"""
+        if self._buffers.pop(conn, None):
+            self.counters["dropped"] += 1
+        self._selector.unregister(conn)
+        conn.close()
+
+    def _read(self, conn: socket.socket, payloads: List[bytes]) -> None:
+        """Read what is available and collect the complete frames"""
+        try:
+            data = conn.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(conn)
+            return
+        buffer = self._buffers[conn]
+        buffer += data
+        offset = 0
+        frames = 0
+        while len(buffer) - offset >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(buffer, offset)
+            if length > MAX_FRAME_SIZE:
+                self._drop(conn)
+                return
+            end = offset + FRAME_HEADER.size + length
+            if end > len(buffer):
+                break
+            payloads.append(bytes(buffer[offset + FRAME_HEADER.size : end]))
+            offset = end
+            frames += 1
+        self.counters["frames"] += frames
+        del buffer[:offset]
+
+    def _output(self, payloads: List[bytes]) -> None:
+        """Write all the lines with one write (unless the OS writes less)"""
+        data = b"".join(payloads)
+        _write_all(self.output_fd, data)
+        self.counters["writes"] += 1
+        self.counters["bytes"] += len(data)
+
+    def close(self) -> None:
+        """Close the sockets and remove the socket file"""
+        for conn in list(self._buffers):
+            self._drop(conn)
+        if self._listener.fileno() >= 0:
+            self._selector.close()
+            self._listener.close()
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+def run_aggregator(socket_path: Union[str, Path], output_fd: Optional[int] = None) -> None:
+    """Serve until terminated"""
+    LogAggregator(socket_path, output_fd).serve_forever()
+
+
+def start_aggregator(socket_path: Union[str, Path], timeout: float = 5.0) -> multiprocessing.Process:
+    """Start the writer in a child process, returns once the socket accepts connections"""
+    process = multiprocessing.Process(
+        target=run_aggregator, args=(str(socket_path),), name="LogAggregator", daemon=True
+    )
+    process.start()
+    deadline = time.monotonic() + timeout
+    while True:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(socket_path))
+            return process
+        except OSError:
+            if time.monotonic() > deadline or not process.is_alive():
+                process.terminate()
+                raise RuntimeError(f"Log aggregator did not start listening on {socket_path}") from None
+            time.sleep(0.01)
+        finally:
+            probe.close()
+
+
+class AggregatingHandler(logging.Handler):  # pylint: disable=R0902
+    """Send formatted records to the LogAggregator in batches"""
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        socket_path: Union[str, Path],
+        *,
+        batch_size: int = 256,
+        flush_interval: float = 0.05,
+        max_buffer: int = 4 * 1024 * 1024,
+        reconnect_interval: float = 1.0,
+        fallback_fd: Optional[int] = None,
+    ) -> None:
+        """flush_interval is the max time (seconds) records wait for the batch to fill, emit blocks (for at most
+        one flush_interval) when max_buffer bytes are pending and drops the record if the writer can't keep up"""
+        super().__init__()
+        self.socket_path = str(socket_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.reconnect_interval = reconnect_interval
+        self.fallback_fd = fallback_fd if fallback_fd is not None else sys.stderr.fileno()
+        self.dropped = 0
+        self._init_state()
+        _HANDLERS.add(self)
+
+    def _init_state(self) -> None:
+        """Buffers, connection and the flusher thread, also called in forked children"""
+        self._mutex = threading.Lock()
+        self._work = threading.Condition(self._mutex)
+        self._drained = threading.Condition(self._mutex)
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self._in_flight = 0
+        self._closing = False
+        self._sock: Optional[socket.socket] = None
+        self._next_connect = 0.0
+        self._flusher = threading.Thread(target=self._run, name="AggregatingHandlerFlush", daemon=True)
+        self._flusher.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Queue the formatted line"""
+        try:
+            payload = (self.format(record) + "\n").encode("utf-8")
+        except Exception:  # pylint: disable=W0703
+            self.handleError(record)
+            return
+        with self._mutex:
+            if self._pending_bytes >= self.max_buffer:
+                self._drained.wait_for(lambda: self._pending_bytes < self.max_buffer, timeout=self.flush_interval)
+                if self._pending_bytes >= self.max_buffer:
+                    self.dropped += 1
+                    return
+            self._pending.append(payload)
+            self._pending_bytes += len(payload)
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._work.notify()
+
+    def _run(self) -> None:
+        """Flusher loop"""
+        while True:
+            with self._mutex:
+                while not self._pending and not self._closing:
+                    self._work.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._work.wait(remaining)
+                batch, self._pending = self._pending, []
+                self._pending_bytes = 0
+                self._in_flight = len(batch)
+                self._drained.notify_all()
+            self._send(batch)
+            with self._mutex:
+                self._in_flight = 0
+                self._drained.notify_all()
+
+    def _connect(self) -> Optional[socket.socket]:
+        """Get the connection, don't retry too often"""
+        if self._sock is not None:
+            return self._sock
+        now = time.monotonic()
+        if now < self._next_connect:
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            self._next_connect = now + self.reconnect_interval
+            return None
+        self._sock = sock
+        return sock
+
+    def _send(self, batch: List[bytes]) -> None:
+        """Send the batch as one buffer, write directly to fallback if the aggregator is not reachable"""
+        sock = self._connect()
+        if sock is not None:
+            try:
+                sock.sendall(encode_frames(batch))
+                return
+            except OSError:
+                # We do not know how much got through, better duplicate than lose
+                sock.close()
+                self._sock = None
+                self._next_connect = time.monotonic() + self.reconnect_interval
+        try:
+            _write_all(self.fallback_fd, b"".join(batch))
+        except OSError:
+            self.dropped += len(batch)
+
+    def flush(self) -> None:
+        """Wait until everything queued so far has been sent"""
+        with self._mutex:
+            if self._pending:
+                self._work.notify()
+            self._drained.wait_for(lambda: not self._pending and not self._in_flight)
+
+    def close(self) -> None:
+        """Send what is pending and disconnect"""
+        with self._mutex:
+            if self._closing:
+                return
+            self._closing = True
+            self._work.notify()
+        self._flusher.join()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        _HANDLERS.discard(self)
+        super().close()
+
+    def _after_fork(self) -> None:
+        """Threads do not survive fork, start over without the parent's buffer and connection"""
+        if self._sock is not None:
+            self._sock.close()
+        self._init_state()
+
+
+def _reinit_handlers_after_fork() -> None:
+    """Called in the child after fork"""
+    for handler in list(_HANDLERS):
+        handler._after_fork()  # pylint: disable=W0212
+
+
+os.register_at_fork(after_in_child=_reinit_handlers_after_fork)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} /path/to/socket", file=sys.stderr)
+        sys.exit(1)
+    run_aggregator(sys.argv[1])
@@ -0,0 +1,179 @@
+"""Rate-limiting and sampling filter for noisy hot paths
+
+Records are grouped by (logger name, level, message template) and each group gets a token bucket, records
+that find the bucket empty are dropped and counted. Once every summary_interval the counts are logged as
+"Suppressed N similar records" messages, by the next record passing through the filter or by a timer when no
+more records come. Handlers do not tell their filters when they close, call :py:meth:`RateLimitFilter.close`
+on shutdown to log the counts that are still pending.
+
+Low-level records (DEBUG, TRACE) can additionally be sampled, sample_rates maps level (number or name) to the
+probability of a record being kept.
+"""
+
+from typing import Callable, Dict, Hashable, List, Mapping, Optional, Tuple, Union
+import logging
+import random
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+#: Summary records carry this attribute, the filter always lets them through
+SUMMARY_ATTRIBUTE = "suppressed_count"
+BucketKey = Tuple[str, int, Hashable]
+
+
+class TokenBucket:  # pylint: disable=R0903
+    """Simple token bucket, not thread-safe by itself"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "suppressed")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        """Start full"""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.suppressed = 0
+
+    def take(self, now: float) -> bool:
+        """Take a token if there is one"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        self.suppressed += 1
+        return False
+
+
+def _resolve_level(level: Union[int, str]) -> int:
+    """Level number from number or name"""
+    if isinstance(level, int):
+        return level
+    resolved = logging.getLevelName(level.upper())
+    if not isinstance(resolved, int):
+        raise ValueError(f"Unknown log level {level!r}")
+    return resolved
+
+
+class RateLimitFilter(logging.Filter):  # pylint: disable=R0902
+    """Deduplicate/rate-limit records by (logger, level, template) and sample low-level records"""
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        rate: float = 10.0,
+        burst: float = 50.0,
+        *,
+        summary_interval: float = 30.0,
+        sample_rates: Optional[Mapping[Union[int, str], float]] = None,
+        max_keys: int = 10000,
+        name: str = "",
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """rate is records per second per key, burst is the bucket size"""
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        super().__init__(name)
+        self.rate = rate
+        self.burst = burst
+        self.summary_interval = summary_interval
+        self.sample_rates = {_resolve_level(level): float(prob) for level, prob in (sample_rates or {}).items()}
+        self.max_keys = max_keys
+        self.sampled_out = 0
+        self._clock = clock
+        self._buckets: Dict[BucketKey, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._next_summary = clock() + summary_interval
+        self._timer: Optional[threading.Timer] = None
+
+    @staticmethod
+    def record_key(record: logging.LogRecord) -> BucketKey:
+        """The grouping key, message template rather than the formatted message"""
+        template: Hashable = getattr(record.msg, "template", record.msg)
+        if not isinstance(template, str):
+            template = type(record.msg).__qualname__
+        return (record.name, record.levelno, template)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Decide if the record passes"""
+        if hasattr(record, SUMMARY_ATTRIBUTE):
+            return True
+        if not super().filter(record):
+            return False
+        sample_rate = self.sample_rates.get(record.levelno)
+        if sample_rate is not None and random.random() >= sample_rate:  # nosec
+            self.sampled_out += 1
+            return False
+
+        now = self._clock()
+        key = self.record_key(record)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._evict()
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            allowed = bucket.take(now)
+            if not allowed and self._timer is None:
+                self._arm_timer(now)
+            summaries = self._collect_summaries(now) if now >= self._next_summary else []
+        for summary_key, count in summaries:
+            self._emit_summary(summary_key, count)
+        return allowed
+
+    def _evict(self) -> None:
+        """Drop the oldest half of the buckets, the counts of dropped buckets are lost"""
+        for key in list(self._buckets)[: max(1, len(self._buckets) // 2)]:
+            del self._buckets[key]
+
+    def _collect_summaries(self, now: float) -> List[Tuple[BucketKey, int]]:
+        """Reset suppressed counts, call with lock held"""
+        self._next_summary = now + self.summary_interval
+        summaries = []
+        for key, bucket in self._buckets.items():
+            if bucket.suppressed:
+                summaries.append((key, bucket.suppressed))
+                bucket.suppressed = 0
+        return summaries
+
+    def _arm_timer(self, now: float) -> None:
+        """Make sure the suppressed counts get logged even if no record comes after them, call with lock held"""
+        self._timer = threading.Timer(max(self._next_summary - now, 0.0), self._summary_due)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _summary_due(self) -> None:
+        """Timer callback"""
+        with self._lock:
+            self._timer = None
+        self.flush_summaries()
+
+    def flush_summaries(self) -> None:
+        """Emit the summaries now"""
+        with self._lock:
+            summaries = self._collect_summaries(self._clock())
+        for key, count in summaries:
+            self._emit_summary(key, count)
+
+    def close(self) -> None:
+        """Stop the timer and emit the pending summaries"""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        self.flush_summaries()
+
+    @staticmethod
+    def _emit_summary(key: BucketKey, count: int) -> None:
+        """Log the suppressed count via the original logger"""
+        name, levelno, template = key
+        logging.getLogger(name).log(
+            levelno,
+            "Suppressed {} similar records: {!r}".format(count, template),
+            extra={SUMMARY_ATTRIBUTE: count},
+        )
+
+    def suppressed_counts(self) -> Dict[BucketKey, int]:
+        """Currently pending suppressed counts"""
+        with self._lock:
+            return {key: bucket.suppressed for key, bucket in self._buckets.items() if bucket.suppressed}
@@ -0,0 +1,199 @@
+"""Lazy structured logging
+
+A thin facade over a stdlib logger where the message is a :py:meth:`str.format` template and the values are
+keyword fields::
+
+    LOGGER = get_logger(__name__)
+    LOGGER.debug("Adding cert {file__path}", file__path=cafile)
+
+Nothing is formatted if the level is not enabled, and when it is the message is formatted only when a handler
+asks for it. The fields are also added to the record as extras so ECS output gets them as proper keys, double
+underscores in field names become dots (``file__path`` -> ``file.path``). Fields that would collide with
+LogRecord attributes go under ``labels.``.
+
+Values that are expensive to produce can be wrapped in :py:class:`Lazy`, the callable is called at most once
+and only if something actually formats or serializes the value.
+"""
+
+from typing import Any, Callable, Dict, Mapping, Optional
+import logging
+
+from .common import DEFAULT_RECORD_DIR
+
+_UNSET = object()
+
+
+class Lazy:  # pylint: disable=R0903
+    """Value computed on first use"""
+
+    __slots__ = ("func", "args", "kwargs", "_value")
+
+    def __init__(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        """func(*args, **kwargs) is called when the value is needed"""
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self._value: Any = _UNSET
+
+    @property
+    def value(self) -> Any:
+        """The computed value"""
+        if self._value is _UNSET:
+            self._value = self.func(*self.args, **self.kwargs)
+        return self._value
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+    def __repr__(self) -> str:
+        return repr(self.value)
+
+    def __format__(self, format_spec: str) -> str:
+        return format(self.value, format_spec)
+
+    def __structlog__(self) -> Any:
+        """JSON serializers in ECS formatters call this for values they do not know"""
+        return self.value
+
+
+class Message:  # pylint: disable=R0903
+    """Template and fields, formatted when converted to str"""
+
+    __slots__ = ("template", "fields")
+
+    def __init__(self, template: str, fields: Mapping[str, Any]) -> None:
+        self.template = template
+        self.fields = fields
+
+    def __str__(self) -> str:
+        if not self.fields:
+            return self.template
+        return self.template.format(**self.fields)
+
+    def __repr__(self) -> str:
+        return f"Message({self.template!r})"
+
+
+def field_key(name: str) -> str:
+    """The extra key for a field name"""
+    key = name.replace("__", ".")
+    if key in DEFAULT_RECORD_DIR:
+        return f"labels.{key}"
+    return key
+
+
+class StructuredLogger:
+    """Wrap a stdlib logger, methods take a template and keyword fields"""
+
+    __slots__ = ("logger",)
+
+    def __init__(self, logger: logging.Logger) -> None:
+        self.logger = logger
+
+    @property
+    def name(self) -> str:
+        """The wrapped logger name"""
+        return self.logger.name
+
+    def isEnabledFor(self, level: int) -> bool:  # pylint: disable=C0103
+        """Same as the wrapped logger"""
+        return self.logger.isEnabledFor(level)
+
+    def _emit(  # pylint: disable=R0913,R0917
+        self,
+        level: int,
+        template: str,
+        fields: Dict[str, Any],
+        exc_info: Any,
+        stack_info: bool,
+        stacklevel: int,
+    ) -> None:
+        """Create the record, stacklevel is adjusted for this method and the public one calling it"""
+        extra = {field_key(name): value for name, value in fields.items()} if fields else None
+        self.logger._log(  # pylint: disable=W0212
+            level,
+            Message(template, fields),
+            (),
+            exc_info=exc_info,
+            extra=extra,
+            stack_info=stack_info,
+            stacklevel=stacklevel + 2,
+        )
+
+    def log(
+        self,
+        level: int,
+        template: str,
+        /,
+        *,
+        exc_info: Any = None,
+        stack_info: bool = False,
+        stacklevel: int = 1,
+        **fields: Any,
+    ) -> None:
+        """Log at given level"""
+        if self.logger.isEnabledFor(level):
+            self._emit(level, template, fields, exc_info, stack_info, stacklevel)
+
+    def trace(
+        self, template: str, /, *, exc_info: Any = None, stack_info: bool = False, stacklevel: int = 1, **fields: Any
+    ) -> None:
+        """Log at TRACE (DEBUG-5 if the level is not registered)"""
+        level = getattr(logging, "TRACE", logging.DEBUG - 5)
+        if self.logger.isEnabledFor(level):
+            self._emit(level, template, fields, exc_info, stack_info, stacklevel)
+
+    def debug(
+        self, template: str, /, *, exc_info: Any = None, stack_info: bool = False, stacklevel: int = 1, **fields: Any
+    ) -> None:
+        """Log at DEBUG"""
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._emit(logging.DEBUG, template, fields, exc_info, stack_info, stacklevel)
+
+    def info(
+        self, template: str, /, *, exc_info: Any = None, stack_info: bool = False, stacklevel: int = 1, **fields: Any
+    ) -> None:
+        """Log at INFO"""
+        if self.logger.isEnabledFor(logging.INFO):
+            self._emit(logging.INFO, template, fields, exc_info, stack_info, stacklevel)
+
+    def warning(
+        self, template: str, /, *, exc_info: Any = None, stack_info: bool = False, stacklevel: int = 1, **fields: Any
+    ) -> None:
+        """Log at WARNING"""
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._emit(logging.WARNING, template, fields, exc_info, stack_info, stacklevel)
+
+    def error(
+        self, template: str, /, *, exc_info: Any = None, stack_info: bool = False, stacklevel: int = 1, **fields: Any
+    ) -> None:
+        """Log at ERROR"""
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._emit(logging.ERROR, template, fields, exc_info, stack_info, stacklevel)
+
+    def exception(
+        self, template: str, /, *, exc_info: Any = True, stack_info: bool = False, stacklevel: int = 1, **fields: Any
+    ) -> None:
+        """Log at ERROR with the exception info"""
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._emit(logging.ERROR, template, fields, exc_info, stack_info, stacklevel)
+
+    def critical(
+        self, template: str, /, *, exc_info: Any = None, stack_info: bool = False, stacklevel: int = 1, **fields: Any
+    ) -> None:
+        """Log at CRITICAL"""
+        if self.logger.isEnabledFor(logging.CRITICAL):
+            self._emit(logging.CRITICAL, template, fields, exc_info, stack_info, stacklevel)
+
+    def audit(
+        self, template: str, /, *, exc_info: Any = None, stack_info: bool = False, stacklevel: int = 1, **fields: Any
+    ) -> None:
+        """Log at AUDIT (CRITICAL+5 if the level is not registered)"""
+        level = getattr(logging, "AUDIT", logging.CRITICAL + 5)
+        if self.logger.isEnabledFor(level):
+            self._emit(level, template, fields, exc_info, stack_info, stacklevel)
+
+
+def get_logger(name: Optional[str] = None) -> StructuredLogger:
+    """Structured facade for logging.getLogger(name)"""
+    return StructuredLogger(logging.getLogger(name))
@@ -0,0 +1,358 @@
+"""In-process metrics
+
+Counters, gauges and fixed-bucket histograms kept in a :py:class:`MetricsRegistry` that renders them in the
+Prometheus text format, see :py:func:`libpvarki.middleware.mount_metrics` for exposing them from FastAPI::
+
+    REQUESTS = counter("myservice_requests_total", "Requests handled", ("method",))
+    LATENCY = histogram("myservice_request_seconds", "Request latency")
+
+    REQUESTS.labels(method="GET").inc()
+    with LATENCY.time():
+        ...
+
+Getting a metric again with the same name returns the existing one, asking for it with another type or other
+label names is a ValueError. Every labelled child has its own lock so
+updates only contend with updates of the same child.
+"""
+
+from typing import Any, Callable, ContextManager, Dict, Generic, Iterator, List, Optional, Sequence, Tuple, TypeVar
+from contextlib import contextmanager
+import bisect
+import functools
+import math
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FuncT = TypeVar("FuncT", bound=Callable[..., Any])
+ChildT = TypeVar("ChildT", "CounterChild", "GaugeChild", "HistogramChild")
+
+
+def _format_value(value: float) -> str:
+    """Prometheus number formatting"""
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape_help(value: str) -> str:
+    """Escape HELP text, quotes are left as is there"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape(value: str) -> str:
+    """Escape a label value"""
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """{name="value",...} or empty"""
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class CounterChild:
+    """Counter for one set of label values"""
+
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self) -> None:
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase by amount (must not be negative)"""
+        if amount < 0:
+            raise ValueError("Counters can only be increased")
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        """Current value"""
+        return self._value
+
+
+class GaugeChild:
+    """Gauge for one set of label values"""
+
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self) -> None:
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        """Set to value"""
+        self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase by amount"""
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Decrease by amount"""
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        """Current value"""
+        return self._value
+
+
+class HistogramChild:
+    """Histogram for one set of label values"""
+
+    __slots__ = ("_buckets", "_counts", "_sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self._buckets = buckets
+        # One extra for +Inf, counts are per bucket (not cumulative) so observe touches only one
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record a value"""
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the duration of the block in seconds (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self) -> Tuple[List[Tuple[float, int]], float, int]:
+        """Cumulative (upper bound, count) pairs including +Inf, sum and count"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative: List[Tuple[float, int]] = []
+        running = 0
+        for bound, count in zip(self._buckets + (math.inf,), counts):
+            running += count
+            cumulative.append((bound, running))
+        return cumulative, total, running
+
+
+class _Metric(Generic[ChildT]):
+    """Common parts, children are created on first use of their label values"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], ChildT] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self) -> ChildT:
+        raise NotImplementedError()
+
+    def labels(self, *values: str, **kwvalues: str) -> ChildT:
+        """The child for the label values (positional in labelnames order, or by name)"""
+        try:
+            key = (
+                tuple(str(value) for value in values)
+                if values
+                else tuple(str(kwvalues[name]) for name in self.labelnames)
+            )
+        except KeyError:
+            raise ValueError(f"{self.name} takes labels {self.labelnames}") from None
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames) or (kwvalues and len(kwvalues) != len(self.labelnames)):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], ChildT]]:
+        """Copy of (label values, child) pairs"""
+        with self._lock:
+            return list(self._children.items())
+
+    def expose(self) -> List[str]:
+        """Prometheus text format lines"""
+        lines = [f"# HELP {self.name} {_escape_help(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children(), key=lambda item: item[0]):
+            lines.extend(self._expose_child(values, child))
+        return lines
+
+    def _expose_child(self, values: Tuple[str, ...], child: ChildT) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]  # type: ignore
+
+
+class Counter(_Metric[CounterChild]):
+    """Monotonically increasing value"""
+
+    kind = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase the unlabelled counter"""
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric[GaugeChild]):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+    def set(self, value: float) -> None:
+        """Set the unlabelled gauge"""
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase the unlabelled gauge"""
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Decrease the unlabelled gauge"""
+        self.labels().dec(amount)
+
+
+class Histogram(_Metric[HistogramChild]):
+    """Distribution of values in fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(bucket for bucket in buckets if not math.isinf(bucket)))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Record a value to the unlabelled histogram"""
+        self.labels().observe(value)
+
+    def time(self, **labels: str) -> ContextManager[None]:
+        """Context manager observing the duration of the block"""
+        return self.labels(**labels).time()
+
+    def timed(self, **labels: str) -> Callable[[FuncT], FuncT]:
+        """Decorator observing the duration of every call"""
+        child = self.labels(**labels)
+
+        def decorator(func: FuncT) -> FuncT:
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with child.time():
+                    return func(*args, **kwargs)
+
+            return wrapper  # type: ignore[return-value]
+
+        return decorator
+
+    def _expose_child(self, values: Tuple[str, ...], child: HistogramChild) -> List[str]:
+        buckets, total, count = child.snapshot()
+        names = self.labelnames + ("le",)
+        lines = [
+            f"{self.name}_bucket{_format_labels(names, values + (_format_value(bound),))} {count}"
+            for bound, count in buckets
+        ]
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+MetricT = TypeVar("MetricT", Counter, Gauge, Histogram)
+
+
+class MetricsRegistry:
+    """Named metrics"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(  # pylint: disable=R0913
+        self,
+        cls: Callable[..., MetricT],
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        *args: Any,
+        **kwargs: Any,
+    ) -> MetricT:
+        """The metric called name, created if needed, raises ValueError if it exists with another type or labels"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, *args, **kwargs)
+            elif type(metric) is not cls:  # pylint: disable=C0123
+                raise ValueError(f"{name} is already registered as {type(metric).__name__}")
+            elif metric.labelnames != tuple(labelnames):
+                raise ValueError(f"{name} is already registered with labels {metric.labelnames}")
+        return metric
+
+    def metrics(self) -> List[Any]:
+        """The metrics ordered by name"""
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def get(self, name: str) -> Optional[Any]:
+        """Metric by name"""
+        return self._metrics.get(name)
+
+    def expose(self) -> str:
+        """All metrics in Prometheus text format (version 0.0.4)"""
+        lines: List[str] = []
+        for metric in self.metrics():
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+#: The registry the library instruments itself to
+REGISTRY = MetricsRegistry()
+
+
+def counter(
+    name: str, documentation: str, labelnames: Sequence[str] = (), registry: MetricsRegistry = REGISTRY
+) -> Counter:
+    """Get or create a counter"""
+    return registry.get_or_create(Counter, name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = (), registry: MetricsRegistry = REGISTRY) -> Gauge:
+    """Get or create a gauge"""
+    return registry.get_or_create(Gauge, name, documentation, labelnames)
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+    registry: MetricsRegistry = REGISTRY,
+) -> Histogram:
+    """Get or create a histogram"""
+    return registry.get_or_create(Histogram, name, documentation, labelnames, buckets)
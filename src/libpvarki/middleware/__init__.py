@@ -1,5 +1,16 @@
 """Middlewares for FastAPI"""
 
-from .mtlsheader import MTLSHeader, DNDict
+from typing import TYPE_CHECKING
 
-__all__ = ["MTLSHeader", "DNDict"]
+from .._lazy import lazy_attributes
+
+if TYPE_CHECKING:
+    from .mtlsheader import MTLSHeader, DNDict
+    from .metrics import mount_metrics
+
+# FastAPI is imported only when these are used
+__getattr__, __dir__ = lazy_attributes(
+    __name__, {"MTLSHeader": ".mtlsheader", "DNDict": ".mtlsheader", "mount_metrics": ".metrics"}
+)
+
+__all__ = ["MTLSHeader", "DNDict", "mount_metrics"]
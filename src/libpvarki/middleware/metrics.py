@@ -0,0 +1,19 @@
+"""Prometheus endpoint for FastAPI"""
+
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from ..metrics import REGISTRY, MetricsRegistry
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def mount_metrics(app: FastAPI, path: str = "/metrics", registry: MetricsRegistry = REGISTRY) -> None:
+    """Add a GET route at path serving the metrics of registry in Prometheus text format
+
+    The route is left out of the OpenAPI schema and has no auth, put it behind the ingress accordingly."""
+
+    async def metrics() -> Response:
+        return Response(content=registry.expose(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+    app.add_api_route(path, metrics, methods=["GET"], include_in_schema=False)
@@ -5,13 +5,17 @@ import logging
 
 from fastapi import Request, HTTPException
 from fastapi.security.http import HTTPBase
-from starlette.config import Config
 from cryptography import x509
 
+from ..metrics import counter
+from ..settings import Settings, get_settings
+
 
 LOGGER = logging.getLogger(__name__)
-CONFIG = Config()  # not supporting .env files anymore because https://github.com/encode/starlette/discussions/2446
 DNDict = Mapping[str, str]
+AUTH_TOTAL = counter(
+    "libpvarki_mtls_auth_total", "mTLS header authentications by mode (header/l5d) and result", ("mode", "result")
+)
 
 
 class MTLSHeader(HTTPBase):  # pylint: disable=R0903
@@ -32,14 +36,17 @@ class MTLSHeader(HTTPBase):  # pylint: disable=R0903
 
     async def __call__(self, request: Request) -> Optional[DNDict]:  # type: ignore[override]
         """actual work"""
-        header_name = CONFIG("MTLS_HEADER_NAME", default="X-ClientCert-DN").lower()
-        l5d_header = CONFIG("MTLS_L5D_HEADER_NAME", default="l5d-client-id").lower()
-        trust_l5d = CONFIG("MTLS_TRUST_L5D", cast=bool, default=False)
-
-        if trust_l5d:
-            payload = self._meshed_payload(request, l5d_header, header_name)
-        else:
-            payload = self._cert_payload(request, header_name)
+        settings = get_settings()
+        mode = "l5d" if settings.mtls_trust_l5d else "header"
+        try:
+            if settings.mtls_trust_l5d:
+                payload = self._meshed_payload(request, settings)
+            else:
+                payload = self._cert_payload(request, settings.mtls_header_name)
+        except HTTPException:
+            AUTH_TOTAL.labels(mode, "invalid").inc()
+            raise
+        AUTH_TOTAL.labels(mode, "missing" if payload is None else "ok").inc()
 
         if payload is None:
             if self.auto_error:
@@ -50,22 +57,18 @@ class MTLSHeader(HTTPBase):  # pylint: disable=R0903
         request.state.mtlsdn = payload
         return payload
 
-    def _meshed_payload(self, request: Request, l5d_header: str, header_name: str) -> Optional[DNDict]:
+    def _meshed_payload(self, request: Request, settings: Settings) -> Optional[DNDict]:
         """l5d is trusted when present. MTLS_REQUIRE_L5D makes it mandatory (fully-meshed hardening)."""
-        trusted_ingress = {
-            ident.strip() for ident in CONFIG("MTLS_TRUSTED_INGRESS_IDENTITIES", default="").split(",") if ident.strip()
-        }
-        require_l5d = CONFIG("MTLS_REQUIRE_L5D", cast=bool, default=False)
-        l5d_value = request.headers.get(l5d_header)
+        l5d_value = request.headers.get(settings.mtls_l5d_header_name)
         if not l5d_value:
             # No verified mesh peer. Fail closed only when the mesh is complete (require_l5d);
             # otherwise honor the cert header so not-yet-meshed callers still authenticate.
-            if require_l5d:
+            if settings.mtls_require_l5d:
                 return None
-            return self._cert_payload(request, header_name)
-        if l5d_value in trusted_ingress:
+            return self._cert_payload(request, settings.mtls_header_name)
+        if l5d_value in settings.mtls_trusted_ingress_identities:
             # Via a trusted ingress: real identity is the forwarded client cert (else None -> JWT).
-            return self._cert_payload(request, header_name)
+            return self._cert_payload(request, settings.mtls_header_name)
         # Lateral in-mesh service call: the peer identity is the client.
         # Linkerd identity is a bare SPIFFE-style name, not an RFC4514 DN.
         return {"CN": l5d_value}
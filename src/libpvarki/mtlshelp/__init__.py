@@ -1,6 +1,18 @@
 """Helpers for making working with mTLS in our env DRYer"""
 
-from .session import get_session
-from .context import get_ssl_context
+from typing import TYPE_CHECKING
+
+from .._lazy import lazy_attributes
+from ..metrics import histogram
+
+if TYPE_CHECKING:
+    from .session import get_session
+    from .context import get_ssl_context
+
+# aiohttp and starlette are imported only when these are used
+__getattr__, __dir__ = lazy_attributes(__name__, {"get_session": ".session", "get_ssl_context": ".context"})
+
+#: Shared by the key, CSR and PKCS12 helpers
+CRYPTO_SECONDS = histogram("libpvarki_crypto_seconds", "Time taken by key, CSR and PKCS12 helpers", ("operation",))
 
 __all__ = ["get_session", "get_ssl_context"]
@@ -3,13 +3,13 @@
 from typing import Optional, Tuple
 import ssl
 from pathlib import Path
-import logging
 
-from starlette.config import Config
+from ..logging.structured import get_logger
+from ..metrics import histogram
+from ..settings import get_settings
 
-
-LOGGER = logging.getLogger(__name__)
-CONFIG = Config()  # not supporting .env files anymore because https://github.com/encode/starlette/discussions/2446
+LOGGER = get_logger(__name__)
+SSL_CONTEXT_SECONDS = histogram("libpvarki_ssl_context_seconds", "Time to create SSL contexts with get_ssl_context")
 
 # https://github.com/miguelgrinberg/python-socketio/discussions/1040 was very helpful
 
@@ -19,36 +19,42 @@ def get_ca_context(
     extra_ca_certs_path: Optional[Path] = None,
 ) -> ssl.SSLContext:
     """Get SSL/TLS context with our local CA certs"""
-    LOGGER.debug("ssl.create_default_context(purpose={})".format(purpose))
+    LOGGER.debug("ssl.create_default_context(purpose={purpose})", purpose=purpose)
     ssl_ctx = ssl.create_default_context(purpose=purpose)
+    settings = get_settings()
     if not extra_ca_certs_path:
-        extra_ca_certs_path = Path(CONFIG("LOCAL_CA_CERTS_PATH", default="/ca_public"))
-    LOGGER.info("Loading local CA certs from {}".format(extra_ca_certs_path))
-    for cafile in extra_ca_certs_path.glob(CONFIG("LOCAL_CA_CERTS_GLOB", default="*ca*.pem")):
+        extra_ca_certs_path = settings.local_ca_certs_path
+    LOGGER.info("Loading local CA certs from {file__directory}", file__directory=extra_ca_certs_path)
+    for cafile in extra_ca_certs_path.glob(settings.local_ca_certs_glob):
         if not cafile.is_file():
             continue
-        LOGGER.debug("Adding cert {}".format(cafile))
+        LOGGER.debug("Adding cert {file__path}", file__path=cafile)
         ssl_ctx.load_verify_locations(str(cafile))
     return ssl_ctx
 
 
+@SSL_CONTEXT_SECONDS.timed()
 def get_ssl_context(
     purpose: ssl.Purpose,
     client_cert_paths: Optional[Tuple[Path, Path]] = None,
     extra_ca_certs_path: Optional[Path] = None,
 ) -> ssl.SSLContext:
     """Get SSL/TLS context with our local CA certs and client auth,
-    if the cert paths are not set ENV or defaults will be used
+    if the cert paths are not set the settings (ENV or defaults) will be used
 
     You can use this to create a server context too, put server cert and key to client paths"""
     ssl_ctx = get_ca_context(purpose, extra_ca_certs_path)
-    dataroot = Path(CONFIG("PERSISTENT_DATA_PATH", default="/data/persistent"))
     if client_cert_paths:
         client_cert_path = client_cert_paths[0]
         client_key_path = client_cert_paths[1]
     else:
-        client_cert_path = Path(CONFIG("CLIENT_CERT_PATH", default=f"{dataroot}/public/mtlsclient.pem"))
-        client_key_path = Path(CONFIG("CLIENT_KEY_PATH", default=f"{dataroot}/private/mtlsclient.key"))
-    LOGGER.info("Loading client/server cert from {} and {}".format(client_cert_path, client_key_path))
+        settings = get_settings()
+        client_cert_path = settings.client_cert_path
+        client_key_path = settings.client_key_path
+    LOGGER.info(
+        "Loading client/server cert from {tls__certificate} and {tls__key}",
+        tls__certificate=client_cert_path,
+        tls__key=client_key_path,
+    )
     ssl_ctx.load_cert_chain(client_cert_path, client_key_path)
     return ssl_ctx
@@ -2,7 +2,6 @@
 
 from typing import Mapping, Sequence, Tuple, Iterable
 from pathlib import Path
-import logging
 import stat
 import asyncio
 from ipaddress import ip_address
@@ -13,7 +12,10 @@ from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.x509.oid import NameOID
 from cryptography.x509.name import _NAME_TO_NAMEOID
 
-LOGGER = logging.getLogger(__name__)
+from ..logging.structured import get_logger
+from . import CRYPTO_SECONDS
+
+LOGGER = get_logger(__name__)
 KPTYPE = rsa.RSAPrivateKey  # TODO: should this be more than a type alias?
 PUBDIR_MODE = stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH | stat.S_IXGRP | stat.S_IXOTH
 PRIVDIR_MODE = stat.S_IRWXU
@@ -44,19 +46,22 @@ def resolve_filepaths(basedir: Path, nameprefix: str) -> Tuple[Path, Path, Path]
     return privkeypath, pubkeypath, csrpath
 
 
+@CRYPTO_SECONDS.timed(operation="create_keypair")
 def create_keypair(privkeypath: Path, pubkeypath: Path, ktype: str = "RSA", ksize: int = 4096) -> rsa.RSAPrivateKey:
     """Generate a keypair, saves files to given paths (directory must exist) and returns the
     keypair object"""
     for check_path in (privkeypath, pubkeypath):
         if not check_path.parent.exists():
-            LOGGER.error("Path {} does not exist".format(check_path.parent))
+            LOGGER.error("Path {file__directory} does not exist", file__directory=check_path.parent)
             raise ValueError("Invalid path {}".format(check_path))
         if not check_path.parent.is_dir():
-            LOGGER.error("Path {} is not a directory".format(check_path.parent))
+            LOGGER.error("Path {file__directory} is not a directory", file__directory=check_path.parent)
             raise ValueError("Invalid path {}".format(check_path))
         if check_path.exists():
-            LOGGER.warning("{} already exists, it will be overwritten".format(check_path))
-    LOGGER.info("Generating {} keypair of size {}, this will take a moment".format(ktype, ksize))
+            LOGGER.warning("{file__path} already exists, it will be overwritten", file__path=check_path)
+    LOGGER.info(
+        "Generating {key__type} keypair of size {key__size}, this will take a moment", key__type=ktype, key__size=ksize
+    )
     if ktype == "RSA":
         ckp = rsa.generate_private_key(public_exponent=65537, key_size=ksize)
     else:
@@ -77,7 +82,7 @@ def create_keypair(privkeypath: Path, pubkeypath: Path, ktype: str = "RSA", ksiz
         ),
     )
     pubkeypath.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)  # everyone can read
-    LOGGER.info("Wrote {} and {}".format(privkeypath, pubkeypath))
+    LOGGER.info("Wrote {tls__key} and {tls__public_key}", tls__key=privkeypath, tls__public_key=pubkeypath)
     return ckp
 
 
@@ -102,7 +107,7 @@ def sign_and_write_csrfile(
     csr_pem = csr.public_bytes(serialization.Encoding.PEM)
     csrpath.write_bytes(csr_pem)
     csrpath.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)  # everyone can read
-    LOGGER.info("Wrote {}".format(csrpath))
+    LOGGER.info("Wrote {file__path}", file__path=csrpath)
     return csr_pem.decode("utf-8")
 
 
@@ -143,6 +148,7 @@ def _build_csr_builder(
     )
 
 
+@CRYPTO_SECONDS.timed(operation="create_client_csr")
 def create_client_csr(
     keypair: rsa.RSAPrivateKey,
     csrpath: Path,
@@ -173,6 +179,7 @@ async def async_create_client_csr(
     return await asyncio.get_event_loop().run_in_executor(None, create_client_csr, keypair, csrpath, reqdn, digest)
 
 
+@CRYPTO_SECONDS.timed(operation="create_server_csr")
 def create_server_csr(keypair: rsa.RSAPrivateKey, csrpath: Path, names: Sequence[str], digest: str = "sha256") -> str:
     """Generate CSR file with serverAuth extended usage, returns the PEM encoded contents
     First name will go to CN, all names will go to subjectAltNames
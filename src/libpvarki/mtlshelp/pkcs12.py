@@ -1,7 +1,6 @@
 """Helper to convert PEM to PKCS12 (legacy format)"""
 
 from typing import Optional, Sequence, Union, cast
-import logging
 from pathlib import Path
 
 from cryptography import x509
@@ -19,7 +18,10 @@ from cryptography.hazmat.primitives.asymmetric import (
     rsa,
 )
 
-LOGGER = logging.getLogger(__name__)
+from ..logging.structured import get_logger
+from . import CRYPTO_SECONDS
+
+LOGGER = get_logger(__name__)
 PKCS12KEYTYPES = (
     rsa.RSAPrivateKey,
     dsa.DSAPrivateKey,
@@ -44,9 +46,12 @@ def serialize_legacy_pkcs12(
     password: bytes,
 ) -> bytes:
     """serialize_key_and_certificates but using the more compatible legacy format"""
-    LOGGER.debug("key={}".format(key))
-    LOGGER.debug("main_cert={}".format(main_cert))
-    LOGGER.debug("other_certs={}".format(other_certs))
+    LOGGER.debug(
+        "key={pkcs12__key} main_cert={pkcs12__main_cert} other_certs={pkcs12__other_certs}",
+        pkcs12__key=key,
+        pkcs12__main_cert=main_cert,
+        pkcs12__other_certs=other_certs,
+    )
 
     encryption = (
         PrivateFormat.PKCS12.encryption_builder()
@@ -73,6 +78,7 @@ def get_src_bytes(certsrc: Union[bytes, Path, str]) -> bytes:
     raise ValueError(f"Could not resolve {certsrc!r}")
 
 
+@CRYPTO_SECONDS.timed(operation="convert_pem_to_pkcs12")
 def convert_pem_to_pkcs12(
     certsrc: Optional[Union[bytes, Path, str]],
     keysrc: Optional[Union[bytes, Path, str]],
@@ -86,7 +92,7 @@ def convert_pem_to_pkcs12(
         other_certs = None
     else:
         certs = x509.load_pem_x509_certificates(get_src_bytes(certsrc))
-        LOGGER.debug("Found {} certificates".format(len(certs)))
+        LOGGER.debug("Found {pkcs12__certificates} certificates", pkcs12__certificates=len(certs))
         if not certs:
             main_cert = None
             other_certs = None
@@ -103,7 +109,7 @@ def convert_pem_to_pkcs12(
         if keypassword is not None:
             keypassword = _ensure_utf8(keypassword)
         key = load_pem_private_key(get_src_bytes(keysrc), keypassword)
-        LOGGER.debug("Got key {}".format(key))
+        LOGGER.debug("Got key {pkcs12__key}", pkcs12__key=key)
         if not isinstance(key, PKCS12KEYTYPES):
             raise ValueError("Invalid key type for PKCS12")
 
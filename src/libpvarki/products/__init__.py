@@ -0,0 +1,30 @@
+"""Helpers for keeping track of the product integrations"""
+
+from typing import TYPE_CHECKING
+
+from .._lazy import lazy_attributes
+
+if TYPE_CHECKING:
+    from .health import HealthAggregator, HealthStatus
+    from .registry import ProductEntry, ProductRegistry, RegistryChange, RegistrySnapshot
+
+__getattr__, __dir__ = lazy_attributes(
+    __name__,
+    {
+        "HealthAggregator": ".health",
+        "HealthStatus": ".health",
+        "ProductEntry": ".registry",
+        "ProductRegistry": ".registry",
+        "RegistryChange": ".registry",
+        "RegistrySnapshot": ".registry",
+    },
+)
+
+__all__ = [
+    "HealthAggregator",
+    "HealthStatus",
+    "ProductEntry",
+    "ProductRegistry",
+    "RegistryChange",
+    "RegistrySnapshot",
+]
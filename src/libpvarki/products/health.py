@@ -0,0 +1,182 @@
+"""Concurrent health checks of product integration APIs
+
+:py:class:`HealthAggregator` probes the products over the mTLS client session with bounded concurrency and a
+deadline per probe. Results are cached with stale-while-revalidate: a result younger than ttl is returned as is,
+an older one (up to max_stale) is returned immediately while a refresh runs in the background, so readers only
+wait for products that have never been probed (or whose result is too old to show)::
+
+    async with HealthAggregator(ttl=10) as health:
+        health.add_ready(ready_request)
+        ...
+        for url, status in (await health.get_all()).items():
+            ...
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Type
+from dataclasses import dataclass
+from types import TracebackType
+import asyncio
+import time
+
+import aiohttp
+
+from ..logging.structured import get_logger
+from ..mtlshelp.session import get_session
+from ..schemas.product import ProductHealthCheckResponse, ReadyRequest
+
+LOGGER = get_logger(__name__)
+HEALTH_PATH = "api/v1/healthcheck"
+
+
+@dataclass(frozen=True)
+class HealthStatus:
+    """Result of a probe, failures are reported as unhealthy with the error in extra"""
+
+    url: str
+    health: ProductHealthCheckResponse
+    checked_at: float
+    latency: float
+
+    @property
+    def healthy(self) -> bool:
+        """Shorthand for health.healthy"""
+        return self.health.healthy
+
+
+class HealthAggregator:  # pylint: disable=R0902
+    """Probe product APIs concurrently and cache the results"""
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        urls: Iterable[str] = (),
+        *,
+        session: Optional[aiohttp.ClientSession] = None,
+        max_concurrency: int = 8,
+        timeout: float = 2.0,
+        ttl: float = 10.0,
+        max_stale: float = 300.0,
+        path: str = HEALTH_PATH,
+    ) -> None:
+        """urls are product API base URLs, without a session one is created with
+        :py:func:`libpvarki.mtlshelp.get_session` (and closed by aclose), times are in seconds"""
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.path = path
+        self._urls: Set[str] = set()
+        self._session = session
+        self._own_session = session is None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._results: Dict[str, HealthStatus] = {}
+        self._refreshing: Dict[str, "asyncio.Task[HealthStatus]"] = {}
+        for url in urls:
+            self.add(url)
+
+    async def __aenter__(self) -> "HealthAggregator":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        await self.aclose()
+
+    @property
+    def urls(self) -> List[str]:
+        """The product API URLs being checked"""
+        return sorted(self._urls)
+
+    def add(self, url: str) -> None:
+        """Start checking the product API at url"""
+        self._urls.add(url if url.endswith("/") else f"{url}/")
+
+    def add_ready(self, ready: ReadyRequest) -> None:
+        """Start checking the product that announced itself"""
+        self.add(ready.apiurl)
+
+    def remove(self, url: str) -> None:
+        """Stop checking url and forget its result"""
+        url = url if url.endswith("/") else f"{url}/"
+        self._urls.discard(url)
+        self._results.pop(url, None)
+
+    def cached(self) -> Dict[str, HealthStatus]:
+        """The latest results without waiting for anything (products never probed are missing)"""
+        return {url: self._results[url] for url in self.urls if url in self._results}
+
+    async def get(self, url: str) -> HealthStatus:
+        """Health of url, see the module docs for when this waits for a probe"""
+        url = url if url.endswith("/") else f"{url}/"
+        status = self._results.get(url)
+        if status is not None:
+            age = time.time() - status.checked_at
+            if age < self.ttl:
+                return status
+            if age < self.max_stale:
+                self._refresh(url)
+                return status
+        return await asyncio.shield(self._refresh(url))
+
+    async def get_all(self) -> Dict[str, HealthStatus]:
+        """Health of all the products"""
+        urls = self.urls
+        return dict(zip(urls, await asyncio.gather(*(self.get(url) for url in urls))))
+
+    async def refresh_all(self) -> Dict[str, HealthStatus]:
+        """Probe all the products now"""
+        urls = self.urls
+        return dict(zip(urls, await asyncio.gather(*(asyncio.shield(self._refresh(url)) for url in urls))))
+
+    def _refresh(self, url: str) -> "asyncio.Task[HealthStatus]":
+        """Running probe of url, started if there is none"""
+        task = self._refreshing.get(url)
+        if task is None:
+            task = asyncio.create_task(self._probe_and_store(url))
+            self._refreshing[url] = task
+        return task
+
+    async def _probe_and_store(self, url: str) -> HealthStatus:
+        """Probe and cache the result"""
+        try:
+            status = await self.probe(url)
+        finally:
+            del self._refreshing[url]
+        if url in self._urls:
+            self._results[url] = status
+        return status
+
+    async def probe(self, url: str) -> HealthStatus:
+        """Probe url (waits for a concurrency slot, the deadline starts when the request does)"""
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                health = await asyncio.wait_for(self._fetch(url), self.timeout)
+            except asyncio.TimeoutError:
+                health = ProductHealthCheckResponse(healthy=False, extra=f"No response in {self.timeout}s")
+            except (aiohttp.ClientError, ValueError) as exc:
+                health = ProductHealthCheckResponse(healthy=False, extra=f"{type(exc).__name__}: {exc}")
+            latency = time.monotonic() - started
+        if not health.healthy:
+            LOGGER.warning("{url__full} is not healthy: {error__message}", url__full=url, error__message=health.extra)
+        return HealthStatus(url=url, health=health, checked_at=time.time(), latency=latency)
+
+    async def _fetch(self, url: str) -> ProductHealthCheckResponse:
+        """GET the healthcheck endpoint"""
+        if self._session is None:
+            self._session = get_session()
+        async with self._session.get(f"{url}{self.path}") as resp:
+            resp.raise_for_status()
+            payload: Any = await resp.json()
+        return ProductHealthCheckResponse.model_validate(payload)
+
+    async def aclose(self) -> None:
+        """Cancel running probes, close the session if we created it"""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,233 @@
+"""In-memory registry of the products
+
+:py:class:`ProductRegistry` holds the products that announced themselves with a
+:py:class:`~libpvarki.schemas.product.ReadyRequest` (and their :py:class:`ProductDescription`). Writers take a lock
+and publish a new immutable :py:class:`RegistrySnapshot`, readers just use the current one and never block::
+
+    REGISTRY = ProductRegistry(Path("/data/persistent/products.json"))
+
+    REGISTRY.register(ready_request)
+    entry = REGISTRY.snapshot.by_api_host("tak.sleepy-sloth.pvarki.fi")
+
+    async for change in REGISTRY.watch():
+        ...
+
+With a path every change is written to it atomically and the registry is loaded from it on startup. A change
+that can't be written raises (OSError) and is not applied.
+"""
+
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Union
+from dataclasses import dataclass, replace
+from pathlib import Path
+from types import MappingProxyType
+from urllib.parse import urlsplit
+import asyncio
+import json
+import os
+import threading
+import time
+
+from ..logging.structured import get_logger
+from ..schemas.product import ProductDescription, ReadyRequest
+
+LOGGER = get_logger(__name__)
+FILE_FORMAT = 1
+
+
+@dataclass(frozen=True)
+class ProductEntry:
+    """A registered product"""
+
+    shortname: str
+    apiurl: str
+    url: str
+    description: Optional[ProductDescription] = None
+    updated_at: float = 0.0
+
+    @property
+    def api_host(self) -> str:
+        """Hostname (lowercase, no port) of apiurl"""
+        return urlsplit(self.apiurl).hostname or ""
+
+
+class RegistrySnapshot:
+    """Immutable view of the registry at one point in time"""
+
+    __slots__ = ("version", "_by_name", "_by_host")
+
+    def __init__(self, entries: Mapping[str, ProductEntry], version: int) -> None:
+        self.version = version
+        self._by_name = MappingProxyType(dict(entries))
+        self._by_host = MappingProxyType({entry.api_host: entry for entry in entries.values()})
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def __iter__(self) -> Iterator[ProductEntry]:
+        return iter(self._by_name.values())
+
+    def __contains__(self, shortname: object) -> bool:
+        return shortname in self._by_name
+
+    def get(self, shortname: str) -> Optional[ProductEntry]:
+        """Product by shortname"""
+        return self._by_name.get(shortname)
+
+    def by_api_host(self, host: str) -> Optional[ProductEntry]:
+        """Product by the hostname of its API URL"""
+        return self._by_host.get(host.lower())
+
+    @property
+    def products(self) -> Mapping[str, ProductEntry]:
+        """Read-only mapping of shortname to entry"""
+        return self._by_name
+
+
+class RegistryChange(NamedTuple):
+    """What changed, kind is one of "added", "updated" and "removed" """
+
+    kind: str
+    entry: ProductEntry
+    snapshot: RegistrySnapshot
+
+
+class ProductRegistry:
+    """Thread- and async-safe product registry"""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None) -> None:
+        """With path the registry is loaded from and persisted to that file"""
+        self.path = Path(path) if path is not None else None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[RegistryChange], None]] = []
+        self.snapshot = RegistrySnapshot({}, 0)
+        if self.path is not None:
+            self.snapshot = RegistrySnapshot(self._load(self.path), 0)
+
+    def get(self, shortname: str) -> Optional[ProductEntry]:
+        """Product by shortname from the current snapshot"""
+        return self.snapshot.get(shortname)
+
+    def register(self, ready: ReadyRequest, description: Optional[ProductDescription] = None) -> ProductEntry:
+        """Add or update the product that announced itself, the old description is kept if none is given"""
+        with self._lock:
+            old = self.snapshot.get(ready.product)
+            if description is None and old is not None:
+                description = old.description
+            entry = ProductEntry(ready.product, ready.apiurl, ready.url, description, time.time())
+            if old is not None and replace(old, updated_at=entry.updated_at) == entry:
+                return old
+            change = self._publish({**self.snapshot.products, entry.shortname: entry}, entry, old)
+        self._notify(change)
+        return entry
+
+    def describe(self, description: ProductDescription) -> Optional[ProductEntry]:
+        """Set the description of a registered product, returns None if it's not registered"""
+        with self._lock:
+            old = self.snapshot.get(description.shortname)
+            if old is None:
+                return None
+            entry = replace(old, description=description, updated_at=time.time())
+            change = self._publish({**self.snapshot.products, entry.shortname: entry}, entry, old)
+        self._notify(change)
+        return entry
+
+    def remove(self, shortname: str) -> Optional[ProductEntry]:
+        """Remove the product, returns the removed entry"""
+        with self._lock:
+            old = self.snapshot.get(shortname)
+            if old is None:
+                return None
+            entries = dict(self.snapshot.products)
+            del entries[shortname]
+            change = self._publish(entries, old, old, removed=True)
+        self._notify(change)
+        return old
+
+    def _publish(
+        self, entries: Dict[str, ProductEntry], entry: ProductEntry, old: Optional[ProductEntry], removed: bool = False
+    ) -> RegistryChange:
+        """Persist the entries and swap in the new snapshot, called with the lock held
+
+        If saving fails the error is raised and nothing changes, readers never see a state the file does not have"""
+        if self.path is not None:
+            self._save(self.path, entries)
+        self.snapshot = RegistrySnapshot(entries, self.snapshot.version + 1)
+        kind = "removed" if removed else "added" if old is None else "updated"
+        return RegistryChange(kind, entry, self.snapshot)
+
+    def subscribe(self, listener: Callable[[RegistryChange], None]) -> Callable[[], None]:
+        """Call listener (in the thread that made the change) on every change, returns a function to unsubscribe"""
+        with self._lock:
+            self._listeners.append(listener)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+
+        return unsubscribe
+
+    async def watch(self) -> AsyncGenerator[RegistryChange, None]:
+        """Changes as they happen, from any thread (starting from the first iteration, aclose to stop)"""
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[RegistryChange]" = asyncio.Queue()
+
+        def listener(change: RegistryChange) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, change)
+
+        unsubscribe = self.subscribe(listener)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            unsubscribe()
+
+    def _notify(self, change: RegistryChange) -> None:
+        """Call the listeners outside of the lock"""
+        for listener in list(self._listeners):
+            try:
+                listener(change)
+            except Exception:  # pylint: disable=W0703
+                LOGGER.exception("Registry listener {listener} failed", listener=listener)
+
+    @staticmethod
+    def _load(path: Path) -> Dict[str, ProductEntry]:
+        """Read the persisted entries, empty if there are none or the file is unusable"""
+        try:
+            data: Any = json.loads(path.read_bytes())
+            if data.get("format") != FILE_FORMAT:
+                raise ValueError(f"Unknown format {data.get('format')!r}")
+            entries = {}
+            for item in data["products"]:
+                description = item.pop("description", None)
+                entry = ProductEntry(
+                    **item, description=ProductDescription.model_validate(description) if description else None
+                )
+                entries[entry.shortname] = entry
+        except FileNotFoundError:
+            return {}
+        except (ValueError, TypeError, KeyError, AttributeError) as exc:
+            LOGGER.warning(
+                "Ignoring unusable registry file {file__path}: {error__message}", file__path=path, error__message=exc
+            )
+            return {}
+        return entries
+
+    @staticmethod
+    def _save(path: Path, entries: Mapping[str, ProductEntry]) -> None:
+        """Write the entries compactly, atomically replacing the old file"""
+        products = [
+            {
+                "shortname": entry.shortname,
+                "apiurl": entry.apiurl,
+                "url": entry.url,
+                "updated_at": entry.updated_at,
+                "description": entry.description.model_dump() if entry.description is not None else None,
+            }
+            for entry in entries.values()
+        ]
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(
+            json.dumps({"format": FILE_FORMAT, "products": products}, separators=(",", ":")), encoding="utf-8"
+        )
+        os.replace(tmp, path)
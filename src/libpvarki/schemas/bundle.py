@@ -0,0 +1,69 @@
+"""Cached JSON schemas of the libpvarki models
+
+Generating the JSON schemas of the models is not free and every OpenAPI document build, schema endpoint and
+validator setup would otherwise redo it. :py:func:`get_schema_bundle` generates them once per process (and
+libpvarki version) in OpenAPI components form, references point to ``#/components/schemas/``::
+
+    @APP.get("/api/product/schemas")
+    async def schemas() -> Dict[str, Any]:
+        return get_schema_bundle()
+
+    APP.openapi_schema = add_bundle_components(get_openapi(title=APP.title, version=APP.version, routes=APP.routes))
+"""
+
+from typing import Any, Dict, Tuple, Type
+import copy
+import functools
+
+from pydantic import BaseModel
+from pydantic.json_schema import models_json_schema
+
+from .. import __version__
+from .generic import OperationResultResponse
+from .product import (
+    ProductDescription,
+    ProductHealthCheckResponse,
+    ReadyRequest,
+    UserCRUDBatchItemResult,
+    UserCRUDBatchRequest,
+    UserCRUDBatchResponse,
+    UserCRUDRequest,
+    UserInstructionFragment,
+)
+
+REF_TEMPLATE = "#/components/schemas/{model}"
+SCHEMA_MODELS: Tuple[Type[BaseModel], ...] = (
+    OperationResultResponse,
+    UserCRUDRequest,
+    UserCRUDBatchRequest,
+    UserCRUDBatchItemResult,
+    UserCRUDBatchResponse,
+    UserInstructionFragment,
+    ReadyRequest,
+    ProductHealthCheckResponse,
+    ProductDescription,
+)
+
+
+@functools.cache
+def _generate(version: str) -> Dict[str, Any]:
+    """Schemas of SCHEMA_MODELS, cached per libpvarki version"""
+    _, definitions = models_json_schema([(model, "validation") for model in SCHEMA_MODELS], ref_template=REF_TEMPLATE)
+    return {"version": version, "components": {"schemas": definitions.get("$defs", {})}}
+
+
+def get_schema_bundle() -> Dict[str, Any]:
+    """The schemas with the libpvarki version they were made for, generated once, treat it as read-only"""
+    return _generate(__version__)
+
+
+def add_bundle_components(openapi: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the cached schemas the OpenAPI document does not already have (FastAPI generates the ones its routes
+    use, in serialization mode for responses), returns the document"""
+    bundle = get_schema_bundle()
+    schemas = openapi.setdefault("components", {}).setdefault("schemas", {})
+    for name, schema in bundle["components"]["schemas"].items():
+        if name not in schemas:
+            schemas[name] = copy.deepcopy(schema)
+    openapi.setdefault("info", {})["x-libpvarki-version"] = bundle["version"]
+    return openapi
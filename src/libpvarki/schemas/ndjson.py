@@ -0,0 +1,76 @@
+"""Streaming NDJSON (one JSON document per line) encoding and decoding of the schemas
+
+For large rosters, instead of one big JSON array, stream the models one per line so that memory use stays flat::
+
+    # Starlette/FastAPI
+    async for user in decode_ndjson(request.stream(), UserCRUDRequest):
+        ...
+
+    return StreamingResponse(encode_ndjson(users), media_type=NDJSON_MEDIA_TYPE)
+
+    # aiohttp client
+    await session.post(url, data=encode_ndjson(users), headers={"Content-Type": NDJSON_MEDIA_TYPE})
+
+    async for user in decode_ndjson(response.content.iter_chunked(65536), UserCRUDRequest):
+        ...
+
+Invalid lines raise pydantic.ValidationError, blank lines are skipped. With Starlette read the request body
+before returning a StreamingResponse, it listens for client disconnects on the same ASGI receive channel and
+would swallow the rest of the body.
+"""
+
+from typing import AsyncIterable, AsyncIterator, Iterable, Type, TypeVar, Union
+
+from pydantic import BaseModel
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+async def encode_ndjson(
+    models: Union[Iterable[BaseModel], AsyncIterable[BaseModel]], *, chunk_size: int = 64 * 1024
+) -> AsyncIterator[bytes]:
+    """Encode the models to NDJSON, lines are collected to chunks of about chunk_size bytes to keep writes few"""
+    buffer = bytearray()
+    if isinstance(models, AsyncIterable):
+        async for model in models:
+            buffer += model.model_dump_json().encode("utf-8") + b"\n"
+            if len(buffer) >= chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+    else:
+        for model in models:
+            buffer += model.model_dump_json().encode("utf-8") + b"\n"
+            if len(buffer) >= chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def decode_ndjson(
+    chunks: AsyncIterable[bytes], model: Type[ModelT], *, max_line_bytes: int = 1024 * 1024
+) -> AsyncIterator[ModelT]:
+    """Decode NDJSON from body chunks (split anywhere) to model instances
+
+    Raises ValueError if a line is longer than max_line_bytes"""
+    pending = bytearray()
+    async for chunk in chunks:
+        start = 0
+        while (end := chunk.find(b"\n", start)) >= 0:
+            if len(pending) + end - start > max_line_bytes:
+                raise ValueError(f"NDJSON line exceeds {max_line_bytes} bytes")
+            if pending:
+                pending += chunk[start:end]
+                line = bytes(pending)
+                pending.clear()
+            else:
+                line = chunk[start:end]
+            if line.strip():
+                yield model.model_validate_json(line)
+            start = end + 1
+        if len(pending) + len(chunk) - start > max_line_bytes:
+            raise ValueError(f"NDJSON line exceeds {max_line_bytes} bytes")
+        pending += chunk[start:]
+    if pending.strip():
+        yield model.model_validate_json(pending)
@@ -1,34 +1,162 @@
 """Pydantic schemas for product integration APIs"""
 
-from typing import Optional
+from typing import TYPE_CHECKING, Any, List, Optional, Union
+import functools
 
-from pydantic import Field, BaseModel, ConfigDict
+from pydantic import Field, BaseModel, ConfigDict, JsonValue, TypeAdapter
 
 # pylint: disable=too-few-public-methods
-from .generic import OperationResultResponse  # pylint: disable=W0611 # For backwards compatibility
+from .generic import OperationResultResponse
+
+if TYPE_CHECKING:
+    from cryptography import x509
+
+CERT_CACHE_SIZE = 1024
+
+USER_EXAMPLES: List[JsonValue] = [
+    {
+        "uuid": "3ede23ae-eff2-4aa8-b7ef-7fac68c39988",
+        "callsign": "ROTTA01a",
+        "x509cert": "-----BEGIN CERTIFICATE-----\\nMIIEwjCC...\\n-----END CERTIFICATE-----\\n",
+    },
+    {
+        "uuid": "b7c2d4a6-1f0e-4d3b-9a8c-5e6f7a8b9c0d",
+        "callsign": "ROTTA02a",
+        "x509cert": "-----BEGIN CERTIFICATE-----\\nMIIEwzCC...\\n-----END CERTIFICATE-----\\n",
+    },
+]
 
 
 class UserCRUDRequest(BaseModel):
-    """Request to create user"""
+    """Request to create user
+
+    The certificate is parsed only when one of the cert_* properties is accessed, the results are cached per
+    x509cert value in a module level LRU cache so validation does not pay for them"""
 
     uuid: str = Field(description="RASENMAEHER UUID for this user")
     callsign: str = Field(description="Callsign of the user")
     x509cert: str = Field(description="Certificate encoded with CFSSL conventions (newlines escaped)")
 
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={
+            "examples": USER_EXAMPLES[:1],
+        },
+    )
+
+    @property
+    def cert_pem(self) -> str:
+        """x509cert with the newlines unescaped"""
+        return self.x509cert.replace("\\n", "\n")
+
+    @property
+    def cert(self) -> "x509.Certificate":
+        """The parsed certificate, raises ValueError if x509cert is not a valid PEM certificate"""
+        return _parse_cert(self.x509cert)
+
+    @property
+    def cert_fingerprint(self) -> str:
+        """SHA-256 fingerprint of the certificate as hex"""
+        return _cert_fingerprint(self.x509cert)
+
+    @property
+    def cert_subject(self) -> str:
+        """Subject DN of the certificate as RFC 4514 string"""
+        return _cert_subject(self.x509cert)
+
+
+@functools.lru_cache(maxsize=CERT_CACHE_SIZE)
+def _parse_cert(x509cert: str) -> "x509.Certificate":
+    """Parse the CFSSL-escaped PEM"""
+    from cryptography import x509  # pylint: disable=C0415,W0621 # only imported when certs are inspected
+
+    return x509.load_pem_x509_certificate(x509cert.replace("\\n", "\n").encode("utf-8"))
+
+
+@functools.lru_cache(maxsize=CERT_CACHE_SIZE)
+def _cert_fingerprint(x509cert: str) -> str:
+    """See UserCRUDRequest.cert_fingerprint"""
+    from cryptography.hazmat.primitives import hashes  # pylint: disable=C0415
+
+    return _parse_cert(x509cert).fingerprint(hashes.SHA256()).hex()
+
+
+@functools.lru_cache(maxsize=CERT_CACHE_SIZE)
+def _cert_subject(x509cert: str) -> str:
+    """See UserCRUDRequest.cert_subject"""
+    return _parse_cert(x509cert).subject.rfc4514_string()
+
+
+class UserCRUDBatchRequest(BaseModel):
+    """Request to create/update/delete many users in one call"""
+
+    users: List[UserCRUDRequest] = Field(description="The users, results are returned in the same order")
+
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={
+            "examples": [
+                {"users": USER_EXAMPLES},
+            ],
+        },
+    )
+
+
+class UserCRUDBatchItemResult(OperationResultResponse):
+    """Result of the operation for one user of a batch"""
+
+    uuid: str = Field(description="RASENMAEHER UUID of the user this result is for")
+
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={
+            "examples": [
+                {"uuid": "3ede23ae-eff2-4aa8-b7ef-7fac68c39988", "success": True},
+                {"uuid": "b7c2d4a6-1f0e-4d3b-9a8c-5e6f7a8b9c0d", "success": False, "error": "Things went wrong"},
+            ],
+        },
+    )
+
+
+class UserCRUDBatchResponse(BaseModel):
+    """Per-user results of a batch operation"""
+
+    results: List[UserCRUDBatchItemResult] = Field(description="Results in the same order as the request users")
+
     model_config = ConfigDict(
         extra="forbid",
         json_schema_extra={
             "examples": [
                 {
-                    "uuid": "3ede23ae-eff2-4aa8-b7ef-7fac68c39988",
-                    "callsign": "ROTTA01a",
-                    "x509cert": "-----BEGIN CERTIFICATE-----\\nMIIEwjCC...\\n-----END CERTIFICATE-----\\n",
+                    "results": [
+                        {"uuid": "3ede23ae-eff2-4aa8-b7ef-7fac68c39988", "success": True},
+                        {
+                            "uuid": "b7c2d4a6-1f0e-4d3b-9a8c-5e6f7a8b9c0d",
+                            "success": False,
+                            "error": "Things went wrong",
+                        },
+                    ],
                 },
             ],
         },
     )
 
 
+@functools.cache
+def user_list_adapter() -> TypeAdapter[List[UserCRUDRequest]]:
+    """TypeAdapter for a list of users, built on first use and reused"""
+    return TypeAdapter(List[UserCRUDRequest])
+
+
+def validate_users(data: Union[str, bytes, List[Any]]) -> List[UserCRUDRequest]:
+    """Validate a list of users in one pass, JSON (str/bytes) is parsed and validated without intermediate dicts
+
+    Raises pydantic.ValidationError listing the errors of all items"""
+    if isinstance(data, (str, bytes)):
+        return user_list_adapter().validate_json(data)
+    return user_list_adapter().validate_python(data)
+
+
 # FIXME: The spec for these will be changed
 class UserInstructionFragment(BaseModel):
     """Product instructions for user"""
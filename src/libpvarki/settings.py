@@ -0,0 +1,120 @@
+"""Environment settings of libpvarki
+
+The settings are parsed and validated from the environment once (on first use) into an immutable
+:py:class:`Settings`, hot paths read plain attributes from :py:func:`get_settings`. Changes to the environment
+take effect only when :py:func:`reload` is called, which also tells the listeners::
+
+    settings = get_settings()
+    settings.mtls_trust_l5d
+
+    os.environ["MTLS_TRUST_L5D"] = "true"
+    reload()
+"""
+
+from typing import Callable, FrozenSet, List, Mapping, Optional
+from dataclasses import dataclass
+from pathlib import Path
+import os
+import threading
+
+from .logging.structured import get_logger
+
+LOGGER = get_logger(__name__)
+TRUE_VALUES = ("true", "1")
+FALSE_VALUES = ("false", "0")
+
+
+def _parse_bool(environ: Mapping[str, str], key: str, default: bool) -> bool:
+    """Same rules as starlette Config cast=bool"""
+    value = environ.get(key)
+    if value is None:
+        return default
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise ValueError(f"{key} has value {value!r}, not a valid bool")
+
+
+@dataclass(frozen=True)
+class Settings:  # pylint: disable=R0902
+    """The settings, see :py:meth:`from_env` for the variables"""
+
+    local_ca_certs_path: Path = Path("/ca_public")
+    local_ca_certs_glob: str = "*ca*.pem"
+    persistent_data_path: Path = Path("/data/persistent")
+    client_cert_path: Path = Path("/data/persistent/public/mtlsclient.pem")
+    client_key_path: Path = Path("/data/persistent/private/mtlsclient.key")
+    #: Header names are lowercase
+    mtls_header_name: str = "x-clientcert-dn"
+    mtls_l5d_header_name: str = "l5d-client-id"
+    mtls_trust_l5d: bool = False
+    mtls_require_l5d: bool = False
+    mtls_trusted_ingress_identities: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "Settings":
+        """Parse LOCAL_CA_CERTS_PATH, LOCAL_CA_CERTS_GLOB, PERSISTENT_DATA_PATH, CLIENT_CERT_PATH, CLIENT_KEY_PATH,
+        MTLS_HEADER_NAME, MTLS_L5D_HEADER_NAME, MTLS_TRUST_L5D, MTLS_REQUIRE_L5D and
+        MTLS_TRUSTED_INGRESS_IDENTITIES (comma separated), raises ValueError on invalid values"""
+        if environ is None:
+            environ = os.environ
+        dataroot = Path(environ.get("PERSISTENT_DATA_PATH", "/data/persistent"))
+        return cls(
+            local_ca_certs_path=Path(environ.get("LOCAL_CA_CERTS_PATH", "/ca_public")),
+            local_ca_certs_glob=environ.get("LOCAL_CA_CERTS_GLOB", "*ca*.pem"),
+            persistent_data_path=dataroot,
+            client_cert_path=Path(environ.get("CLIENT_CERT_PATH", f"{dataroot}/public/mtlsclient.pem")),
+            client_key_path=Path(environ.get("CLIENT_KEY_PATH", f"{dataroot}/private/mtlsclient.key")),
+            mtls_header_name=environ.get("MTLS_HEADER_NAME", "X-ClientCert-DN").lower(),
+            mtls_l5d_header_name=environ.get("MTLS_L5D_HEADER_NAME", "l5d-client-id").lower(),
+            mtls_trust_l5d=_parse_bool(environ, "MTLS_TRUST_L5D", False),
+            mtls_require_l5d=_parse_bool(environ, "MTLS_REQUIRE_L5D", False),
+            mtls_trusted_ingress_identities=frozenset(
+                ident.strip()
+                for ident in environ.get("MTLS_TRUSTED_INGRESS_IDENTITIES", "").split(",")
+                if ident.strip()
+            ),
+        )
+
+
+_SETTINGS: Optional[Settings] = None
+_LOCK = threading.Lock()
+_LISTENERS: List[Callable[[Settings], None]] = []
+
+
+def get_settings() -> Settings:
+    """The current settings, parsed from the environment on first call"""
+    if _SETTINGS is None:
+        return reload()
+    return _SETTINGS
+
+
+def reload(environ: Optional[Mapping[str, str]] = None) -> Settings:
+    """Parse the settings again (from os.environ unless given), listeners are called if they changed"""
+    global _SETTINGS  # pylint: disable=W0603
+    settings = Settings.from_env(environ)
+    with _LOCK:
+        if settings == _SETTINGS:
+            return _SETTINGS
+        _SETTINGS = settings
+        listeners = list(_LISTENERS)
+    for listener in listeners:
+        try:
+            listener(settings)
+        except Exception:  # pylint: disable=W0703
+            LOGGER.exception("Settings listener {listener} failed", listener=listener)
+    return settings
+
+
+def add_listener(listener: Callable[[Settings], None]) -> Callable[[], None]:
+    """Call listener with the new settings when reload changes them, returns a function to remove it"""
+    with _LOCK:
+        _LISTENERS.append(listener)
+
+    def remove() -> None:
+        with _LOCK:
+            if listener in _LISTENERS:
+                _LISTENERS.remove(listener)
+
+    return remove
@@ -0,0 +1,41 @@
+"""Shell related helpers"""
+
+from typing import TYPE_CHECKING
+
+from .call import call_cmd, call_exec
+from .._lazy import lazy_attributes
+
+if TYPE_CHECKING:
+    from .stream import CommandStream, OutputChunk, stream_cmd
+    from .pool import CommandPool, CommandStats
+    from .usage import USAGE_REGISTRY, CmdUsage, UsageStats
+    from .cache import CommandCache
+
+__getattr__, __dir__ = lazy_attributes(
+    __name__,
+    {
+        "stream_cmd": ".stream",
+        "CommandStream": ".stream",
+        "OutputChunk": ".stream",
+        "CommandPool": ".pool",
+        "CommandStats": ".pool",
+        "CmdUsage": ".usage",
+        "UsageStats": ".usage",
+        "USAGE_REGISTRY": ".usage",
+        "CommandCache": ".cache",
+    },
+)
+
+__all__ = [
+    "call_cmd",
+    "call_exec",
+    "stream_cmd",
+    "CommandStream",
+    "OutputChunk",
+    "CommandPool",
+    "CommandStats",
+    "CmdUsage",
+    "UsageStats",
+    "USAGE_REGISTRY",
+    "CommandCache",
+]
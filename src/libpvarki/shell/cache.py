@@ -0,0 +1,126 @@
+"""Result cache for idempotent commands
+
+Opt-in memoization for read-only commands that get called over and over (version queries, cert inspection,
+status checks)::
+
+    CACHE = CommandCache(ttl=300)
+
+    code, stdout, stderr = await CACHE.call_exec(["openssl", "version"])
+
+Results are keyed by the command, the environment and the working directory, kept for ttl seconds and the
+least recently used ones are evicted when there are more than max_entries. Concurrent identical calls share one
+running process. Only successful (exit code 0) results are cached unless cache_failures is set, exceptions
+(timeouts) are never cached.
+"""
+
+from typing import Awaitable, Callable, Dict, FrozenSet, Hashable, Mapping, Optional, Sequence, Tuple, Union
+from collections import OrderedDict
+from functools import partial
+from pathlib import Path
+import asyncio
+import os
+import time
+
+from ..logging.structured import get_logger
+from .call import CmdResult, call_cmd, call_exec
+
+LOGGER = get_logger(__name__)
+CacheKey = Tuple[Hashable, ...]
+
+
+def _env_key(env: Optional[Mapping[str, str]]) -> FrozenSet[Tuple[str, str]]:
+    """The environment the command sees, the items themselves so that equal hashes can't mix up environments"""
+    return frozenset((env if env is not None else os.environ).items())
+
+
+class CommandCache:  # pylint: disable=R0902
+    """TTL + LRU cache with single-flight for call_cmd/call_exec results"""
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        max_entries: int = 256,
+        *,
+        cache_failures: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """ttl is in seconds"""
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_failures = cache_failures
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self._clock = clock
+        self._entries: "OrderedDict[CacheKey, Tuple[float, CmdResult]]" = OrderedDict()
+        self._in_flight: Dict[CacheKey, "asyncio.Task[CmdResult]"] = {}
+
+    def __len__(self) -> int:
+        """Number of cached results (including expired ones not yet evicted)"""
+        return len(self._entries)
+
+    async def call_cmd(self, cmd: str, timeout: float = 2.5, *, stderr_warn: bool = True) -> CmdResult:
+        """Cached :py:func:`libpvarki.shell.call_cmd`"""
+        key = ("shell", cmd, _env_key(None), os.getcwd())
+        return await self._get(key, partial(call_cmd, cmd, timeout, stderr_warn=stderr_warn))
+
+    async def call_exec(  # pylint: disable=R0913
+        self,
+        argv: Sequence[Union[str, Path]],
+        timeout: float = 2.5,
+        *,
+        stderr_warn: bool = True,
+        env: Optional[Mapping[str, str]] = None,
+        cwd: Optional[Union[str, Path]] = None,
+    ) -> CmdResult:
+        """Cached :py:func:`libpvarki.shell.call_exec`"""
+        key = ("exec", tuple(str(arg) for arg in argv), _env_key(env), str(cwd) if cwd is not None else os.getcwd())
+        return await self._get(key, partial(call_exec, argv, timeout, stderr_warn=stderr_warn, env=env, cwd=cwd))
+
+    async def _get(self, key: CacheKey, call: Callable[[], Awaitable[CmdResult]]) -> CmdResult:
+        """Cached result, join the running call or start a new one"""
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                LOGGER.debug("Cached result for {subprocess__command_line}", subprocess__command_line=key[1])
+                return entry[1]
+            del self._entries[key]
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.misses += 1
+            # Separate task so that the caller that started it being cancelled does not cancel the others
+            task = asyncio.ensure_future(self._run(key, call))
+            self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _run(self, key: CacheKey, call: Callable[[], Awaitable[CmdResult]]) -> CmdResult:
+        """Run and store"""
+        try:
+            result = await call()
+        finally:
+            del self._in_flight[key]
+        if result[0] == 0 or self.cache_failures:
+            self._entries[key] = (self._clock() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self, cmd: Union[str, Sequence[Union[str, Path]]]) -> int:
+        """Drop cached results of the command (in any environment), returns how many were dropped"""
+        match = cmd if isinstance(cmd, str) else tuple(str(arg) for arg in cmd)
+        keys = [key for key in self._entries if key[1] == match]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drop all cached results"""
+        self._entries.clear()
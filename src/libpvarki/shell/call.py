@@ -0,0 +1,200 @@
+"""Shell related helpers"""
+
+from typing import Literal, Mapping, Optional, Sequence, Tuple, Union, overload
+from asyncio.subprocess import Process
+from pathlib import Path
+import asyncio
+import os
+import shlex
+import signal
+
+from ..logging.structured import get_logger
+from ..metrics import counter, histogram
+from .usage import USAGE_REGISTRY, CmdUsage, run_with_usage
+
+LOGGER = get_logger(__name__)
+CmdResult = Tuple[int, str, str]
+CmdUsageResult = Tuple[int, str, str, CmdUsage]
+COMMAND_SECONDS = histogram("libpvarki_command_seconds", "Wall time of call_cmd/call_exec by executable", ("command",))
+COMMAND_FAILURES = counter(
+    "libpvarki_command_failures_total", "Failed commands by executable and reason (exit/timeout)", ("command", "reason")
+)
+
+
+def command_name(cmd: Union[str, Sequence[Union[str, Path]]]) -> str:
+    """Basename of the executable, used for grouping stats"""
+    try:
+        words = shlex.split(cmd) if isinstance(cmd, str) else [str(arg) for arg in cmd]
+    except ValueError:  # unbalanced quotes, the shell will complain about it
+        words = cmd.split() if isinstance(cmd, str) else []
+    return os.path.basename(words[0]) if words else str(cmd)
+
+
+@overload
+async def call_cmd(
+    cmd: str, timeout: float = 2.5, *, stderr_warn: bool = True, usage: Literal[False] = False
+) -> CmdResult: ...
+
+
+@overload
+async def call_cmd(
+    cmd: str, timeout: float = 2.5, *, stderr_warn: bool = True, usage: Literal[True]
+) -> CmdUsageResult: ...
+
+
+async def call_cmd(
+    cmd: str, timeout: float = 2.5, *, stderr_warn: bool = True, usage: bool = False
+) -> Union[CmdResult, CmdUsageResult]:
+    """Do the boilerplate for calling cmd and returning the exit code and output as strings
+
+    With usage=True the resource usage of the command is returned as fourth item, see :py:mod:`.usage`"""
+    LOGGER.debug("Calling create_subprocess_shell({subprocess__command_line})", subprocess__command_line=cmd)
+    with COMMAND_SECONDS.time(command=command_name(cmd)):
+        if usage:
+            return await _with_usage(cmd, cmd, timeout, stderr_warn, shell=True)
+        process = await asyncio.create_subprocess_shell(
+            cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        return await _communicate(process, cmd, timeout, stderr_warn)
+
+
+@overload
+async def call_exec(  # pylint: disable=R0913
+    argv: Sequence[Union[str, Path]],
+    timeout: float = 2.5,
+    *,
+    stderr_warn: bool = True,
+    env: Optional[Mapping[str, str]] = None,
+    cwd: Optional[Union[str, Path]] = None,
+    usage: Literal[False] = False,
+) -> CmdResult: ...
+
+
+@overload
+async def call_exec(  # pylint: disable=R0913
+    argv: Sequence[Union[str, Path]],
+    timeout: float = 2.5,
+    *,
+    stderr_warn: bool = True,
+    env: Optional[Mapping[str, str]] = None,
+    cwd: Optional[Union[str, Path]] = None,
+    usage: Literal[True],
+) -> CmdUsageResult: ...
+
+
+async def call_exec(  # pylint: disable=R0913
+    argv: Sequence[Union[str, Path]],
+    timeout: float = 2.5,
+    *,
+    stderr_warn: bool = True,
+    env: Optional[Mapping[str, str]] = None,
+    cwd: Optional[Union[str, Path]] = None,
+    usage: bool = False,
+) -> Union[CmdResult, CmdUsageResult]:
+    """Like :py:func:`call_cmd` but executes argv directly without a shell in between: no quoting needed and
+    one fork/exec less. env replaces the environment if given."""
+    cmd = shlex.join(str(arg) for arg in argv)
+    LOGGER.debug("Calling create_subprocess_exec({subprocess__command_line})", subprocess__command_line=cmd)
+    with COMMAND_SECONDS.time(command=command_name(argv)):
+        if usage:
+            return await _with_usage(argv, cmd, timeout, stderr_warn, shell=False, env=env, cwd=cwd)
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            cwd=cwd,
+            start_new_session=True,
+        )
+        return await _communicate(process, cmd, timeout, stderr_warn)
+
+
+async def _with_usage(  # pylint: disable=R0913
+    args: Union[str, Sequence[Union[str, Path]]],
+    cmd: str,
+    timeout: float,
+    stderr_warn: bool,
+    *,
+    shell: bool,
+    env: Optional[Mapping[str, str]] = None,
+    cwd: Optional[Union[str, Path]] = None,
+) -> CmdUsageResult:
+    """Run with resource accounting and record the usage"""
+    try:
+        returncode, out, err, cmd_usage = await run_with_usage(args, timeout, shell=shell, env=env, cwd=cwd)
+    except asyncio.TimeoutError:
+        LOGGER.error(
+            "{subprocess__command_line} did not finish in {timeout}s, killing it",
+            subprocess__command_line=cmd,
+            timeout=timeout,
+        )
+        COMMAND_FAILURES.labels(command_name(cmd), "timeout").inc()
+        raise
+    USAGE_REGISTRY.record(command_name(args), cmd_usage)
+    LOGGER.debug(
+        "{subprocess__command_line} took {wall_time:.3f}s, cpu {cpu_time:.3f}s, max rss {max_rss}kB",
+        subprocess__command_line=cmd,
+        wall_time=cmd_usage.wall_time,
+        cpu_time=cmd_usage.cpu_time,
+        max_rss=cmd_usage.max_rss,
+    )
+    return (*_report(cmd, returncode, None, out, err, stderr_warn), cmd_usage)
+
+
+async def kill_and_reap(process: Process) -> None:
+    """Kill the process group of a command started with start_new_session=True and wait for the process"""
+    if process.returncode is None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        except PermissionError:  # the process left its group and someone else has taken the pgid
+            process.kill()
+    await process.wait()
+
+
+async def _communicate(process: Process, cmd: str, timeout: float, stderr_warn: bool) -> CmdResult:
+    """Collect the output and exit code, log like call_cmd always has, kill the command on timeout"""
+    try:
+        out, err = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        LOGGER.error(
+            "{subprocess__command_line} did not finish in {timeout}s, killing it",
+            subprocess__command_line=cmd,
+            timeout=timeout,
+        )
+        COMMAND_FAILURES.labels(command_name(cmd), "timeout").inc()
+        await kill_and_reap(process)
+        raise
+    except asyncio.CancelledError:
+        await asyncio.shield(kill_and_reap(process))
+        raise
+    assert isinstance(process.returncode, int)  # at this point it is, keep mypy happy
+    return _report(cmd, process.returncode, process.pid, out, err, stderr_warn)
+
+
+def _report(  # pylint: disable=R0913,R0917
+    cmd: str, returncode: int, pid: Optional[int], out: bytes, err: bytes, stderr_warn: bool
+) -> CmdResult:
+    """Decode and log the output like call_cmd always has, the output goes only to the stdout/stderr fields so
+    that ECS lines don't carry it in message and log.original too"""
+    out_str = out.decode("utf-8")
+    err_str = err.decode("utf-8")
+    if err and stderr_warn:
+        LOGGER.warning("{subprocess__command_line} stderr", subprocess__command_line=cmd, stderr=err_str)
+    LOGGER.info("{subprocess__command_line} stdout", subprocess__command_line=cmd, stdout=out_str)
+    if returncode != 0:
+        COMMAND_FAILURES.labels(command_name(cmd), "exit").inc()
+        LOGGER.error(
+            "{subprocess__command_line} returned nonzero code: {subprocess__exit_code} (process: {subprocess__pid})",
+            subprocess__command_line=cmd,
+            subprocess__exit_code=returncode,
+            subprocess__pid=pid,
+        )
+        LOGGER.error("{subprocess__command_line} stderr", subprocess__command_line=cmd, stderr=err_str)
+        LOGGER.error("{subprocess__command_line} stdout", subprocess__command_line=cmd, stdout=out_str)
+
+    return returncode, out_str, err_str
@@ -0,0 +1,198 @@
+"""Concurrency-limited command execution
+
+:py:class:`CommandPool` limits how many commands run at once, both globally and per command name (the basename
+of the executable unless given), waiting commands are started in priority order (lower number first, FIFO
+within the same priority)::
+
+    POOL = CommandPool(8, per_name_limits={"openssl": 2})
+
+    code, stdout, stderr = await POOL.call_exec(["openssl", "x509", "-in", path, "-noout", "-subject"])
+
+The return contract is the same as :py:func:`call_cmd` / :py:func:`call_exec`, time spent waiting in the queue
+does not count towards the timeout. Queue wait and run time of every command are logged at DEBUG and
+aggregated per command name, see :py:meth:`CommandPool.stats`.
+"""
+
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass, replace
+from functools import partial
+from pathlib import Path
+import asyncio
+import heapq
+import itertools
+import time
+
+from ..logging.structured import get_logger
+from .call import call_cmd, call_exec, command_name
+
+LOGGER = get_logger(__name__)
+
+
+class PriorityLimiter:
+    """Semaphore that wakes waiters in priority order"""
+
+    def __init__(self, limit: int) -> None:
+        """limit is the number of concurrent holders"""
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self.limit = limit
+        self.active = 0
+        self._waiters: List[Tuple[int, int, "asyncio.Future[None]"]] = []
+        self._counter = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        """Number of waiters"""
+        return len(self._waiters)
+
+    async def acquire(self, priority: int = 0) -> None:
+        """Wait for a slot, lower priority number goes first"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        entry = (priority, next(self._counter), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, entry)
+        try:
+            await entry[2]
+        except asyncio.CancelledError:
+            if entry[2].done() and not entry[2].cancelled():
+                # The slot was handed to us just before the cancel, pass it on
+                self.release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self) -> None:
+        """Hand the slot to the next waiter or free it"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+@dataclass
+class CommandStats:  # pylint: disable=R0902
+    """Aggregated figures for a command name, times are in seconds"""
+
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    run_time_total: float = 0.0
+    run_time_max: float = 0.0
+
+    def record(self, queue_wait: float, run_time: float) -> None:
+        """Add one call"""
+        self.calls += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.run_time_total += run_time
+        self.run_time_max = max(self.run_time_max, run_time)
+
+
+class CommandPool:
+    """Run commands with global and per-name concurrency limits"""
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        *,
+        per_name_limits: Optional[Mapping[str, int]] = None,
+        default_per_name: Optional[int] = None,
+    ) -> None:
+        """Names not in per_name_limits get default_per_name (None means only the global limit applies)"""
+        self.limiter = PriorityLimiter(max_concurrency)
+        self.per_name_limits = dict(per_name_limits or {})
+        self.default_per_name = default_per_name
+        self._name_limiters: Dict[str, PriorityLimiter] = {}
+        self._stats: Dict[str, CommandStats] = {}
+
+    def _name_limiter(self, name: str) -> Optional[PriorityLimiter]:
+        """Limiter for the name, created on first use"""
+        limiter = self._name_limiters.get(name)
+        if limiter is None:
+            limit = self.per_name_limits.get(name, self.default_per_name)
+            if limit is None:
+                return None
+            limiter = self._name_limiters[name] = PriorityLimiter(limit)
+        return limiter
+
+    async def call_cmd(  # pylint: disable=R0913
+        self,
+        cmd: str,
+        timeout: float = 2.5,
+        *,
+        stderr_warn: bool = True,
+        priority: int = 0,
+        name: Optional[str] = None,
+    ) -> Tuple[int, str, str]:
+        """:py:func:`libpvarki.shell.call_cmd` when there is room"""
+        if name is None:
+            name = command_name(cmd)
+        return await self._run(name, priority, partial(call_cmd, cmd, timeout, stderr_warn=stderr_warn))
+
+    async def call_exec(  # pylint: disable=R0913
+        self,
+        argv: Sequence[Union[str, Path]],
+        timeout: float = 2.5,
+        *,
+        stderr_warn: bool = True,
+        env: Optional[Mapping[str, str]] = None,
+        cwd: Optional[Union[str, Path]] = None,
+        priority: int = 0,
+        name: Optional[str] = None,
+    ) -> Tuple[int, str, str]:
+        """:py:func:`libpvarki.shell.call_exec` when there is room"""
+        if name is None:
+            name = command_name(argv)
+        return await self._run(
+            name, priority, partial(call_exec, argv, timeout, stderr_warn=stderr_warn, env=env, cwd=cwd)
+        )
+
+    async def _run(
+        self, name: str, priority: int, call: Callable[[], Awaitable[Tuple[int, str, str]]]
+    ) -> Tuple[int, str, str]:
+        """Wait for the name and global slots (in this order), run and record"""
+        queued = time.monotonic()
+        name_limiter = self._name_limiter(name)
+        if name_limiter is not None:
+            await name_limiter.acquire(priority)
+        try:
+            await self.limiter.acquire(priority)
+            try:
+                started = time.monotonic()
+                try:
+                    result = await call()
+                except asyncio.TimeoutError:
+                    self._record(name, started - queued, time.monotonic() - started, timeout=True)
+                    raise
+            finally:
+                self.limiter.release()
+        finally:
+            if name_limiter is not None:
+                name_limiter.release()
+        self._record(name, started - queued, time.monotonic() - started, failed=result[0] != 0)
+        return result
+
+    def _record(
+        self, name: str, queue_wait: float, run_time: float, *, failed: bool = False, timeout: bool = False
+    ) -> None:
+        """Update the stats and log the timings"""
+        stats = self._stats.setdefault(name, CommandStats())
+        stats.record(queue_wait, run_time)
+        stats.failures += failed or timeout
+        stats.timeouts += timeout
+        LOGGER.debug(
+            "{subprocess__name} waited {queue_wait:.3f}s in queue and ran {run_time:.3f}s",
+            subprocess__name=name,
+            queue_wait=queue_wait,
+            run_time=run_time,
+        )
+
+    def stats(self) -> Dict[str, CommandStats]:
+        """Copy of the per-name figures"""
+        return {name: replace(stats) for name, stats in self._stats.items()}
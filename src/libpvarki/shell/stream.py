@@ -0,0 +1,246 @@
+"""Streaming command output
+
+:py:func:`stream_cmd` yields the output of a command as it arrives instead of buffering all of it like
+:py:func:`libpvarki.shell.call_cmd` does::
+
+    async with stream_cmd("journalctl -u foo") as proc:
+        async for stream, text in proc:
+            ...
+    if proc.returncode != 0:
+        ...
+
+Memory use is constant: the pipes are read in chunk_size pieces into a bounded queue, when the consumer does
+not keep up the readers stop reading and the command blocks on its pipe (back-pressure). Lines longer than
+chunk_size are yielded in pieces. With max_bytes set, output of a stream beyond that many bytes is not
+yielded but written to a temporary file, see :py:attr:`CommandStream.spilled`.
+"""
+
+from typing import IO, Any, Dict, List, NamedTuple, Optional, Tuple, Type, Union
+from pathlib import Path
+from types import TracebackType
+from asyncio.subprocess import Process
+import asyncio
+import codecs
+import tempfile
+import time
+
+from ..logging.structured import get_logger
+from .call import kill_and_reap
+
+LOGGER = get_logger(__name__)
+STREAM_NAMES = ("stdout", "stderr")
+
+
+class OutputChunk(NamedTuple):
+    """Decoded piece of output"""
+
+    stream: str
+    text: str
+
+
+class CommandStream:  # pylint: disable=R0902
+    """Run a shell command and iterate over its output"""
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        cmd: str,
+        timeout: Optional[float] = None,
+        *,
+        lines: bool = True,
+        chunk_size: int = 64 * 1024,
+        max_bytes: Optional[int] = None,
+        spill_dir: Optional[Union[str, Path]] = None,
+        queue_size: int = 16,
+        log_output: bool = True,
+        stderr_warn: bool = True,
+    ) -> None:
+        """timeout is for the whole run (seconds), lines=False yields chunks as they are read,
+        log_output logs every line/chunk (stdout at INFO, stderr at WARNING unless stderr_warn is False)"""
+        self.cmd = cmd
+        self.timeout = timeout
+        self.lines = lines
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.log_output = log_output
+        self.stderr_warn = stderr_warn
+        self.returncode: Optional[int] = None
+        #: Paths of the temporary files the output beyond max_bytes was written to, the caller must remove them
+        self.spilled: Dict[str, Path] = {}
+        self._queue: "asyncio.Queue[Optional[OutputChunk]]" = asyncio.Queue(maxsize=queue_size)
+        self._process: Optional[Process] = None
+        self._readers: List["asyncio.Task[None]"] = []
+        self._open_streams = 0
+        self._deadline = 0.0
+        self._error: Optional[BaseException] = None
+
+    async def start(self) -> "CommandStream":
+        """Start the command and the pipe readers"""
+        LOGGER.debug("Calling create_subprocess_shell({subprocess__command_line})", subprocess__command_line=self.cmd)
+        self._process = await asyncio.create_subprocess_shell(
+            self.cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        self._deadline = time.monotonic() + self.timeout if self.timeout is not None else 0.0
+        assert self._process.stdout is not None and self._process.stderr is not None  # nosec
+        self._open_streams = len(STREAM_NAMES)
+        self._readers = [
+            asyncio.create_task(self._reader("stdout", self._process.stdout)),
+            asyncio.create_task(self._reader("stderr", self._process.stderr)),
+        ]
+        return self
+
+    async def __aenter__(self) -> "CommandStream":
+        return await self.start()
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        await self.aclose()
+
+    def __aiter__(self) -> "CommandStream":
+        return self
+
+    async def __anext__(self) -> OutputChunk:
+        """Next piece of output, raises asyncio.TimeoutError (and kills the command) on timeout"""
+        while self._open_streams:
+            try:
+                if self.timeout is None:
+                    chunk = await self._queue.get()
+                else:
+                    chunk = await asyncio.wait_for(self._queue.get(), max(self._deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                await self.aclose()
+                raise
+            if chunk is not None:
+                return chunk
+            self._open_streams -= 1
+            if self._error is not None:
+                await self.aclose()
+                raise self._error
+        await self.wait()
+        raise StopAsyncIteration
+
+    async def wait(self) -> int:
+        """Wait for the command to exit (consuming the remaining output), returns the exit code"""
+        if self._process is None:
+            raise RuntimeError("Not started")
+        while self._open_streams:
+            if await anext(self, None) is None:
+                break
+        if self.returncode is None:
+            remaining = max(self._deadline - time.monotonic(), 0) if self.timeout is not None else None
+            try:
+                self.returncode = await asyncio.wait_for(self._process.wait(), remaining)
+            except asyncio.TimeoutError:
+                await self.aclose()
+                raise
+            if self.returncode != 0:
+                LOGGER.error(
+                    "{subprocess__command_line} returned nonzero code: {subprocess__exit_code} "
+                    "(process: {subprocess__pid})",
+                    subprocess__command_line=self.cmd,
+                    subprocess__exit_code=self.returncode,
+                    subprocess__pid=self._process.pid,
+                )
+        return self.returncode
+
+    async def aclose(self) -> None:
+        """Kill the command (and its process group) if it's still running and stop the readers"""
+        if self._process is None:
+            return
+        await kill_and_reap(self._process)
+        for reader in self._readers:
+            reader.cancel()
+        await asyncio.gather(*self._readers, return_exceptions=True)
+        self._open_streams = 0
+
+    async def _reader(self, name: str, pipe: asyncio.StreamReader) -> None:
+        """Read the pipe, always tell the consumer when done"""
+        try:
+            await self._read_pipe(name, pipe)
+        except Exception as exc:  # pylint: disable=W0703
+            self._error = exc
+        await self._queue.put(None)
+
+    def _split(self, pending: bytes, eof: bool) -> Tuple[List[bytes], bytes]:
+        """Split to lines (or chunk_size pieces if there is no newline), returns pieces and the remainder"""
+        pieces: List[bytes] = []
+        while pending:
+            newline = pending.find(b"\n", 0, self.chunk_size)
+            if newline >= 0:
+                pieces.append(pending[: newline + 1])
+                pending = pending[newline + 1 :]
+            elif len(pending) >= self.chunk_size or eof:
+                pieces.append(pending[: self.chunk_size])
+                pending = pending[self.chunk_size :]
+            else:
+                break
+        return pieces, pending
+
+    async def _read_pipe(self, name: str, pipe: asyncio.StreamReader) -> None:
+        """Read the pipe in chunks, split to lines if requested"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = b""
+        delivered = 0
+        spill: Optional[IO[bytes]] = None
+        try:
+            while True:
+                data = await pipe.read(self.chunk_size)
+                if self.lines:
+                    pieces, pending = self._split(pending + data, not data)
+                else:
+                    pieces = [data] if data else []
+                for piece in pieces:
+                    if spill is None and self.max_bytes is not None and delivered + len(piece) > self.max_bytes:
+                        spill = self._open_spill(name)
+                    if spill is not None:
+                        spill.write(piece)
+                        continue
+                    delivered += len(piece)
+                    await self._deliver(name, decoder.decode(piece))
+                if not data:
+                    break
+            if spill is None:
+                await self._deliver(name, decoder.decode(b"", final=True))
+        finally:
+            if spill is not None:
+                spill.close()
+
+    def _open_spill(self, name: str) -> IO[bytes]:
+        """Temporary file for the output beyond max_bytes"""
+        spill = tempfile.NamedTemporaryFile(  # pylint: disable=R1732
+            mode="wb", prefix=f"{name}-", suffix=".out", dir=self.spill_dir, delete=False
+        )
+        self.spilled[name] = Path(spill.name)
+        LOGGER.warning(
+            "{subprocess__command_line} {stream} exceeds {max_bytes} bytes, writing the rest to {file__path}",
+            subprocess__command_line=self.cmd,
+            stream=name,
+            max_bytes=self.max_bytes,
+            file__path=spill.name,
+        )
+        return spill
+
+    async def _deliver(self, name: str, text: str) -> None:
+        """Log and queue, blocks when the queue is full"""
+        if not text:
+            return
+        if self.log_output:
+            if name == "stderr" and self.stderr_warn:
+                LOGGER.warning("{subprocess__command_line} stderr", subprocess__command_line=self.cmd, stderr=text)
+            else:
+                LOGGER.info(
+                    "{subprocess__command_line} {stream}", subprocess__command_line=self.cmd, stream=name, output=text
+                )
+        await self._queue.put(OutputChunk(name, text))
+
+
+def stream_cmd(cmd: str, timeout: Optional[float] = None, **kwargs: Any) -> CommandStream:
+    """Stream the output of cmd, use as async context manager, see :py:class:`CommandStream` for the arguments"""
+    return CommandStream(cmd, timeout, **kwargs)
@@ -0,0 +1,173 @@
+"""Resource accounting for commands
+
+With ``usage=True`` :py:func:`libpvarki.shell.call_cmd` and :py:func:`libpvarki.shell.call_exec` reap the child
+with :py:func:`os.wait4` to get its resource usage, return it as the fourth item and add it to
+:py:data:`USAGE_REGISTRY` which keeps per-command aggregates::
+
+    code, stdout, stderr, usage = await call_exec(["openssl", "genrsa", "4096"], usage=True)
+    ...
+    for name, stats in USAGE_REGISTRY.top(5):
+        LOGGER.info("{} used {:.1f}s of CPU in {} calls".format(name, stats.cpu_time, stats.calls))
+
+CPU times include the descendants the child waited for (like the ones a shell runs), max_rss is in kilobytes.
+"""
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass, replace
+from pathlib import Path
+import asyncio
+import os
+import signal
+import subprocess  # nosec
+import threading
+import time
+
+from ..logging.structured import get_logger
+
+LOGGER = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class CmdUsage:
+    """Resources used by one command, times in seconds"""
+
+    wall_time: float
+    user_time: float
+    system_time: float
+    max_rss: int
+
+    @property
+    def cpu_time(self) -> float:
+        """User + system"""
+        return self.user_time + self.system_time
+
+
+@dataclass
+class UsageStats:
+    """Aggregate for a command name, max_rss is the largest seen"""
+
+    calls: int = 0
+    wall_time: float = 0.0
+    user_time: float = 0.0
+    system_time: float = 0.0
+    max_rss: int = 0
+
+    @property
+    def cpu_time(self) -> float:
+        """User + system"""
+        return self.user_time + self.system_time
+
+    def add(self, usage: CmdUsage) -> None:
+        """Add one call"""
+        self.calls += 1
+        self.wall_time += usage.wall_time
+        self.user_time += usage.user_time
+        self.system_time += usage.system_time
+        self.max_rss = max(self.max_rss, usage.max_rss)
+
+
+class UsageRegistry:
+    """Per-command aggregates, thread-safe"""
+
+    def __init__(self) -> None:
+        self._stats: Dict[str, UsageStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, usage: CmdUsage) -> None:
+        """Add a call of command name"""
+        with self._lock:
+            self._stats.setdefault(name, UsageStats()).add(usage)
+
+    def snapshot(self) -> Dict[str, UsageStats]:
+        """Copy of the aggregates"""
+        with self._lock:
+            return {name: replace(stats) for name, stats in self._stats.items()}
+
+    def top(self, count: int = 10, key: str = "cpu_time") -> List[Tuple[str, UsageStats]]:
+        """The most expensive commands by the given UsageStats attribute"""
+        return sorted(self.snapshot().items(), key=lambda item: getattr(item[1], key), reverse=True)[:count]
+
+    def clear(self) -> None:
+        """Forget everything"""
+        with self._lock:
+            self._stats.clear()
+
+
+#: The registry call_cmd and call_exec record to
+USAGE_REGISTRY = UsageRegistry()
+
+
+def _wait4_thread(pid: int, loop: asyncio.AbstractEventLoop) -> "asyncio.Future[Tuple[int, Any]]":
+    """Reap pid with wait4 in a dedicated thread (so long-running commands do not starve the default executor)"""
+    future: "asyncio.Future[Tuple[int, Any]]" = loop.create_future()
+
+    def set_result(result: Tuple[int, Any]) -> None:
+        if not future.done():
+            future.set_result(result)
+
+    def reaper() -> None:
+        _, status, rusage = os.wait4(pid, 0)
+        loop.call_soon_threadsafe(set_result, (os.waitstatus_to_exitcode(status), rusage))
+
+    threading.Thread(target=reaper, name=f"wait4-{pid}", daemon=True).start()
+    return future
+
+
+async def _read_pipe(loop: asyncio.AbstractEventLoop, pipe: Any) -> bytes:
+    """Read until EOF without blocking the loop"""
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    return await reader.read()
+
+
+async def run_with_usage(  # pylint: disable=R0913
+    args: Union[str, Sequence[Union[str, Path]]],
+    timeout: float,
+    *,
+    shell: bool,
+    env: Optional[Mapping[str, str]] = None,
+    cwd: Optional[Union[str, Path]] = None,
+) -> Tuple[int, bytes, bytes, CmdUsage]:
+    """Run the command, returns exit code, stdout, stderr and the usage, kills the process group on timeout"""
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    process = subprocess.Popen(  # nosec # pylint: disable=R1732
+        args,
+        shell=shell,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        cwd=cwd,
+        start_new_session=True,
+    )
+    reaped = _wait4_thread(process.pid, loop)
+
+    async def collect() -> Tuple[bytes, bytes]:
+        out, err = await asyncio.gather(_read_pipe(loop, process.stdout), _read_pipe(loop, process.stderr))
+        await asyncio.shield(reaped)
+        return out, err
+
+    try:
+        out, err = await asyncio.wait_for(collect(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        if not reaped.done():
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        await asyncio.shield(reaped)
+        process.returncode = reaped.result()[0]
+        raise
+    returncode, rusage = reaped.result()
+    process.returncode = returncode
+    return (
+        returncode,
+        out,
+        err,
+        CmdUsage(
+            wall_time=time.monotonic() - started,
+            user_time=rusage.ru_utime,
+            system_time=rusage.ru_stime,
+            max_rss=rusage.ru_maxrss,
+        ),
+    )
@@ -0,0 +1,26 @@
+"""Micro-benchmarks, these log their results and check that the optimized paths are not slower
+
+The timing comparisons are only asserted when :py:func:`timings_reliable`, otherwise the tests are skipped after
+logging their results. The default run measures coverage, CI runs them again without it::
+
+    poetry run py.test -v --no-cov tests/benchmarks
+"""
+
+import sys
+
+import pytest
+
+
+def timings_reliable() -> bool:
+    """False when a tracer (coverage, debugger) is active, it slows down our code a lot more than the stdlib
+    so close comparisons can't be trusted"""
+    if sys.gettrace() is not None:
+        return False
+    coverage = sys.modules.get("coverage")
+    return coverage is None or coverage.Coverage.current() is None
+
+
+def require_reliable_timings() -> None:
+    """Skip the rest of the test (call it after logging the results) unless timings_reliable()"""
+    if not timings_reliable():
+        pytest.skip("timings are not comparable under coverage or a debugger, run with --no-cov")
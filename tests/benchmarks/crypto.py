@@ -0,0 +1,275 @@
+"""Benchmark suite for the key, CSR, PKCS12 and SSL context helpers
+
+Runs every operation for every key size and batch size serially and in thread and process pools of the given
+widths, all offline with throwaway keys and self-signed certs. Results are written as JSON, compare two result
+files to find regressions::
+
+    PYTHONPATH=src python -m tests.benchmarks.crypto run --output new.json
+    PYTHONPATH=src python -m tests.benchmarks.crypto compare old.json new.json --threshold 0.15
+
+compare exits with 1 if any case got slower than threshold (relative to the per-operation time).
+"""
+
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import os
+import platform
+import ssl
+import sys
+import tempfile
+import time
+import uuid
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+import libpvarki
+from libpvarki.mtlshelp.context import get_ssl_context
+from libpvarki.mtlshelp.csr import create_client_csr, create_keypair, create_server_csr
+from libpvarki.mtlshelp.pkcs12 import convert_pem_to_pkcs12
+
+LOGGER = logging.getLogger(__name__)
+RESULTS_FORMAT = 1
+# create_keypair only supports RSA for now
+KEY_TYPES = ("RSA",)
+OPERATIONS = ("create_keypair", "create_client_csr", "create_server_csr", "convert_pem_to_pkcs12", "get_ssl_context")
+POOLS = ("serial", "thread", "process")
+
+# Per worker (process) state set by _init_worker: workdir and ksize -> (key, keypath, certpath)
+_WORKDIR = Path()
+_MATERIAL: Dict[int, Tuple[rsa.RSAPrivateKey, Path, Path]] = {}
+
+
+class Case(NamedTuple):
+    """One benchmarked combination"""
+
+    operation: str
+    ktype: str
+    ksize: int
+    batch: int
+    pool: str
+    workers: int
+
+    @property
+    def name(self) -> str:
+        """Stable identifier used to match results between runs"""
+        return f"{self.operation}[{self.ktype.lower()}{self.ksize},batch={self.batch},{self.pool}={self.workers}]"
+
+
+class Comparison(NamedTuple):
+    """Case present in both result files"""
+
+    name: str
+    base: float
+    new: float
+
+    @property
+    def ratio(self) -> float:
+        """new / base per-operation time"""
+        return self.new / self.base if self.base else float("inf")
+
+
+def _self_signed(key: rsa.RSAPrivateKey, common_name: str) -> bytes:
+    """PEM cert for key, usable as CA and server cert"""
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(common_name)]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    return cert.public_bytes(serialization.Encoding.PEM)
+
+
+def prepare(workdir: Path, ksizes: Sequence[int]) -> Dict[int, Tuple[Path, Path]]:
+    """Create a key and self-signed cert per key size, returns ksize -> (keypath, certpath)"""
+    (workdir / "ca").mkdir(exist_ok=True)
+    paths = {}
+    for ksize in ksizes:
+        keypath, certpath = workdir / f"rsa{ksize}.key", workdir / f"rsa{ksize}.pem"
+        key = create_keypair(keypath, workdir / f"rsa{ksize}.pub", ksize=ksize)
+        certpath.write_bytes(_self_signed(key, f"bench{ksize}.localmaeher.dev.pvarki.fi"))
+        (workdir / "ca" / f"ca{ksize}.pem").write_bytes(certpath.read_bytes())
+        paths[ksize] = (keypath, certpath)
+    return paths
+
+
+def _init_worker(workdir: Path, paths: Dict[int, Tuple[Path, Path]]) -> None:
+    """Load the keys once per worker so the operations don't measure key loading"""
+    global _WORKDIR  # pylint: disable=W0603
+    _WORKDIR = workdir
+    for ksize, (keypath, certpath) in paths.items():
+        key = serialization.load_pem_private_key(keypath.read_bytes(), None)
+        assert isinstance(key, rsa.RSAPrivateKey)
+        _MATERIAL[ksize] = (key, keypath, certpath)
+
+
+def _run_operation(operation: str, ksize: int) -> None:
+    """Do operation once, module level so that process pools can pickle it"""
+    key, keypath, certpath = _MATERIAL[ksize]
+    unique = uuid.uuid4().hex
+    if operation == "create_keypair":
+        create_keypair(_WORKDIR / f"{unique}.key", _WORKDIR / f"{unique}.pub", ksize=ksize)
+    elif operation == "create_client_csr":
+        create_client_csr(key, _WORKDIR / f"{unique}.csr", {"CN": "bench.pvarki.fi", "O": "pvarki"})
+    elif operation == "create_server_csr":
+        create_server_csr(key, _WORKDIR / f"{unique}.csr", ["bench.pvarki.fi", "127.0.0.1"])
+    elif operation == "convert_pem_to_pkcs12":
+        convert_pem_to_pkcs12(certpath, keypath, "benchmark", friendlyname="bench")
+    elif operation == "get_ssl_context":
+        get_ssl_context(ssl.Purpose.SERVER_AUTH, (certpath, keypath), _WORKDIR / "ca")
+    else:
+        raise ValueError(f"Unknown operation {operation}")
+
+
+@contextmanager
+def _executor(pool: str, workers: int, workdir: Path, paths: Dict[int, Tuple[Path, Path]]) -> Iterator[Executor]:
+    """Warmed up pool (the workers exist and have loaded the keys)"""
+    executor: Executor
+    if pool == "process":
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(workdir, paths))
+    else:
+        _init_worker(workdir, paths)
+        executor = ThreadPoolExecutor(workers)
+    with executor:
+        list(executor.map(time.sleep, [0.01] * workers))
+        yield executor
+
+
+def _measure(case: Case, executor: Optional[Executor], repeat: int) -> float:
+    """Best wall time of repeat batches"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        if executor is None:
+            for _ in range(case.batch):
+                _run_operation(case.operation, case.ksize)
+        else:
+            futures = [executor.submit(_run_operation, case.operation, case.ksize) for _ in range(case.batch)]
+            for future in futures:
+                future.result()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run_suite(  # pylint: disable=R0913,R0914,R0917
+    workdir: Path,
+    operations: Sequence[str] = OPERATIONS,
+    ksizes: Sequence[int] = (2048, 3072, 4096),
+    batches: Sequence[int] = (1, 16),
+    pools: Sequence[str] = POOLS,
+    widths: Sequence[int] = (1, 2, 4),
+    repeat: int = 3,
+) -> Dict[str, Any]:
+    """Run all the combinations, returns the JSON-serializable results"""
+    paths = prepare(workdir, ksizes)
+    results: List[Dict[str, Any]] = []
+    for pool in pools:
+        for workers in (1,) if pool == "serial" else widths:
+            with _executor(pool, workers, workdir, paths) as executor:
+                for operation, ktype, ksize, batch in itertools.product(operations, KEY_TYPES, ksizes, batches):
+                    case = Case(operation, ktype, ksize, batch, pool, workers)
+                    seconds = _measure(case, None if pool == "serial" else executor, repeat)
+                    LOGGER.info("{}: {:.2f}ms per op".format(case.name, seconds / batch * 1e3))
+                    results.append(
+                        {
+                            "name": case.name,
+                            **case._asdict(),
+                            "seconds": seconds,
+                            "per_op": seconds / batch,
+                            "ops_per_second": batch / seconds,
+                        }
+                    )
+    return {
+        "format": RESULTS_FORMAT,
+        "libpvarki": libpvarki.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any]) -> List[Comparison]:
+    """Per-operation times of the cases in both, in the order of new"""
+    if base.get("format") != RESULTS_FORMAT or new.get("format") != RESULTS_FORMAT:
+        raise ValueError("Unknown results format")
+    base_times = {result["name"]: result["per_op"] for result in base["results"]}
+    return [
+        Comparison(result["name"], base_times[result["name"]], result["per_op"])
+        for result in new["results"]
+        if result["name"] in base_times
+    ]
+
+
+def regressions(comparisons: Sequence[Comparison], threshold: float) -> List[Comparison]:
+    """The cases that got more than threshold (0.1 = 10%) slower"""
+    return [comparison for comparison in comparisons if comparison.ratio > 1.0 + threshold]
+
+
+def _ints(value: str) -> List[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def _strs(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",")]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command line entrypoint"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Run the benchmarks")
+    run.add_argument("--output", type=Path, required=True)
+    run.add_argument("--operations", type=_strs, default=list(OPERATIONS))
+    run.add_argument("--key-sizes", type=_ints, default=[2048, 3072, 4096])
+    run.add_argument("--batch-sizes", type=_ints, default=[1, 16])
+    run.add_argument("--pools", type=_strs, default=list(POOLS))
+    run.add_argument("--workers", type=_ints, default=[1, 2, 4])
+    run.add_argument("--repeat", type=int, default=3)
+    cmp = commands.add_parser("compare", help="Compare two result files")
+    cmp.add_argument("base", type=Path)
+    cmp.add_argument("new", type=Path)
+    cmp.add_argument("--threshold", type=float, default=0.1, help="Allowed slowdown, 0.1 = 10%%")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results = run_suite(
+                Path(tmpdir), args.operations, args.key_sizes, args.batch_sizes, args.pools, args.workers, args.repeat
+            )
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        return 0
+
+    comparisons = compare(json.loads(args.base.read_bytes()), json.loads(args.new.read_bytes()))
+    slower = regressions(comparisons, args.threshold)
+    for comparison in comparisons:
+        flag = " REGRESSION" if comparison in slower else ""
+        print(
+            "{}: {:.2f}ms -> {:.2f}ms ({:+.1%}){}".format(
+                comparison.name, comparison.base * 1e3, comparison.new * 1e3, comparison.ratio - 1, flag
+            )
+        )
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
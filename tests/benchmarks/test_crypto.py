@@ -0,0 +1,52 @@
+"""Run the crypto benchmark suite with small sizes and check the comparison tool"""
+
+from pathlib import Path
+import json
+import logging
+
+import pytest
+
+from .crypto import OPERATIONS, compare, main, regressions, run_suite
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=W0621
+
+
+@pytest.fixture(scope="module")
+def results(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Every operation once with the smallest key, serially and in pools of two"""
+    workdir = tmp_path_factory.mktemp("cryptobench")
+    data = run_suite(workdir, ksizes=(2048,), batches=(2,), widths=(2,), repeat=1)
+    path = workdir / "results.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path
+
+
+def test_results(results: Path) -> None:
+    """All the combinations are there"""
+    data = json.loads(results.read_bytes())
+    assert data["format"] == 1
+    assert len(data["results"]) == len(OPERATIONS) * 3
+    names = {result["name"] for result in data["results"]}
+    assert "create_client_csr[rsa2048,batch=2,process=2]" in names
+    assert all(result["per_op"] > 0 for result in data["results"])
+
+
+def test_compare(results: Path, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Slowdowns above the threshold are flagged"""
+    base = json.loads(results.read_bytes())
+    assert not regressions(compare(base, base), 0.1)
+
+    slower = json.loads(results.read_bytes())
+    slower["results"][0]["per_op"] *= 1.5
+    slower["results"] = slower["results"][:2]
+    flagged = regressions(compare(base, slower), 0.1)
+    assert [comparison.name for comparison in flagged] == [slower["results"][0]["name"]]
+    assert regressions(compare(base, slower), 0.6) == []
+
+    newpath = tmp_path / "new.json"
+    newpath.write_text(json.dumps(slower), encoding="utf-8")
+    assert main(["compare", str(results), str(newpath)]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+    assert main(["compare", str(results), str(results), "--threshold", "0"]) == 0
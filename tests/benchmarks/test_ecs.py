@@ -0,0 +1,42 @@
+"""Benchmark the native ECS formatter against ecs_logging"""
+
+import logging
+import timeit
+
+import ecs_logging
+
+from libpvarki.logging import ECSFormatter
+
+from ..conftest import RecordFactory
+from . import require_reliable_timings
+
+LOGGER = logging.getLogger(__name__)
+ROUNDS = 5000
+
+
+def records_per_second(formatter: logging.Formatter, record: logging.LogRecord) -> float:
+    """Best of three"""
+    best = min(timeit.repeat(lambda: formatter.format(record), number=ROUNDS, repeat=3))
+    return ROUNDS / best
+
+
+def test_ecs_formatter_throughput(make_record: RecordFactory) -> None:
+    """Plain records and records with global labels, both typical request log records"""
+    request = ("GET %s -> %d", "/api/v1/users", 200)
+    labels = {"service.name": "rmapi", "labels.env": "prod", "deployment": "sleepy-sloth"}
+    rates = []
+    for name, record in (
+        ("plain", make_record(*request, name="app.api")),
+        ("labels", make_record(*request, name="app.api", **labels)),
+    ):
+        stdlib_rate = records_per_second(ecs_logging.StdlibFormatter(), record)
+        native_rate = records_per_second(ECSFormatter(), record)
+        LOGGER.info(
+            "ECS {}: ecs_logging {:.0f} rec/s, native {:.0f} rec/s ({:.1f}x)".format(
+                name, stdlib_rate, native_rate, native_rate / stdlib_rate
+            )
+        )
+        rates.append((native_rate, stdlib_rate))
+    require_reliable_timings()
+    for native_rate, stdlib_rate in rates:
+        assert native_rate > stdlib_rate
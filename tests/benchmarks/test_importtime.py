@@ -0,0 +1,51 @@
+"""Import time of the packages (python -X importtime), the light ones must not pull in the heavy dependencies"""
+
+from typing import Dict, Tuple
+import logging
+import os
+import subprocess  # nosec
+import sys
+
+import pytest
+
+LOGGER = logging.getLogger(__name__)
+HEAVY = ("aiohttp", "fastapi", "starlette", "cryptography", "pydantic", "multiprocessing")
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """Cumulative import time (us) of every module imported by `import module` in a fresh interpreter"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run(  # nosec
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    times: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    "module,lazy",
+    [
+        ("libpvarki", HEAVY),
+        ("libpvarki.logging", HEAVY),
+        ("libpvarki.shell", HEAVY),
+        ("libpvarki.mtlshelp", HEAVY),
+        ("libpvarki.middleware", HEAVY),
+        ("libpvarki.products", HEAVY),
+        ("libpvarki.schemas.product", ("aiohttp", "fastapi", "cryptography", "multiprocessing")),
+    ],
+)
+def test_import_time(module: str, lazy: Tuple[str, ...]) -> None:
+    """Log the import time and check that the lazily loaded dependencies stay unloaded"""
+    times = import_times(module)
+    LOGGER.info("import {}: {:.1f}ms".format(module, times[module] / 1000))
+    assert not [name for name in times if name.split(".")[0] in lazy]
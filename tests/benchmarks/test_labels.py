@@ -0,0 +1,71 @@
+"""Benchmark attaching labels once per record (wrapped makeRecord) vs AddExtrasFilter on every handler"""
+
+from typing import Iterator
+import logging
+import timeit
+
+import pytest
+
+from libpvarki.logging import AddExtrasFilter, set_global_labels
+from libpvarki.logging.labels import install_label_factory
+
+from . import require_reliable_timings
+
+LOGGER = logging.getLogger(__name__)
+ROUNDS = 5000
+LABELS = {f"labels.label{idx}": f"value{idx}" for idx in range(8)}
+
+# pylint: disable=W0621
+
+
+class DiscardHandler(logging.Handler):
+    """Run the handler machinery but throw the record away"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Do nothing"""
+
+
+@pytest.fixture
+def bench_logger() -> Iterator[logging.Logger]:
+    """Logger that does not propagate to the test loggers"""
+    logger = logging.getLogger("libpvarki.bench.labels")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    yield logger
+    logger.handlers.clear()
+    set_global_labels(None)
+
+
+def label_cost(logger: logging.Logger) -> float:
+    """Best of three, microseconds per logging call"""
+    return min(timeit.repeat(lambda: logger.info("hello"), number=ROUNDS, repeat=3)) / ROUNDS * 1_000_000
+
+
+def test_label_cost(bench_logger: logging.Logger) -> None:
+    """Per-record cost with 1 and 4 handlers"""
+    install_label_factory()  # init_logging installs this anyway, without labels it just passes records through
+    costs = []
+    for handler_count in (1, 4):
+        bench_logger.handlers.clear()
+        set_global_labels(None)
+        for _ in range(handler_count):
+            handler = DiscardHandler()
+            handler.addFilter(AddExtrasFilter(LABELS))
+            bench_logger.addHandler(handler)
+        filter_cost = label_cost(bench_logger)
+
+        bench_logger.handlers.clear()
+        for _ in range(handler_count):
+            bench_logger.addHandler(DiscardHandler())
+        set_global_labels(LABELS)
+        factory_cost = label_cost(bench_logger)
+        LOGGER.info(
+            "{} labels on {} handlers: filter {:.2f}us, factory {:.2f}us per record".format(
+                len(LABELS), handler_count, filter_cost, factory_cost
+            )
+        )
+        if handler_count > 1:
+            costs.append((factory_cost, filter_cost))
+    require_reliable_timings()
+    for factory_cost, filter_cost in costs:
+        assert factory_cost < filter_cost
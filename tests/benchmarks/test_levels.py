@@ -0,0 +1,36 @@
+"""Benchmark disabled custom level methods against disabled stdlib ones"""
+
+from typing import Any, Dict
+import logging
+import timeit
+
+from libpvarki.logging import add_trace_and_audit
+
+from . import require_reliable_timings
+
+LOGGER = logging.getLogger(__name__)
+ROUNDS = 100000
+
+
+def per_call(stmt: str, namespace: Dict[str, Any]) -> float:
+    """Best of five, nanoseconds per call"""
+    return min(timeit.repeat(stmt, globals=namespace, number=ROUNDS, repeat=5)) / ROUNDS * 1_000_000_000
+
+
+def test_disabled_trace_cost() -> None:
+    """Disabled trace() costs about the same as disabled debug()"""
+    add_trace_and_audit()
+    logger = logging.getLogger("libpvarki.bench.levels")
+    logger.setLevel(logging.INFO)
+    adapter = logging.LoggerAdapter(logger, {})
+    namespace: Dict[str, Any] = {"logger": logger, "adapter": adapter}
+    results = {
+        "logger.debug": per_call('logger.debug("disabled %s", 1)', namespace),
+        "logger.trace": per_call('logger.trace("disabled %s", 1)', namespace),
+        "adapter.debug": per_call('adapter.debug("disabled %s", 1)', namespace),
+        "adapter.trace": per_call('adapter.trace("disabled %s", 1)', namespace),
+    }
+    LOGGER.info("Disabled call cost: {}".format(", ".join(f"{key} {value:.0f}ns" for key, value in results.items())))
+    require_reliable_timings()
+    assert results["logger.trace"] < results["logger.debug"] * 1.5
+    assert results["adapter.trace"] < results["adapter.debug"]
@@ -0,0 +1,36 @@
+"""Benchmark validating a batch of users one model at a time vs the cached list TypeAdapter"""
+
+from typing import Any, Dict
+import json
+import logging
+import timeit
+
+from libpvarki.schemas.product import UserCRUDRequest, validate_users
+
+from . import require_reliable_timings
+
+LOGGER = logging.getLogger(__name__)
+ROUNDS = 20
+PER_ITEM_STMT = "[UserCRUDRequest.model_validate(user) for user in json.loads(payload)]"
+BATCH_STMT = "validate_users(payload)"
+
+
+def test_batch_validation() -> None:
+    """Parse and validate 1000 users from JSON"""
+    users = [
+        {"uuid": f"00000000-0000-0000-0000-{idx:012d}", "callsign": f"ROTTA{idx}a", "x509cert": "x" * 1500}
+        for idx in range(1000)
+    ]
+    namespace: Dict[str, Any] = {
+        "json": json,
+        "UserCRUDRequest": UserCRUDRequest,
+        "validate_users": validate_users,
+        "payload": json.dumps(users).encode("utf-8"),
+    }
+    per_item = min(timeit.repeat(PER_ITEM_STMT, globals=namespace, number=ROUNDS, repeat=3)) / ROUNDS
+    batch = min(timeit.repeat(BATCH_STMT, globals=namespace, number=ROUNDS, repeat=3)) / ROUNDS
+    LOGGER.info(
+        "1000 users: per-item {:.2f}ms, batch {:.2f}ms ({:.1f}x)".format(per_item * 1e3, batch * 1e3, per_item / batch)
+    )
+    require_reliable_timings()
+    assert batch < per_item
@@ -0,0 +1,41 @@
+"""Benchmark spawn latency of call_cmd (via /bin/sh) against call_exec"""
+
+from typing import List
+import logging
+import shutil
+import statistics
+import time
+
+import pytest
+
+from libpvarki.shell import call_cmd, call_exec
+
+from . import require_reliable_timings
+
+LOGGER = logging.getLogger(__name__)
+ROUNDS = 200
+
+
+@pytest.mark.asyncio
+async def test_spawn_latency() -> None:
+    """Short-lived external command spawned many times, interleaved so both see the same system load"""
+    echo = shutil.which("echo")
+    assert echo
+    shell_times: List[float] = []
+    exec_times: List[float] = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        await call_cmd(f"{echo} hello")
+        shell_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await call_exec([echo, "hello"])
+        exec_times.append(time.perf_counter() - started)
+    shell_latency = statistics.median(shell_times)
+    exec_latency = statistics.median(exec_times)
+    LOGGER.info(
+        "Spawn latency (median): call_cmd {:.2f}ms, call_exec {:.2f}ms ({:.1f}x)".format(
+            shell_latency * 1000, exec_latency * 1000, shell_latency / exec_latency
+        )
+    )
+    require_reliable_timings()
+    assert exec_latency < shell_latency
@@ -0,0 +1,61 @@
+"""Benchmark the cost of disabled debug logging on the PKCS12 and context paths, eager vs structured"""
+
+from typing import Any, Dict
+from pathlib import Path
+import logging
+import ssl
+import timeit
+
+from cryptography import x509
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+from libpvarki.logging import get_logger
+
+from . import require_reliable_timings
+
+LOGGER = logging.getLogger(__name__)
+ROUNDS = 20000
+EAGER_STMT = """
+eager.debug("key={}".format(key))
+eager.debug("main_cert={}".format(main_cert))
+eager.debug("other_certs={}".format(other_certs))
+eager.debug("ssl.create_default_context(purpose={})".format(purpose))
+eager.debug("Adding cert {}".format(cafile))
+"""
+LAZY_STMT = """
+lazy.debug(
+    "key={pkcs12__key} main_cert={pkcs12__main_cert} other_certs={pkcs12__other_certs}",
+    pkcs12__key=key,
+    pkcs12__main_cert=main_cert,
+    pkcs12__other_certs=other_certs,
+)
+lazy.debug("ssl.create_default_context(purpose={purpose})", purpose=purpose)
+lazy.debug("Adding cert {file__path}", file__path=cafile)
+"""
+
+
+def test_disabled_debug_cost(datadir: Path) -> None:
+    """The log statements of serialize_legacy_pkcs12 and get_ca_context with DEBUG disabled"""
+    persistent = datadir / "persistent"
+    certs = x509.load_pem_x509_certificates((persistent / "public" / "mtlsclient.pem").read_bytes())
+    key = load_pem_private_key((persistent / "private" / "mtlsclient.key").read_bytes(), None)
+    eager = logging.getLogger("libpvarki.bench.structured")
+    eager.setLevel(logging.INFO)
+    namespace: Dict[str, Any] = {
+        "eager": eager,
+        "lazy": get_logger(eager.name),
+        "key": key,
+        "main_cert": certs[0],
+        "other_certs": certs,
+        "purpose": ssl.Purpose.SERVER_AUTH,
+        "cafile": next((datadir / "ca_public").glob("*.pem")),
+    }
+    eager_cost = min(timeit.repeat(EAGER_STMT, globals=namespace, number=ROUNDS, repeat=3)) / ROUNDS
+    lazy_cost = min(timeit.repeat(LAZY_STMT, globals=namespace, number=ROUNDS, repeat=3)) / ROUNDS
+    LOGGER.info(
+        "Disabled debug statements: eager {:.1f}us, structured {:.1f}us ({:.0f}x)".format(
+            eager_cost * 1e6, lazy_cost * 1e6, eager_cost / lazy_cost
+        )
+    )
+    require_reliable_timings()
+    assert lazy_cost < eager_cost
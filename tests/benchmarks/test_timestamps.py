@@ -0,0 +1,43 @@
+"""Benchmark the UTCISOFormatter timestamp caching"""
+
+from typing import Optional
+import logging
+import timeit
+
+from libpvarki.logging import UTCISOFormatter
+
+from . import require_reliable_timings
+
+LOGGER = logging.getLogger(__name__)
+ROUNDS = 20000
+
+
+def per_record_cost(formatter: UTCISOFormatter, datefmt: Optional[str]) -> float:
+    """Best of three, in microseconds, records advance 100us each so we cross second boundaries too"""
+    record = logging.LogRecord("bench", logging.INFO, __file__, 1, "msg", None, None)
+    start = record.created
+
+    def format_one() -> None:
+        record.created += 0.0001
+        formatter.formatTime(record, datefmt)
+
+    timings = []
+    for _ in range(3):
+        record.created = start
+        timings.append(timeit.timeit(format_one, number=ROUNDS))
+    return min(timings) / ROUNDS * 1_000_000
+
+
+def test_timestamp_cache_cost() -> None:
+    """Per-record cost with and without the cache"""
+    costs = []
+    for datefmt in (None, "%Y-%m-%d %H:%M:%S"):
+        uncached = per_record_cost(UTCISOFormatter(cache_timestamps=False), datefmt)
+        cached = per_record_cost(UTCISOFormatter(), datefmt)
+        LOGGER.info(
+            "formatTime(datefmt={!r}): uncached {:.2f}us, cached {:.2f}us per record".format(datefmt, uncached, cached)
+        )
+        costs.append((cached, uncached))
+    require_reliable_timings()
+    for cached, uncached in costs:
+        assert cached < uncached
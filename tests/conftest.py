@@ -1,6 +1,6 @@
 """pytest automagics"""
 
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Callable, List
 import logging
 from pathlib import Path
 import ssl
@@ -12,6 +12,7 @@ from aiohttp import web
 
 from libpvarki.logging import init_logging
 from libpvarki.mtlshelp import get_ssl_context
+from libpvarki.settings import reload
 
 init_logging(logging.DEBUG)
 LOGGER = logging.getLogger(__name__)
@@ -19,6 +20,61 @@ LOGGER = logging.getLogger(__name__)
 # pylint: disable=W0621
 
 
+RecordFactory = Callable[..., logging.LogRecord]
+
+
+class FakeClock:  # pylint: disable=R0903
+    """Manually advanced clock"""
+
+    def __init__(self) -> None:
+        """init"""
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        """Current time"""
+        return self.now
+
+
+class ListHandler(logging.Handler):
+    """Keep the records"""
+
+    def __init__(self) -> None:
+        """init"""
+        super().__init__()
+        self.records: List[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Keep it"""
+        self.records.append(record)
+
+
+def _make_record(
+    msg: str, *args: Any, level: int = logging.INFO, name: str = "test", **extras: Any
+) -> logging.LogRecord:
+    """Create a record, extras are set as attributes (dotted keys too)"""
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None, "func")
+    record.__dict__.update(extras)
+    return record
+
+
+@pytest.fixture
+def fake_clock() -> FakeClock:
+    """Clock for the things that take one, advance by incrementing now"""
+    return FakeClock()
+
+
+@pytest.fixture
+def list_handler() -> ListHandler:
+    """Handler that collects the records"""
+    return ListHandler()
+
+
+@pytest.fixture
+def make_record() -> RecordFactory:
+    """make_record(msg, *args, level=logging.INFO, name="test", **extras) -> LogRecord"""
+    return _make_record
+
+
 @pytest.fixture(scope="session")
 def datadir() -> Path:
     """Resolve the data dir"""
@@ -30,6 +86,7 @@ def tls_env_variables(datadir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
     """Set the TLS paths to env"""
     monkeypatch.setenv("PERSISTENT_DATA_PATH", str(datadir / "persistent"))
     monkeypatch.setenv("LOCAL_CA_CERTS_PATH", str(datadir / "ca_public"))
+    reload()
 
 
 @pytest_asyncio.fixture()
@@ -0,0 +1 @@
+"""mTLS load-test harness, see :py:mod:`.harness`"""
@@ -0,0 +1,34 @@
+"""Run the mTLS load test: PYTHONPATH=src python -m tests.loadtest --requests 1000 --concurrency 32 --no-reuse"""
+
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import tempfile
+
+from .harness import mtls_server, run_load
+from .pki import create_pki
+
+
+async def main() -> None:
+    """Create the PKI, start the server and report as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--reuse", action=argparse.BooleanOptionalAction, default=True, help="Keep-alive connections")
+    parser.add_argument(
+        "--resume", action="store_true", help="Offer the previous TLS session on every new connection, needs --no-reuse"
+    )
+    parser.add_argument("--key-size", type=int, default=2048)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pki = create_pki(Path(tmpdir), ksize=args.key_size)
+        async with mtls_server(pki) as server:
+            report = await run_load(
+                server, pki, requests=args.requests, concurrency=args.concurrency, reuse=args.reuse, resume=args.resume
+            )
+    print(json.dumps(report.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,270 @@
+"""Local mTLS server and a load generator using :py:func:`libpvarki.mtlshelp.get_session`
+
+Measures how expensive new TLS connections are compared to reusing them::
+
+    pki = create_pki(tmpdir)
+    async with mtls_server(pki) as server:
+        report = await run_load(server, pki, requests=1000, concurrency=32, reuse=False)
+    print(report.summary())
+
+With reuse off every request sends ``Connection: close`` so each one does a full TCP and TLS handshake. asyncio
+clients cannot offer a previous TLS session back so the resumption rate is only reported (as measured by the
+server) with ``resume=True``, which swaps the aiohttp session for threaded blocking clients that pass the session
+of their previous connection to ``wrap_socket``. Otherwise it is ``None``.
+"""
+
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+import asyncio
+import logging
+import math
+import socket
+import ssl
+import threading
+import time
+import weakref
+
+import aiohttp
+from aiohttp import web
+
+from libpvarki.mtlshelp import get_session, get_ssl_context
+
+from .pki import PKI
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class ServerStats:
+    """What the server has seen"""
+
+    connections: int = 0
+    resumed: int = 0
+    requests: int = 0
+    peers: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class LoadServer:
+    """Running server"""
+
+    host: str
+    port: int
+    stats: ServerStats
+
+    @property
+    def url(self) -> str:
+        """Base URL"""
+        return f"https://{self.host}:{self.port}/"
+
+
+@dataclass(frozen=True)
+class LoadReport:  # pylint: disable=R0902
+    """Result of a run, times in seconds"""
+
+    requests: int
+    concurrency: int
+    reuse: bool
+    resume: bool
+    elapsed: float
+    errors: int
+    handshakes: int
+    resumed: int
+    latencies: Tuple[float, ...]
+
+    @property
+    def requests_per_second(self) -> float:
+        """Completed requests per second"""
+        return len(self.latencies) / self.elapsed
+
+    @property
+    def handshakes_per_second(self) -> float:
+        """New TLS connections per second"""
+        return self.handshakes / self.elapsed
+
+    @property
+    def resumption_rate(self) -> Optional[float]:
+        """Share of the handshakes that resumed a session, None if the client did not offer sessions"""
+        if not self.resume:
+            return None
+        return self.resumed / self.handshakes if self.handshakes else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Latency percentile (nearest rank)"""
+        if not self.latencies:
+            return math.nan
+        rank = max(math.ceil(percent / 100 * len(self.latencies)), 1)
+        return self.latencies[rank - 1]
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-serializable summary"""
+        return {
+            "requests": self.requests,
+            "concurrency": self.concurrency,
+            "reuse": self.reuse,
+            "resume": self.resume,
+            "errors": self.errors,
+            "elapsed": round(self.elapsed, 3),
+            "requests_per_second": round(self.requests_per_second, 1),
+            "handshakes": self.handshakes,
+            "handshakes_per_second": round(self.handshakes_per_second, 1),
+            "resumption_rate": None if self.resumption_rate is None else round(self.resumption_rate, 3),
+            "latency_ms": {f"p{pct}": round(self.percentile(pct) * 1e3, 2) for pct in (50, 90, 99, 100)},
+        }
+
+
+def _peer_cn(peercert: Any) -> str:
+    """commonName from the getpeercert() dict"""
+    for rdn in peercert.get("subject", ()) if peercert else ():
+        for key, value in rdn:
+            if key == "commonName":
+                return str(value)
+    return ""
+
+
+@asynccontextmanager
+async def mtls_server(pki: PKI, host: str = "127.0.0.1") -> AsyncIterator[LoadServer]:
+    """aiohttp server on a free port that requires a client cert signed by the PKI CA"""
+    ssl_ctx = get_ssl_context(ssl.Purpose.CLIENT_AUTH, (pki.server_cert, pki.server_key), pki.ca_dir)
+    ssl_ctx.verify_mode = ssl.CERT_REQUIRED
+    stats = ServerStats()
+    seen: "weakref.WeakSet[asyncio.BaseTransport]" = weakref.WeakSet()
+
+    async def handle(request: web.Request) -> web.Response:
+        transport = request.transport
+        assert transport is not None
+        if transport not in seen:
+            seen.add(transport)
+            stats.connections += 1
+            sslobj = transport.get_extra_info("ssl_object")
+            if sslobj is not None and sslobj.session_reused:
+                stats.resumed += 1
+        stats.requests += 1
+        peer = _peer_cn(transport.get_extra_info("peercert"))
+        stats.peers[peer] = stats.peers.get(peer, 0) + 1
+        return web.json_response({"cn": peer})
+
+    app = web.Application()
+    app.add_routes([web.get("/", handle)])
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0, ssl_context=ssl_ctx)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        yield LoadServer(host, port, stats)
+    finally:
+        await runner.cleanup()
+
+
+def _get_resuming(
+    ssl_ctx: ssl.SSLContext, server: LoadServer, session: Optional[ssl.SSLSession]
+) -> Optional[ssl.SSLSession]:
+    """One GET on a new connection offering session, returns the session to offer next time"""
+    request = f"GET / HTTP/1.1\r\nHost: {server.host}:{server.port}\r\nConnection: close\r\n\r\n".encode("ascii")
+    with socket.create_connection((server.host, server.port)) as sock:
+        with ssl_ctx.wrap_socket(sock, server_hostname=server.host, session=session) as tls:
+            tls.sendall(request)
+            response = bytearray()
+            while chunk := tls.recv(65536):
+                response += chunk
+            # TLS 1.3 tickets arrive after the handshake so the session is only usable after reading
+            session = tls.session
+    if not response.startswith(b"HTTP/1.1 200 "):
+        raise ConnectionError(f"Unexpected response {bytes(response[:40])!r}")
+    return session
+
+
+async def _session_workers(
+    server: LoadServer, pki: PKI, requests: int, concurrency: int, reuse: bool
+) -> Tuple[List[float], int, float]:
+    """aiohttp workers sharing one session, returns latencies, errors and elapsed"""
+    headers = {} if reuse else {"Connection": "close"}
+    latencies: List[float] = []
+    errors = 0
+    remaining: Iterator[int] = iter(range(requests))
+
+    async with get_session((pki.client_cert, pki.client_key), pki.ca_dir) as session:
+
+        async def worker() -> None:
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    async with session.get(server.url, headers=headers) as resp:
+                        resp.raise_for_status()
+                        await resp.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                    LOGGER.warning("Request failed: {}".format(exc))
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+
+async def _resuming_workers(
+    server: LoadServer, pki: PKI, requests: int, concurrency: int
+) -> Tuple[List[float], int, float]:
+    """Threaded blocking clients each offering the session of its previous connection, same returns as above"""
+    ssl_ctx = get_ssl_context(ssl.Purpose.SERVER_AUTH, (pki.client_cert, pki.client_key), pki.ca_dir)
+    latencies: List[float] = []
+    errors: List[Exception] = []
+    remaining: Iterator[int] = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker() -> None:
+        session: Optional[ssl.SSLSession] = None
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            started = time.perf_counter()
+            try:
+                session = _get_resuming(ssl_ctx, server, session)
+            except OSError as exc:
+                LOGGER.warning("Request failed: {}".format(exc))
+                with lock:
+                    errors.append(exc)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(asyncio.to_thread(worker) for _ in range(concurrency)))
+    return latencies, len(errors), time.perf_counter() - started
+
+
+async def run_load(  # pylint: disable=R0913
+    server: LoadServer,
+    pki: PKI,
+    *,
+    requests: int = 200,
+    concurrency: int = 16,
+    reuse: bool = True,
+    resume: bool = False,
+) -> LoadReport:
+    """Do requests GETs with concurrency workers sharing one session, reuse=False closes every connection
+
+    resume=True (only without reuse) uses threaded clients that offer the TLS session of their previous connection"""
+    if resume and reuse:
+        raise ValueError("resume needs reuse=False, kept-alive connections do not handshake")
+    before = (server.stats.connections, server.stats.resumed)
+    if resume:
+        latencies, errors, elapsed = await _resuming_workers(server, pki, requests, concurrency)
+    else:
+        latencies, errors, elapsed = await _session_workers(server, pki, requests, concurrency, reuse)
+    return LoadReport(
+        requests=requests,
+        concurrency=concurrency,
+        reuse=reuse,
+        resume=resume,
+        elapsed=elapsed,
+        errors=errors,
+        handshakes=server.stats.connections - before[0],
+        resumed=server.stats.resumed - before[1],
+        latencies=tuple(sorted(latencies)),
+    )
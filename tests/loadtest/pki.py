@@ -0,0 +1,118 @@
+"""Throwaway CA with server and client certs made with the CSR helpers"""
+
+from typing import Callable, NamedTuple, Sequence, Tuple
+from pathlib import Path
+import datetime
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from libpvarki.mtlshelp.csr import create_client_csr, create_keypair, create_server_csr, resolve_filepaths
+
+VALIDITY = datetime.timedelta(days=1)
+
+
+class PKI(NamedTuple):
+    """Paths to the created material, ca_dir can be given as extra_ca_certs_path"""
+
+    ca_dir: Path
+    ca_cert: Path
+    server_cert: Path
+    server_key: Path
+    client_cert: Path
+    client_key: Path
+
+
+def _build(subject: x509.Name, issuer: x509.Name, public_key: rsa.RSAPublicKey) -> x509.CertificateBuilder:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(issuer)
+        .public_key(public_key)
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + VALIDITY)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(public_key), critical=False)
+    )
+
+
+def _sign_csr(csrpath: Path, ca_key: rsa.RSAPrivateKey, ca_cert: x509.Certificate, certpath: Path) -> None:
+    """Issue a cert for the CSR keeping its extensions (key usages, SANs)"""
+    csr = x509.load_pem_x509_csr(csrpath.read_bytes())
+    public_key = csr.public_key()
+    assert isinstance(public_key, rsa.RSAPublicKey)
+    builder = _build(csr.subject, ca_cert.subject, public_key).add_extension(
+        x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_key.public_key()), critical=False
+    )
+    builder = builder.add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+    for extension in csr.extensions:
+        builder = builder.add_extension(extension.value, critical=extension.critical)
+    cert = builder.sign(ca_key, hashes.SHA256())
+    certpath.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+
+
+def _create_ca(basedir: Path, ksize: int) -> Tuple[rsa.RSAPrivateKey, x509.Certificate, Path]:
+    """Self-signed CA, the cert goes to its own directory"""
+    ca_key_path, ca_pub_path, _ = resolve_filepaths(basedir, "ca")
+    ca_key = create_keypair(ca_key_path, ca_pub_path, ksize=ksize)
+    ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "libpvarki loadtest CA")])
+    ca_cert = (
+        _build(ca_name, ca_name, ca_key.public_key())
+        .add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+        .add_extension(
+            x509.KeyUsage(
+                digital_signature=True,
+                content_commitment=False,
+                key_encipherment=False,
+                data_encipherment=False,
+                key_agreement=False,
+                key_cert_sign=True,
+                crl_sign=True,
+                encipher_only=False,
+                decipher_only=False,
+            ),
+            critical=True,
+        )
+        .sign(ca_key, hashes.SHA256())
+    )
+    ca_dir = basedir / "ca_public"
+    ca_dir.mkdir(exist_ok=True)
+    ca_cert_path = ca_dir / "loadtest_ca.pem"
+    ca_cert_path.write_bytes(ca_cert.public_bytes(serialization.Encoding.PEM))
+    return ca_key, ca_cert, ca_cert_path
+
+
+def _issue(  # pylint: disable=R0913,R0917
+    basedir: Path,
+    nameprefix: str,
+    ksize: int,
+    ca_key: rsa.RSAPrivateKey,
+    ca_cert: x509.Certificate,
+    create_csr: Callable[[rsa.RSAPrivateKey, Path], str],
+) -> Tuple[Path, Path]:
+    """Keypair and CA-signed cert, returns (cert, key) paths"""
+    key_path, pub_path, csr_path = resolve_filepaths(basedir, nameprefix)
+    create_csr(create_keypair(key_path, pub_path, ksize=ksize), csr_path)
+    cert_path = basedir / "public" / f"{nameprefix}.pem"
+    _sign_csr(csr_path, ca_key, ca_cert, cert_path)
+    return cert_path, key_path
+
+
+def create_pki(basedir: Path, ksize: int = 2048, server_names: Sequence[str] = ("localhost", "IP:127.0.0.1")) -> PKI:
+    """CA, server cert for server_names and client cert (CN=loadtest-client) under basedir"""
+    ca_key, ca_cert, ca_cert_path = _create_ca(basedir, ksize)
+    server_cert, server_key = _issue(
+        basedir, "server", ksize, ca_key, ca_cert, lambda key, csr: create_server_csr(key, csr, server_names)
+    )
+    client_cert, client_key = _issue(
+        basedir,
+        "client",
+        ksize,
+        ca_key,
+        ca_cert,
+        lambda key, csr: create_client_csr(key, csr, {"CN": "loadtest-client", "O": "pvarki"}),
+    )
+    return PKI(ca_cert_path.parent, ca_cert_path, server_cert, server_key, client_cert, client_key)
@@ -0,0 +1,58 @@
+"""Small run of the mTLS load-test harness"""
+
+from pathlib import Path
+import logging
+
+import pytest
+
+from .harness import mtls_server, run_load
+from .pki import PKI, create_pki
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=W0621
+
+
+@pytest.fixture(scope="module")
+def pki(tmp_path_factory: pytest.TempPathFactory) -> PKI:
+    """Throwaway CA and certs"""
+    return create_pki(Path(tmp_path_factory.mktemp("loadtest")))
+
+
+@pytest.mark.asyncio
+async def test_reuse_on_off(pki: PKI) -> None:
+    """Without reuse every request is a handshake, with reuse at most one per worker"""
+    async with mtls_server(pki) as server:
+        fresh = await run_load(server, pki, requests=20, concurrency=4, reuse=False)
+        reused = await run_load(server, pki, requests=20, concurrency=4, reuse=True)
+    LOGGER.info("no reuse: {}".format(fresh.summary()))
+    LOGGER.info("reuse: {}".format(reused.summary()))
+    assert fresh.errors == 0 and reused.errors == 0
+    assert fresh.handshakes == 20
+    assert 1 <= reused.handshakes <= 4
+    assert len(fresh.latencies) == 20
+    assert fresh.percentile(50) <= fresh.percentile(99) <= fresh.percentile(100)
+    assert fresh.resumption_rate is None and reused.resumption_rate is None
+    assert fresh.summary()["resumption_rate"] is None
+    assert server.stats.peers == {"loadtest-client": 40}
+
+
+@pytest.mark.asyncio
+async def test_resume(pki: PKI) -> None:
+    """Threaded clients offer their previous session so every connection but the first per worker resumes"""
+    async with mtls_server(pki) as server:
+        report = await run_load(server, pki, requests=20, concurrency=4, reuse=False, resume=True)
+    LOGGER.info("resume: {}".format(report.summary()))
+    assert report.errors == 0
+    assert report.handshakes == 20
+    assert report.resumed >= 20 - 4
+    assert report.resumption_rate == report.resumed / 20
+    assert server.stats.peers == {"loadtest-client": 20}
+
+
+@pytest.mark.asyncio
+async def test_resume_needs_no_reuse(pki: PKI) -> None:
+    """Kept-alive connections have nothing to resume"""
+    async with mtls_server(pki) as server:
+        with pytest.raises(ValueError):
+            await run_load(server, pki, reuse=True, resume=True)
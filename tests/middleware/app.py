@@ -1,14 +1,24 @@
 """Quick and dirty fastapi test app"""
 
-from typing import Mapping, Any
+from typing import Dict, Mapping, Any
 import logging
 import json
 
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
+from fastapi.openapi.utils import get_openapi
+from fastapi.responses import StreamingResponse
 
-from libpvarki.middleware import MTLSHeader, DNDict
-from libpvarki.schemas.product import UserCRUDRequest, UserInstructionFragment
+from libpvarki.middleware import MTLSHeader, DNDict, mount_metrics
+from libpvarki.schemas.product import (
+    UserCRUDRequest,
+    UserInstructionFragment,
+    UserCRUDBatchRequest,
+    UserCRUDBatchResponse,
+    UserCRUDBatchItemResult,
+)
 from libpvarki.schemas.generic import OperationResultResponse
+from libpvarki.schemas.bundle import add_bundle_components, get_schema_bundle
+from libpvarki.schemas.ndjson import NDJSON_MEDIA_TYPE, decode_ndjson, encode_ndjson
 
 LOGGER = logging.getLogger(__name__)
 APP = FastAPI(docs_url="/middleware/docs", openapi_url="/middleware/openapi.json")
@@ -38,6 +48,36 @@ async def user_created(
     return result
 
 
+@APP.post("/api/product/users/created")
+async def users_created(
+    batch: UserCRUDBatchRequest, certdn: DNDict = Depends(MTLSHeader(auto_error=True))
+) -> UserCRUDBatchResponse:
+    """New device certs were created"""
+    _ = certdn
+    results = [
+        (
+            UserCRUDBatchItemResult(uuid=user.uuid, success=True)
+            if user.callsign
+            else UserCRUDBatchItemResult(uuid=user.uuid, success=False, error="Empty callsign")
+        )
+        for user in batch.users
+    ]
+    return UserCRUDBatchResponse(results=results)
+
+
+@APP.post("/api/product/users/sync")
+async def users_sync(request: Request, certdn: DNDict = Depends(MTLSHeader(auto_error=True))) -> StreamingResponse:
+    """Roster as NDJSON of UserCRUDRequest, results as NDJSON of UserCRUDBatchItemResult"""
+    _ = certdn
+    # The request body must be consumed before StreamingResponse starts, it listens for disconnects on the
+    # same receive channel
+    results = [
+        UserCRUDBatchItemResult(uuid=user.uuid, success=True)
+        async for user in decode_ndjson(request.stream(), UserCRUDRequest)
+    ]
+    return StreamingResponse(encode_ndjson(results), media_type=NDJSON_MEDIA_TYPE)
+
+
 @APP.post("/api/product/clients/fragment")
 async def client_instruction_fragment(
     user: UserCRUDRequest, certdn: DNDict = Depends(MTLSHeader(auto_error=True))
@@ -48,5 +88,21 @@ async def client_instruction_fragment(
     return result
 
 
+@APP.get("/api/product/schemas")
+async def schemas() -> Dict[str, Any]:
+    """JSON schemas of the libpvarki models, from the cache"""
+    return get_schema_bundle()
+
+
+def openapi() -> Dict[str, Any]:
+    """OpenAPI document with the cached libpvarki schemas added"""
+    if APP.openapi_schema is None:
+        APP.openapi_schema = add_bundle_components(get_openapi(title=APP.title, version=APP.version, routes=APP.routes))
+    return APP.openapi_schema
+
+
+APP.openapi = openapi  # type: ignore[method-assign]
+mount_metrics(APP)
+
 if __name__ == "__main__":
     print(json.dumps(APP.openapi()))
@@ -0,0 +1,24 @@
+"""Test the Prometheus endpoint and the library's own metrics"""
+
+from fastapi.testclient import TestClient
+
+from libpvarki.metrics import REGISTRY
+
+from .app import APP
+
+
+def test_metrics_endpoint() -> None:
+    """MTLSHeader results show up in the exposition"""
+    auth = REGISTRY.get("libpvarki_mtls_auth_total")
+    assert auth is not None
+    before = auth.labels(mode="header", result="missing").value
+    client = TestClient(APP)
+    assert client.get("/api/v1/check_auth").status_code == 403
+    assert auth.labels(mode="header", result="missing").value == before + 1
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    assert "# TYPE libpvarki_mtls_auth_total counter" in resp.text
+    assert f'libpvarki_mtls_auth_total{{mode="header",result="missing"}} {int(before + 1)}' in resp.text
+    assert "/metrics" not in client.get("/middleware/openapi.json").json()["paths"]
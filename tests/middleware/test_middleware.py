@@ -5,6 +5,8 @@ from typing import Dict, Optional
 import pytest
 from fastapi.testclient import TestClient
 
+from libpvarki.settings import reload
+
 from .app import APP
 
 TRUSTED_INGRESS = "traefik.traefik-system.serviceaccount.identity.linkerd.cluster.local"
@@ -77,6 +79,7 @@ def test_mtls_identity(
         monkeypatch.delenv(var, raising=False)
     for key, value in env.items():
         monkeypatch.setenv(key, value)
+    reload()
 
     resp = TestClient(APP, headers=headers).get("/api/v1/check_auth")
 
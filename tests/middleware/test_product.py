@@ -2,16 +2,22 @@
 
 from typing import Dict
 import uuid
+import json
 import logging
 
 import pytest
 from fastapi.testclient import TestClient
 from pydantic import ValidationError
 
-from libpvarki.schemas.product import UserCRUDRequest, UserInstructionFragment
+from libpvarki.schemas.product import (
+    UserCRUDRequest,
+    UserInstructionFragment,
+    UserCRUDBatchResponse,
+    UserCRUDBatchItemResult,
+)
+from libpvarki.schemas.ndjson import NDJSON_MEDIA_TYPE
 from libpvarki.schemas.generic import OperationResultResponse
 
-
 # pylint: disable=W0621
 LOGGER = logging.getLogger(__name__)
 
@@ -97,3 +103,26 @@ def test_create_extrafields(norppa11: Dict[str, str], mtlsclient: TestClient) ->
     assert resp.status_code == 422
     payload = resp.json()
     LOGGER.debug("payload={}".format(payload))
+
+
+def test_create_batch(mtlsclient: TestClient) -> None:
+    """Check that adding users in a batch works and results are per user"""
+    users = [create_user_dict(f"HAUKI{idx}a") for idx in range(1000)]
+    users[5]["callsign"] = ""
+    resp = mtlsclient.post("/api/product/users/created", json={"users": users})
+    assert resp.status_code == 200
+    results = UserCRUDBatchResponse.model_validate_json(resp.content).results
+    assert [result.uuid for result in results] == [user["uuid"] for user in users]
+    assert [idx for idx, result in enumerate(results) if not result.success] == [5]
+    assert results[5].error == "Empty callsign"
+
+
+def test_sync_ndjson(mtlsclient: TestClient) -> None:
+    """Check that streaming a roster as NDJSON works"""
+    users = [create_user_dict(f"HAUKI{idx}a") for idx in range(1000)]
+    body = "".join(json.dumps(user) + "\n" for user in users)
+    resp = mtlsclient.post("/api/product/users/sync", content=body, headers={"Content-Type": NDJSON_MEDIA_TYPE})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == NDJSON_MEDIA_TYPE
+    results = [UserCRUDBatchItemResult.model_validate_json(line) for line in resp.text.splitlines()]
+    assert [result.uuid for result in results] == [user["uuid"] for user in users]
@@ -0,0 +1 @@
+"""Product helper tests"""
@@ -0,0 +1,117 @@
+"""Test the health-check aggregator"""
+
+from typing import AsyncGenerator, Dict, Tuple
+import asyncio
+import time
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from libpvarki.products import HealthAggregator
+from libpvarki.schemas.product import ReadyRequest
+
+# pylint: disable=W0621
+
+
+class FakeProducts:  # pylint: disable=R0903
+    """Products behind one aiohttp server, /<name>/api/v1/healthcheck"""
+
+    def __init__(self) -> None:
+        self.calls: Dict[str, int] = {}
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.05
+        self.healthy = True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Behave according to the product name"""
+        name = request.match_info["name"]
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(5 if name == "slow" else self.delay)
+        finally:
+            self.active -= 1
+        if name == "broken":
+            return web.Response(status=500)
+        if name == "garbage":
+            return web.json_response({"nosuchfield": True})
+        return web.json_response({"healthy": self.healthy})
+
+
+@pytest_asyncio.fixture
+async def products() -> AsyncGenerator[Tuple[FakeProducts, str], None]:
+    """Start the fake products, yield them and the base URL"""
+    fake = FakeProducts()
+    app = web.Application()
+    app.add_routes([web.get("/{name}/api/v1/healthcheck", fake.handle)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host="127.0.0.1", port=0)
+    await site.start()
+    yield fake, f"http://127.0.0.1:{runner.addresses[0][1]}"
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_probe_results(products: Tuple[FakeProducts, str]) -> None:
+    """Healthy, failing and slow products are all reported, the slow one within the deadline"""
+    fake, base = products
+    async with aiohttp.ClientSession() as session:
+        health = HealthAggregator(
+            [f"{base}/{name}" for name in ("ok", "broken", "garbage", "slow")], session=session, timeout=0.5
+        )
+        health.add_ready(ReadyRequest(product="tak", apiurl=f"{base}/tak/", url="https://example.com/"))
+        started = time.monotonic()
+        results = await health.get_all()
+        assert time.monotonic() - started < 1.5
+        await health.aclose()
+    assert {url.split("/")[-2]: status.healthy for url, status in results.items()} == {
+        "ok": True,
+        "tak": True,
+        "broken": False,
+        "garbage": False,
+        "slow": False,
+    }
+    assert "500" in str(results[f"{base}/broken/"].health.extra)
+    assert "0.5s" in str(results[f"{base}/slow/"].health.extra)
+    assert fake.calls["ok"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit(products: Tuple[FakeProducts, str]) -> None:
+    """No more than max_concurrency probes at once"""
+    fake, base = products
+    async with aiohttp.ClientSession() as session:
+        async with HealthAggregator(
+            [f"{base}/p{idx}" for idx in range(10)], session=session, max_concurrency=3
+        ) as health:
+            results = await health.refresh_all()
+    assert all(status.healthy for status in results.values())
+    assert fake.max_active == 3
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate(products: Tuple[FakeProducts, str]) -> None:
+    """Fresh results are cached, stale ones are returned at once and refreshed in the background"""
+    fake, base = products
+    url = f"{base}/ok/"
+    async with aiohttp.ClientSession() as session:
+        async with HealthAggregator([url], session=session, ttl=0.2) as health:
+            assert (await health.get(url)).healthy
+            assert (await health.get(url)).healthy
+            assert fake.calls["ok"] == 1
+            fake.healthy = False
+            fake.delay = 0.3
+            await asyncio.sleep(0.25)
+            started = time.monotonic()
+            stale = await health.get(url)
+            assert time.monotonic() - started < 0.1
+            assert stale.healthy
+            await health.get(url)  # joins the running refresh instead of starting another
+            await asyncio.sleep(0.4)
+            assert fake.calls["ok"] == 2
+            assert not health.cached()[url].healthy
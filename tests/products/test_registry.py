@@ -0,0 +1,126 @@
+"""Test the product registry"""
+
+from typing import List
+from pathlib import Path
+import asyncio
+import threading
+
+import pytest
+
+from libpvarki.products import ProductRegistry, RegistryChange
+from libpvarki.schemas.product import ProductDescription, ReadyRequest
+
+
+def ready(product: str, host: str = "") -> ReadyRequest:
+    """Announcement of product"""
+    host = host or f"{product}.sleepy-sloth.pvarki.fi"
+    return ReadyRequest(product=product, apiurl=f"https://{host}:4625/", url=f"https://{host}/")
+
+
+def describe(product: str) -> ProductDescription:
+    """Description of product"""
+    return ProductDescription(shortname=product, title=product.upper(), icon=None, description="Test", language="en")
+
+
+def test_lookup_and_snapshots() -> None:
+    """Lookups by name and host, old snapshots do not change"""
+    registry = ProductRegistry()
+    registry.register(ready("tak"))
+    before = registry.snapshot
+    registry.register(ready("bl", "BattleLog.sleepy-sloth.pvarki.fi"))
+    assert len(before) == 1 and "bl" not in before
+    snapshot = registry.snapshot
+    assert snapshot.version == 2
+    assert snapshot.by_api_host("battlelog.sleepy-sloth.pvarki.fi") == registry.get("bl")
+    assert snapshot.by_api_host("BATTLELOG.sleepy-sloth.pvarki.fi") is not None
+    assert sorted(entry.shortname for entry in snapshot) == ["bl", "tak"]
+    with pytest.raises(TypeError):
+        snapshot.products["x"] = snapshot.products["tak"]  # type: ignore[index]
+    assert registry.remove("tak") is not None
+    assert registry.remove("tak") is None
+    assert "tak" in snapshot and "tak" not in registry.snapshot
+
+
+def test_notifications() -> None:
+    """Listeners get added/updated/removed, unchanged re-announcements are not changes"""
+    registry = ProductRegistry()
+    changes: List[RegistryChange] = []
+    unsubscribe = registry.subscribe(changes.append)
+    registry.register(ready("tak"))
+    registry.register(ready("tak"))
+    registry.describe(describe("tak"))
+    assert registry.describe(describe("nosuchproduct")) is None
+    registry.register(ready("tak"))
+    registry.remove("tak")
+    unsubscribe()
+    registry.register(ready("tak"))
+    assert [change.kind for change in changes] == ["added", "updated", "removed"]
+    assert changes[1].entry.description == describe("tak")
+    assert changes[2].snapshot.version == 3
+
+
+def test_threads() -> None:
+    """Concurrent writers do not lose updates"""
+    registry = ProductRegistry()
+
+    def writer(prefix: str) -> None:
+        for idx in range(200):
+            registry.register(ready(f"{prefix}{idx}"))
+
+    threads = [threading.Thread(target=writer, args=(prefix,)) for prefix in "abcd"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(registry.snapshot) == 800
+    assert registry.snapshot.version == 800
+
+
+@pytest.mark.asyncio
+async def test_watch() -> None:
+    """Changes made in other threads are delivered to async watchers"""
+    registry = ProductRegistry()
+    watcher = registry.watch()
+    first = asyncio.ensure_future(anext(watcher))
+    await asyncio.sleep(0)
+    await asyncio.to_thread(registry.register, ready("tak"))
+    change = await asyncio.wait_for(first, 1)
+    assert (change.kind, change.entry.shortname) == ("added", "tak")
+    await watcher.aclose()
+    assert not registry._listeners  # pylint: disable=W0212
+
+
+def test_persistence(tmp_path: Path) -> None:
+    """The registry survives restarts, unusable files are ignored"""
+    path = tmp_path / "products.json"
+    registry = ProductRegistry(path)
+    registry.register(ready("tak"), describe("tak"))
+    registry.register(ready("bl"))
+    assert "\n" not in path.read_text(encoding="utf-8")
+    restored = ProductRegistry(path)
+    assert restored.snapshot.products == registry.snapshot.products
+    assert restored.snapshot.by_api_host("bl.sleepy-sloth.pvarki.fi") is not None
+    path.write_text("{garbage", encoding="utf-8")
+    assert len(ProductRegistry(path).snapshot) == 0
+
+
+def test_save_failure(tmp_path: Path) -> None:
+    """A change that can't be written is not applied and nobody is notified"""
+    path = tmp_path / "products.json"
+    registry = ProductRegistry(path)
+    registry.register(ready("tak"))
+    changes: List[RegistryChange] = []
+    registry.subscribe(changes.append)
+    before = registry.snapshot
+    path.unlink()
+    path.mkdir()  # os.replace can't replace a directory
+    with pytest.raises(OSError):
+        registry.register(ready("bl"))
+    with pytest.raises(OSError):
+        registry.remove("tak")
+    assert registry.snapshot is before
+    assert not changes
+    path.rmdir()
+    registry.register(ready("bl"))
+    assert [change.kind for change in changes] == ["added"]
+    assert ProductRegistry(path).snapshot.products == registry.snapshot.products
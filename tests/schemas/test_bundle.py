@@ -0,0 +1,67 @@
+"""Test the cached schema bundle"""
+
+from typing import Generator
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+from libpvarki import __version__
+from libpvarki.schemas import bundle
+from libpvarki.schemas.bundle import SCHEMA_MODELS, add_bundle_components, get_schema_bundle
+
+from ..middleware.app import APP
+
+LOGGER = logging.getLogger(__name__)
+
+# pylint: disable=W0621
+
+
+@pytest.fixture
+def fresh_cache() -> Generator[None, None, None]:
+    """Make get_schema_bundle generate again"""
+    bundle._generate.cache_clear()  # pylint: disable=W0212
+    yield None
+    bundle._generate.cache_clear()  # pylint: disable=W0212
+
+
+@pytest.mark.usefixtures("fresh_cache")
+def test_generated_once() -> None:
+    """All the models, generated once per version"""
+    first = get_schema_bundle()
+    assert get_schema_bundle() is first
+    assert first["version"] == __version__
+    assert sorted(first["components"]["schemas"]) == sorted(model.__name__ for model in SCHEMA_MODELS)
+    assert "callsign" in first["components"]["schemas"]["UserCRUDRequest"]["properties"]
+
+
+@pytest.mark.usefixtures("fresh_cache")
+def test_version_change(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Another libpvarki version gets its own entry"""
+    first = get_schema_bundle()
+    monkeypatch.setattr(bundle, "__version__", "0.0.0")
+    other = get_schema_bundle()
+    assert other is not first
+    assert other["version"] == "0.0.0"
+    assert bundle._generate.cache_info().misses == 2  # pylint: disable=W0212
+
+
+def test_add_components() -> None:
+    """Existing schemas are kept, the rest are copies of the cached ones"""
+    document = {"components": {"schemas": {"UserCRUDRequest": {"title": "mine"}}}}
+    add_bundle_components(document)
+    schemas = document["components"]["schemas"]
+    assert schemas["UserCRUDRequest"] == {"title": "mine"}
+    assert schemas["ReadyRequest"] == get_schema_bundle()["components"]["schemas"]["ReadyRequest"]
+    assert schemas["ReadyRequest"] is not get_schema_bundle()["components"]["schemas"]["ReadyRequest"]
+
+
+def test_app_serves_cached() -> None:
+    """The test app serves the cache and adds it to its OpenAPI document"""
+    client = TestClient(APP)
+    resp = client.get("/api/product/schemas")
+    assert resp.status_code == 200
+    assert resp.json() == get_schema_bundle()
+    document = client.get("/middleware/openapi.json").json()
+    assert document["info"]["x-libpvarki-version"] == __version__
+    assert "ProductHealthCheckResponse" in document["components"]["schemas"]
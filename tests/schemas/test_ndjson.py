@@ -0,0 +1,108 @@
+"""Test the NDJSON helpers"""
+
+from typing import AsyncIterator, Iterable, List
+
+import pytest
+from aiohttp import ClientSession, web
+from pydantic import ValidationError
+
+from libpvarki.schemas.ndjson import NDJSON_MEDIA_TYPE, decode_ndjson, encode_ndjson
+from libpvarki.schemas.product import UserCRUDRequest
+
+
+def make_users(count: int) -> List[UserCRUDRequest]:
+    """Users with a multibyte callsign so that chunk boundaries can split characters"""
+    return [
+        UserCRUDRequest(uuid=str(idx), callsign=f"KÄRPPÄ{idx}a", x509cert="not really a cert") for idx in range(count)
+    ]
+
+
+async def split(data: bytes, size: int) -> AsyncIterator[bytes]:
+    """Chunks of size bytes"""
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+async def collect(chunks: AsyncIterator[bytes]) -> bytes:
+    """Join the chunks"""
+    return b"".join([chunk async for chunk in chunks])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1, 7, 4096])
+async def test_roundtrip(size: int) -> None:
+    """Decoding works no matter where the chunks are split"""
+    users = make_users(200)
+    data = await collect(encode_ndjson(users, chunk_size=1000))
+    assert data.count(b"\n") == 200
+    decoded = [user async for user in decode_ndjson(split(data + b"\n\n", size), UserCRUDRequest)]
+    assert decoded == users
+
+
+@pytest.mark.asyncio
+async def test_encode_async_source() -> None:
+    """Async iterables are encoded in chunks of about chunk_size"""
+
+    async def source(users: Iterable[UserCRUDRequest]) -> AsyncIterator[UserCRUDRequest]:
+        for user in users:
+            yield user
+
+    chunks = [chunk async for chunk in encode_ndjson(source(make_users(100)), chunk_size=1000)]
+    assert len(chunks) > 1
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+    assert sum(chunk.count(b"\n") for chunk in chunks) == 100
+
+
+@pytest.mark.asyncio
+async def test_decode_errors() -> None:
+    """Invalid and overly long lines raise"""
+    with pytest.raises(ValidationError):
+        _ = [user async for user in decode_ndjson(split(b'{"uuid": "x"}\n', 5), UserCRUDRequest)]
+    with pytest.raises(ValueError, match="exceeds"):
+        _ = [user async for user in decode_ndjson(split(b"x" * 100, 10), UserCRUDRequest, max_line_bytes=50)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1, 7, 4096])
+async def test_decode_line_limit(size: int) -> None:
+    """Every line is checked against the limit, also complete ones inside a single chunk"""
+    line = make_users(1)[0].model_dump_json().encode("utf-8")
+    data = line + b"\n" + b"x" * (len(line) + 1) + b"\n" + line + b"\n"
+    with pytest.raises(ValueError, match="exceeds"):
+        _ = [user async for user in decode_ndjson(split(data, size), UserCRUDRequest, max_line_bytes=len(line))]
+    users = [
+        user
+        async for user in decode_ndjson(split(line + b"\n" + line, size), UserCRUDRequest, max_line_bytes=len(line))
+    ]
+    assert len(users) == 2
+
+
+@pytest.mark.asyncio
+async def test_aiohttp() -> None:
+    """Stream to an aiohttp server and back"""
+
+    async def echo(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": NDJSON_MEDIA_TYPE})
+        await response.prepare(request)
+        users = decode_ndjson(request.content.iter_chunked(1024), UserCRUDRequest)
+        async for chunk in encode_ndjson(users, chunk_size=1024):
+            await response.write(chunk)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.add_routes([web.post("/echo", echo)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host="127.0.0.1", port=0)
+    await site.start()
+    port = runner.addresses[0][1]
+    users = make_users(2000)
+    try:
+        async with ClientSession() as session:
+            async with session.post(f"http://127.0.0.1:{port}/echo", data=encode_ndjson(users)) as resp:
+                assert resp.status == 200
+                decoded = [user async for user in decode_ndjson(resp.content.iter_chunked(999), UserCRUDRequest)]
+    finally:
+        await runner.cleanup()
+    assert decoded == users
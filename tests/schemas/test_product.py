@@ -1,6 +1,24 @@
 """Test product schemas"""
 
-from libpvarki.schemas.product import UserInstructionFragment, UserCRUDRequest, ProductHealthCheckResponse
+from pathlib import Path
+import json
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from pydantic import ValidationError
+
+from libpvarki.schemas.generic import OperationResultResponse
+from libpvarki.schemas.product import (
+    UserInstructionFragment,
+    UserCRUDRequest,
+    ProductHealthCheckResponse,
+    UserCRUDBatchRequest,
+    UserCRUDBatchResponse,
+    UserCRUDBatchItemResult,
+    user_list_adapter,
+    validate_users,
+)
 
 
 def test_fragment() -> None:
@@ -19,3 +37,60 @@ def test_health() -> None:
     """Test constructing ProductHealthCheckResponse"""
     res = ProductHealthCheckResponse(healthy=True)
     assert res.model_dump()["healthy"] is True
+
+
+def test_validate_users() -> None:
+    """Bulk validation from JSON and python objects, errors are reported per item"""
+    users = [{"uuid": str(idx), "callsign": f"KISSA{idx}a", "x509cert": "not really a cert"} for idx in range(100)]
+    batch = UserCRUDBatchRequest(users=validate_users(json.dumps(users)))
+    assert batch.users[99].callsign == "KISSA99a"
+    assert validate_users(users) == batch.users
+    assert user_list_adapter() is user_list_adapter()
+    users[3]["nosuchfield"] = "Trololooo"
+    del users[7]["uuid"]
+    with pytest.raises(ValidationError) as excinfo:
+        validate_users(users)
+    assert {error["loc"][0] for error in excinfo.value.errors()} == {3, 7}
+
+
+def test_batch_response() -> None:
+    """Per-item results are OperationResultResponses"""
+    res = UserCRUDBatchResponse(results=[UserCRUDBatchItemResult(uuid="x", success=False, error="nope")])
+    assert isinstance(res.results[0], OperationResultResponse)
+    assert res.model_dump(exclude_none=True) == {"results": [{"uuid": "x", "success": False, "error": "nope"}]}
+
+
+def test_crud_cert(datadir: Path) -> None:
+    """Certificate accessors parse the CFSSL-escaped PEM once"""
+    pem = (datadir / "persistent" / "public" / "mtlsclient.pem").read_text(encoding="utf-8")
+    expected = x509.load_pem_x509_certificate(pem.encode("utf-8"))
+    res = UserCRUDRequest(callsign="KISSA23a", uuid="not really an uuid", x509cert=pem.replace("\n", "\\n"))
+    cert = res.cert
+    assert cert == expected
+    assert res.cert is cert
+    assert res.cert_fingerprint == expected.fingerprint(hashes.SHA256()).hex()
+    assert res.cert_subject == expected.subject.rfc4514_string()
+    assert res.model_dump()["x509cert"] == pem.replace("\n", "\\n")
+    with pytest.raises(ValueError):
+        _ = UserCRUDRequest(callsign="KISSA23a", uuid="not really an uuid", x509cert="not really a cert").cert
+    # Private attributes would make every validation initialize __pydantic_private__
+    assert not UserCRUDRequest.__private_attributes__
+
+
+def test_crud_cert_copy(datadir: Path) -> None:
+    """Copies and assignments with another certificate do not return the cached values of the old one"""
+    client_pem = (datadir / "persistent" / "public" / "mtlsclient.pem").read_text(encoding="utf-8")
+    server_pem = (datadir / "persistent" / "public" / "tlsserver_chain.pem").read_text(encoding="utf-8")
+    server = x509.load_pem_x509_certificate(server_pem.encode("utf-8"))
+    res = UserCRUDRequest(callsign="KISSA23a", uuid="not really an uuid", x509cert=client_pem.replace("\n", "\\n"))
+    client_subject = res.cert_subject
+
+    copied = res.model_copy(update={"x509cert": server_pem.replace("\n", "\\n")})
+    assert copied.cert_pem == server_pem
+    assert copied.cert == server
+    assert copied.cert_subject == server.subject.rfc4514_string() != client_subject
+    assert res.cert_subject == client_subject
+    assert res.model_copy(update={"callsign": "KOIRA42b"}).cert is res.cert
+
+    res.x509cert = server_pem
+    assert res.cert == server
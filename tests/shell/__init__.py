@@ -0,0 +1 @@
+"""Shell helper tests"""
@@ -0,0 +1,70 @@
+"""Test the command result cache"""
+
+from pathlib import Path
+import asyncio
+import os
+
+import pytest
+
+from libpvarki.shell import CommandCache
+
+from ..conftest import FakeClock
+
+
+def counter_cmd(counter: Path) -> str:
+    """Command that counts its invocations and outputs the count"""
+    return f"echo x >> {counter}; wc -l < {counter}"
+
+
+@pytest.mark.asyncio
+async def test_ttl(tmp_path: Path, fake_clock: FakeClock) -> None:
+    """Results are reused until they expire"""
+    clock = fake_clock
+    cache = CommandCache(ttl=10, clock=clock)
+    cmd = counter_cmd(tmp_path / "count")
+    assert await cache.call_cmd(cmd) == (0, "1\n", "")
+    assert await cache.call_cmd(cmd) == (0, "1\n", "")
+    clock.now += 11
+    assert await cache.call_cmd(cmd) == (0, "2\n", "")
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_single_flight(tmp_path: Path) -> None:
+    """Concurrent identical calls share one process"""
+    cache = CommandCache()
+    cmd = f"sleep 0.2; {counter_cmd(tmp_path / 'count')}"
+    results = await asyncio.gather(*(cache.call_cmd(cmd) for _ in range(5)))
+    assert set(results) == {(0, "1\n", "")}
+    assert cache.shared == 4
+
+
+@pytest.mark.asyncio
+async def test_key_and_lru(tmp_path: Path) -> None:
+    """Environment is part of the key, least recently used are evicted"""
+    cache = CommandCache(max_entries=2)
+    env_a = {"PATH": os.environ["PATH"], "WHO": "a"}
+    env_b = {"PATH": os.environ["PATH"], "WHO": "b"}
+    argv = ["sh", "-c", "echo $WHO"]
+    assert (await cache.call_exec(argv, env=env_a))[1] == "a\n"
+    assert (await cache.call_exec(argv, env=env_b))[1] == "b\n"
+    assert (await cache.call_exec(argv, env=env_a))[1] == "a\n"
+    assert cache.hits == 1
+    await cache.call_exec(["echo", "third"], cwd=tmp_path)
+    assert len(cache) == 2
+    assert (await cache.call_exec(argv, env=env_a))[1] == "a\n"
+    assert cache.hits == 2  # a was used more recently than b so b got evicted
+    assert cache.invalidate(argv) == 1
+
+
+@pytest.mark.asyncio
+async def test_failures_not_cached(tmp_path: Path) -> None:
+    """Nonzero exits and timeouts are not cached"""
+    cache = CommandCache()
+    counter = tmp_path / "count"
+    cmd = f"{counter_cmd(counter)}; exit 1"
+    assert (await cache.call_cmd(cmd))[1] == "1\n"
+    assert (await cache.call_cmd(cmd))[1] == "2\n"
+    with pytest.raises(asyncio.TimeoutError):
+        await cache.call_cmd("sleep 5", timeout=0.2)
+    assert len(cache) == 0
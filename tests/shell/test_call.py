@@ -0,0 +1,136 @@
+"""Test shell helpers"""
+
+from pathlib import Path
+import logging
+import asyncio
+import json
+import os
+
+import pytest
+
+from libpvarki.logging import init_logging
+from libpvarki.metrics import REGISTRY
+from libpvarki.shell import call_cmd, call_exec
+
+LOGGER = logging.getLogger(__name__)
+
+
+@pytest.mark.asyncio
+async def test_true() -> None:
+    """Test that true exists with code 0"""
+    code, stdout, stderr = await call_cmd("true")
+    assert code == 0
+    assert stdout == ""
+    assert stderr == ""
+
+
+@pytest.mark.asyncio
+async def test_false() -> None:
+    """Test that false exists with nonzero code"""
+    code, stdout, stderr = await call_cmd("false")
+    assert code != 0
+    assert stdout == ""
+    assert stderr == ""
+
+
+@pytest.mark.asyncio
+async def test_stdout() -> None:
+    """Test that echo exists with code 0 and outputs what we expect to stdout"""
+    code, stdout, stderr = await call_cmd("echo 'hello world'")
+    assert code == 0
+    assert stdout == "hello world\n"
+    assert stderr == ""
+
+
+@pytest.mark.asyncio
+async def test_stderr() -> None:
+    """Test that echo exists with code 0 and outputs what we expect to stderr"""
+    code, stdout, stderr = await call_cmd("echo 'goodbye world' >&2")
+    # FIXME: Capture log output and check for the warning
+    assert code == 0
+    assert stdout == ""
+    assert stderr == "goodbye world\n"
+
+
+@pytest.mark.asyncio
+async def test_stderr_nowarn() -> None:
+    """Test that echo exists with code 0 and outputs what we expect to stderr"""
+    code, stdout, stderr = await call_cmd("echo 'goodbye world' >&2", stderr_warn=False)
+    # FIXME: Capture log output and check that there is no warning
+    assert code == 0
+    assert stdout == ""
+    assert stderr == "goodbye world\n"
+
+
+@pytest.mark.asyncio
+async def test_timeout() -> None:
+    """Test that long sleeps are aborted on timeout"""
+    with pytest.raises(asyncio.TimeoutError):
+        await call_cmd("sleep 5", timeout=1.0)
+
+
+@pytest.mark.asyncio
+async def test_exec_no_quoting(tmp_path: Path) -> None:
+    """Arguments go to the command as-is, env and cwd are used"""
+    code, stdout, stderr = await call_exec(
+        ["sh", "-c", 'printf "%s|%s|%s" "$1" "$FOO" "$(pwd)"', "sh", "it's a $HOME; test"],
+        env={"FOO": "bar", "PATH": os.environ["PATH"]},
+        cwd=tmp_path,
+    )
+    assert code == 0
+    assert stdout == f"it's a $HOME; test|bar|{tmp_path}"
+    assert stderr == ""
+
+
+@pytest.mark.asyncio
+async def test_exec_false() -> None:
+    """Nonzero exit code is returned"""
+    code, _, _ = await call_exec(["false"])
+    assert code != 0
+
+
+@pytest.mark.asyncio
+async def test_metrics() -> None:
+    """Durations and failures are counted per executable"""
+    seconds = REGISTRY.get("libpvarki_command_seconds")
+    failures = REGISTRY.get("libpvarki_command_failures_total")
+    assert seconds is not None and failures is not None
+    before = seconds.labels(command="false").snapshot()[2]
+    failed = failures.labels(command="false", reason="exit").value
+    await call_cmd("false")
+    await call_exec(["false"])
+    assert seconds.labels(command="false").snapshot()[2] == before + 2
+    assert failures.labels(command="false", reason="exit").value == failed + 2
+
+
+@pytest.mark.asyncio
+async def test_nonzero_ecs(capsys: pytest.CaptureFixture[str], monkeypatch: pytest.MonkeyPatch) -> None:
+    """The child's fields don't collide with the process object of the ECS formatter"""
+    monkeypatch.setenv("LOG_CONSOLE_FORMATTER", "ecs")
+    init_logging(logging.INFO)
+    await call_cmd("exit 3")
+    _, stderr = capsys.readouterr()
+    assert "Logging error" not in stderr
+    lines = [json.loads(line) for line in stderr.splitlines() if line.startswith("{")]
+    error = next(line for line in lines if "returned nonzero code" in line["message"])
+    assert error["subprocess"]["exit_code"] == 3
+    assert error["subprocess"]["command_line"] == "exit 3"
+    assert isinstance(error["subprocess"]["pid"], int)
+    assert error["process"]["pid"] == os.getpid()
+
+
+@pytest.mark.asyncio
+async def test_output_logged_once(capsys: pytest.CaptureFixture[str], monkeypatch: pytest.MonkeyPatch) -> None:
+    """The output is only in its field, not in message and log.original too"""
+    monkeypatch.setenv("LOG_CONSOLE_FORMATTER", "ecs")
+    init_logging(logging.INFO)
+    # The quotes keep the output out of the command line
+    await call_cmd('echo out""put-marker; echo err""or-marker >&2')
+    _, stderr = capsys.readouterr()
+    raw = [line for line in stderr.splitlines() if line.startswith("{")]
+    assert sum(line.count("output-marker") for line in raw) == 1
+    assert sum(line.count("error-marker") for line in raw) == 1
+    lines = [json.loads(line) for line in raw]
+    stdout = next(line for line in lines if "stdout" in line)
+    assert stdout["stdout"] == "output-marker\n"
+    assert stdout["message"].endswith(" stdout")
@@ -0,0 +1,93 @@
+"""Test the command pool"""
+
+from typing import List
+from pathlib import Path
+import asyncio
+import time
+
+import pytest
+
+from libpvarki.shell import CommandPool, call_cmd
+from libpvarki.shell.pool import PriorityLimiter
+
+
+def is_running(pid: int) -> bool:
+    """Process exists and is not a zombie"""
+    try:
+        state = Path(f"/proc/{pid}/stat").read_text(encoding="utf-8").rsplit(")", 1)[1].split()[0]
+    except FileNotFoundError:
+        return False
+    return state != "Z"
+
+
+@pytest.mark.asyncio
+async def test_timeout_kills_process_group(tmp_path: Path) -> None:
+    """The shell and its children are killed and reaped on timeout"""
+    pidfile = tmp_path / "pids"
+    with pytest.raises(asyncio.TimeoutError):
+        await call_cmd(f"echo $$ > {pidfile}; sleep 30 & echo $! >> {pidfile}; wait", timeout=0.5)
+    pids = [int(line) for line in pidfile.read_text(encoding="utf-8").split()]
+    assert len(pids) == 2
+    await asyncio.sleep(0.1)
+    assert not any(is_running(pid) for pid in pids)
+
+
+@pytest.mark.asyncio
+async def test_limits() -> None:
+    """Global and per-name limits are respected"""
+    pool = CommandPool(3, per_name_limits={"sleep": 1})
+    started = time.monotonic()
+    results = await asyncio.gather(
+        *(pool.call_cmd("sleep 0.2") for _ in range(3)), *(pool.call_exec(["true"]) for _ in range(3))
+    )
+    elapsed = time.monotonic() - started
+    assert all(code == 0 for code, _, _ in results)
+    assert elapsed >= 0.6  # the sleeps ran one at a time
+    stats = pool.stats()
+    assert stats["sleep"].calls == 3
+    assert stats["sleep"].queue_wait_max >= 0.35
+    assert stats["sleep"].run_time_max >= 0.2
+    assert stats["true"].calls == 3
+    assert pool.limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_priority_order() -> None:
+    """Waiting commands start in priority order"""
+    pool = CommandPool(1)
+    blocker = asyncio.create_task(pool.call_cmd("sleep 0.2"))
+    await asyncio.sleep(0.05)
+    tasks = [asyncio.create_task(pool.call_exec(["echo", str(priority)], priority=priority)) for priority in (5, 1, 3)]
+    await asyncio.sleep(0)
+    done_order: List[str] = []
+    for finished in asyncio.as_completed(tasks):
+        _, stdout, _ = await finished
+        done_order.append(stdout.strip())
+    await blocker
+    assert done_order == ["1", "3", "5"]
+
+
+@pytest.mark.asyncio
+async def test_timeout_stats() -> None:
+    """Timeouts are counted and the slot is released"""
+    pool = CommandPool(1)
+    with pytest.raises(asyncio.TimeoutError):
+        await pool.call_cmd("sleep 5", timeout=0.2)
+    assert pool.stats()["sleep"].timeouts == 1
+    assert pool.limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_cancel() -> None:
+    """Cancelled waiters do not hold slots"""
+    limiter = PriorityLimiter(1)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.waiting == 1
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.waiting == 0
+    limiter.release()
+    assert limiter.active == 0
@@ -0,0 +1,103 @@
+"""Test streaming command output"""
+
+from pathlib import Path
+import asyncio
+import json
+import logging
+import os
+import resource
+import time
+
+import pytest
+
+from libpvarki.logging import init_logging
+from libpvarki.shell import OutputChunk, stream_cmd
+
+
+@pytest.mark.asyncio
+async def test_lines() -> None:
+    """Lines from both streams, exit code afterwards"""
+    async with stream_cmd("echo one; echo two; echo err >&2; exit 3") as proc:
+        chunks = [chunk async for chunk in proc]
+    assert [chunk for chunk in chunks if chunk.stream == "stdout"] == [
+        OutputChunk("stdout", "one\n"),
+        OutputChunk("stdout", "two\n"),
+    ]
+    assert OutputChunk("stderr", "err\n") in chunks
+    assert proc.returncode == 3
+
+
+@pytest.mark.asyncio
+async def test_long_lines_and_utf8() -> None:
+    """Lines longer than chunk_size come in pieces, multibyte characters are not broken"""
+    async with stream_cmd("printf 'ääääää\\nlast'", chunk_size=5, log_output=False) as proc:
+        texts = [chunk.text async for chunk in proc]
+    assert "".join(texts) == "ääääää\nlast"
+    # pieces are at most chunk_size bytes, the decoder may carry a partial character over to the next one
+    assert all(len(text.encode("utf-8")) <= 5 + 3 for text in texts)
+    assert len(texts) > 3
+    assert texts[-1] == "last"
+
+
+@pytest.mark.asyncio
+async def test_chunks_wait() -> None:
+    """wait() consumes the rest"""
+    async with stream_cmd("seq 1 1000", lines=False, log_output=False) as proc:
+        first = await anext(proc)
+        assert first.text.startswith("1\n")
+        assert await proc.wait() == 0
+
+
+@pytest.mark.asyncio
+async def test_spill(tmp_path: Path) -> None:
+    """Output beyond max_bytes goes to a file"""
+    async with stream_cmd("seq 1 10000", max_bytes=100, spill_dir=tmp_path, log_output=False) as proc:
+        delivered = "".join([chunk.text async for chunk in proc])
+    assert len(delivered) <= 100
+    spilled = proc.spilled["stdout"].read_text(encoding="utf-8")
+    assert delivered + spilled == "".join(f"{idx}\n" for idx in range(1, 10001))
+    assert "stderr" not in proc.spilled
+
+
+@pytest.mark.asyncio
+async def test_backpressure_constant_memory() -> None:
+    """A slow consumer does not make us buffer the output, the producer waits"""
+    peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    total = 0
+    started = time.monotonic()
+    async with stream_cmd(
+        "head -c 268435456 /dev/zero", lines=False, queue_size=4, log_output=False, timeout=60
+    ) as proc:
+        async for chunk in proc:
+            total += len(chunk.text)
+            if time.monotonic() - started < 0.1:
+                await asyncio.sleep(0.01)
+    assert total == 256 * 1024 * 1024
+    assert proc.returncode == 0
+    # ru_maxrss is in kilobytes on Linux, a buffering implementation would need at least 256MiB more
+    assert resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak_before < 128 * 1024
+
+
+@pytest.mark.asyncio
+async def test_timeout() -> None:
+    """Timeout kills the command"""
+    with pytest.raises(asyncio.TimeoutError):
+        async with stream_cmd("echo start; sleep 5", timeout=0.5, log_output=False) as proc:
+            async for _ in proc:
+                pass
+    assert proc.returncode is None
+
+
+@pytest.mark.asyncio
+async def test_nonzero_ecs(capsys: pytest.CaptureFixture[str], monkeypatch: pytest.MonkeyPatch) -> None:
+    """The nonzero exit is logged with the child's fields next to our own process object"""
+    monkeypatch.setenv("LOG_CONSOLE_FORMATTER", "ecs")
+    init_logging(logging.INFO)
+    async with stream_cmd("exit 4") as proc:
+        await proc.wait()
+    _, stderr = capsys.readouterr()
+    assert "Logging error" not in stderr
+    lines = [json.loads(line) for line in stderr.splitlines() if line.startswith("{")]
+    error = next(line for line in lines if "returned nonzero code" in line["message"])
+    assert error["subprocess"]["exit_code"] == 4
+    assert error["process"]["pid"] == os.getpid()
@@ -0,0 +1,56 @@
+"""Test command resource accounting"""
+
+from pathlib import Path
+import asyncio
+import sys
+
+import pytest
+
+from libpvarki.shell import USAGE_REGISTRY, CmdUsage, call_cmd, call_exec
+
+BURN_CPU = "sum(range(3_000_000))"
+BIG_RSS = "b = bytearray(64 * 1024 * 1024); b[::4096] = b'x' * (len(b) // 4096)"
+
+
+@pytest.mark.asyncio
+async def test_exec_usage() -> None:
+    """CPU time and max RSS of the child, aggregated in the registry"""
+    USAGE_REGISTRY.clear()
+    code, stdout, stderr, usage = await call_exec(
+        [sys.executable, "-c", f"{BURN_CPU}; {BIG_RSS}; print('ok')"], usage=True
+    )
+    assert (code, stdout, stderr) == (0, "ok\n", "")
+    assert isinstance(usage, CmdUsage)
+    assert usage.cpu_time > 0.01
+    assert usage.wall_time >= usage.user_time * 0.5
+    assert usage.max_rss > 64 * 1024
+    stats = USAGE_REGISTRY.snapshot()[Path(sys.executable).name]
+    assert stats.calls == 1
+    assert stats.cpu_time == pytest.approx(usage.cpu_time)
+
+
+@pytest.mark.asyncio
+async def test_cmd_usage_includes_descendants() -> None:
+    """The shell's children count too, the registry groups by executable"""
+    USAGE_REGISTRY.clear()
+    for _ in range(2):
+        code, _, _, usage = await call_cmd(f"{sys.executable} -c '{BURN_CPU}'; exit 3", usage=True)
+        assert code == 3
+        assert usage.cpu_time > 0.01
+    await call_cmd("true", usage=True)
+    top = USAGE_REGISTRY.top(2)
+    assert top[0][0] == Path(sys.executable).name
+    assert top[0][1].calls == 2
+
+
+@pytest.mark.asyncio
+async def test_usage_timeout(tmp_path: Path) -> None:
+    """Timeout kills and reaps"""
+    with pytest.raises(asyncio.TimeoutError):
+        await call_exec(["sleep", "30"], timeout=0.3, usage=True, cwd=tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_default_contract() -> None:
+    """Without usage the result is the same 3-tuple as always"""
+    assert await call_cmd("echo hi") == (0, "hi\n", "")
@@ -0,0 +1,165 @@
+"""Test the durable AUDIT sink"""
+
+from typing import Any, List
+from pathlib import Path
+import json
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from libpvarki.logging import AuditLogHandler, iter_audit_records, init_logging, add_trace_and_audit
+from libpvarki.logging.audit import segment_paths
+
+from .conftest import RecordFactory
+
+LOGGER = logging.getLogger(__name__)
+AUDIT = logging.CRITICAL + 5
+
+
+def test_group_commit(tmp_path: Path, make_record: RecordFactory) -> None:
+    """Concurrent writers share commits and everything is readable afterwards"""
+    handler = AuditLogHandler(tmp_path, batch_size=64, commit_interval=0.005)
+
+    def writer(thread_no: int) -> None:
+        for idx in range(50):
+            handler.handle(make_record("thread %d record %d", thread_no, idx, level=AUDIT))
+
+    threads = [threading.Thread(target=writer, args=(thread_no,)) for thread_no in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = handler.stats()
+    handler.close()
+    LOGGER.info("audit stats: {}".format(stats))
+    assert stats.records == 400
+    assert stats.batches < 400
+    assert stats.latency_max >= stats.latency_p99 >= stats.latency_p50 > 0
+
+    messages = [json.loads(line)["message"] for line in iter_audit_records(tmp_path)]
+    assert len(messages) == 400
+    assert sorted(messages) == sorted(f"thread {tno} record {idx}" for tno in range(8) for idx in range(50))
+
+
+def test_torn_tail_recovery(tmp_path: Path, make_record: RecordFactory) -> None:
+    """Garbage at the end of the last segment is truncated away on restart"""
+    handler = AuditLogHandler(tmp_path)
+    handler.handle(make_record("first", level=AUDIT))
+    handler.close()
+    segment = segment_paths(tmp_path)[-1]
+    with segment.open("ab") as fpntr:
+        fpntr.write(b'00000100 deadbeef {"half": ')
+
+    assert len(list(iter_audit_records(tmp_path))) == 1
+    handler = AuditLogHandler(tmp_path)
+    handler.handle(make_record("second", level=AUDIT))
+    handler.close()
+    assert [json.loads(line)["message"] for line in iter_audit_records(tmp_path)] == ["first", "second"]
+
+
+class FailingWriter:  # pylint: disable=R0903
+    """os.write that fails the next `failures` writes, after writing part of the data if partial is set"""
+
+    def __init__(self, exc: Exception, partial: bool) -> None:
+        """init"""
+        self.exc = exc
+        self.partial = partial
+        self.failures = 0
+        self.real_write = os.write
+
+    def __call__(self, fd: int, data: Any) -> int:
+        """Write or fail"""
+        if self.failures:
+            self.failures -= 1
+            if self.partial:
+                self.real_write(fd, bytes(data)[: len(data) // 2])
+            raise self.exc
+        return self.real_write(fd, data)
+
+
+@pytest.mark.parametrize(
+    "exc, partial",
+    [
+        pytest.param(OSError(28, "No space left on device"), True, id="torn-oserror"),
+        pytest.param(RuntimeError("unexpected"), False, id="other-exception"),
+    ],
+)
+def test_failed_write(
+    tmp_path: Path, make_record: RecordFactory, monkeypatch: pytest.MonkeyPatch, exc: Exception, partial: bool
+) -> None:
+    """The failed record is reported, a torn frame does not hide later records and the writer keeps going"""
+    writer = FailingWriter(exc, partial)
+    monkeypatch.setattr(os, "write", writer)
+    handler = AuditLogHandler(tmp_path)
+    errors: List[str] = []
+    monkeypatch.setattr(handler, "handleError", lambda record: errors.append(record.getMessage()))
+    handler.handle(make_record("first", level=AUDIT))
+    writer.failures = 1
+    handler.handle(make_record("failed", level=AUDIT))
+    handler.handle(make_record("after", level=AUDIT))
+    handler.close()
+    monkeypatch.undo()
+
+    assert errors == ["failed"]
+    stats = handler.stats()
+    assert (stats.failed_records, stats.failed_batches, stats.records) == (1, 1, 2)
+    assert [json.loads(line)["message"] for line in iter_audit_records(tmp_path)] == ["first", "after"]
+    # Nothing is cut away on restart either
+    handler = AuditLogHandler(tmp_path)
+    handler.close()
+    assert [json.loads(line)["message"] for line in iter_audit_records(tmp_path)] == ["first", "after"]
+
+
+def test_failures_before_waiters_wake(
+    tmp_path: Path, make_record: RecordFactory, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A later failed batch does not hide the failure of an earlier one from its waiters"""
+    writer = FailingWriter(OSError(5, "Input/output error"), False)
+    writer.failures = 2
+    monkeypatch.setattr(os, "write", writer)
+    handler = AuditLogHandler(tmp_path, commit_interval=0)
+    # Both batches fail before either caller gets to check
+    first = handler._enqueue(b"first", True)  # pylint: disable=W0212
+    while handler.stats().failed_batches < 1:
+        time.sleep(0.001)
+    second = handler._enqueue(b"second", True)  # pylint: disable=W0212
+    while handler.stats().failed_batches < 2:
+        time.sleep(0.001)
+    for seq in (first, second):
+        with pytest.raises(OSError):
+            handler._wait_committed(seq)  # pylint: disable=W0212
+    handler.handle(make_record("after", level=AUDIT))
+    handler.close()
+    assert handler._failed == []  # pylint: disable=W0212
+    assert handler.stats().failed_records == 2
+    assert [json.loads(line)["message"] for line in iter_audit_records(tmp_path)] == ["after"]
+
+
+def test_rotation(tmp_path: Path, make_record: RecordFactory) -> None:
+    """Segments are rotated by size"""
+    handler = AuditLogHandler(tmp_path, segment_size=2048, wait_for_commit=False)
+    for idx in range(20):
+        handler.handle(make_record("record %d", idx, level=AUDIT))
+    handler.flush()
+    handler.close()
+    assert len(segment_paths(tmp_path)) > 1
+    assert [json.loads(line)["message"] for line in iter_audit_records(tmp_path)] == [
+        f"record {idx}" for idx in range(20)
+    ]
+
+
+def test_init_logging_audit(tmp_path: Path, monkeypatch: Any) -> None:
+    """AUDIT records go to the sink, others do not"""
+    monkeypatch.setenv("LOG_AUDIT_DIR", str(tmp_path / "audit"))
+    add_trace_and_audit()
+    init_logging(logging.INFO)
+    LOGGER.error("not audited")
+    LOGGER.audit("user %s was granted admin", "KISSA23a")  # type: ignore[attr-defined]  #  pylint: disable=E1101
+    monkeypatch.delenv("LOG_AUDIT_DIR")
+    init_logging(logging.DEBUG)  # closes the handler
+    assert [json.loads(line)["message"] for line in iter_audit_records(tmp_path / "audit")] == [
+        "user KISSA23a was granted admin"
+    ]
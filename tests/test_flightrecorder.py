@@ -0,0 +1,59 @@
+"""Test the flight recorder"""
+
+from typing import Any
+import json
+import logging
+
+from libpvarki.logging import FlightRecorderHandler, dump_flight_recorders, init_logging, add_trace_and_audit
+
+from .conftest import ListHandler, RecordFactory
+
+
+def test_ring_buffer(list_handler: ListHandler, make_record: RecordFactory) -> None:
+    """Only the last capacity records are kept and dumped in order on error"""
+    recorder = FlightRecorderHandler(3, list_handler)
+    for idx in range(5):
+        recorder.handle(make_record("debug %d", idx, level=logging.DEBUG))
+    recorder.handle(make_record("info is not recorded", level=logging.INFO))
+    assert len(recorder) == 3
+    assert not list_handler.records
+
+    recorder.handle(make_record("boom", level=logging.ERROR))
+    assert [record.getMessage() for record in list_handler.records] == ["debug 2", "debug 3", "debug 4"]
+    assert all(getattr(record, "flight_recorder") for record in list_handler.records)
+    assert len(recorder) == 0
+    recorder.close()
+
+
+def test_manual_dump(list_handler: ListHandler, make_record: RecordFactory) -> None:
+    """Dump via the API, extras are kept"""
+    recorder = FlightRecorderHandler(10, list_handler)
+    record = make_record("with extras", level=logging.DEBUG)
+    record.__dict__["http.request.id"] = "req1"
+    recorder.handle(record)
+    assert recorder.snapshot()[0].getMessage() == "with extras"
+    assert dump_flight_recorders() >= 1
+    assert list_handler.records[0].__dict__["http.request.id"] == "req1"
+    assert list_handler.records[0].created == record.created
+    recorder.close()
+
+
+def test_init_logging_flight_recorder(capsys: Any, monkeypatch: Any) -> None:
+    """TRACE and DEBUG are only output once an error happens"""
+    monkeypatch.setenv("LOG_FLIGHT_RECORDER_SIZE", "100")
+    add_trace_and_audit()
+    init_logging(logging.INFO)
+    logger = logging.getLogger(__name__)
+    logger.trace("Context trace")  # type: ignore[attr-defined]  #  pylint: disable=E1101
+    logger.debug("Context debug")
+    logger.info("Normal info")
+    _, stderr = capsys.readouterr()
+    assert [json.loads(line)["message"] for line in stderr.splitlines()] == ["Normal info"]
+
+    logger.error("Something broke")
+    _, stderr = capsys.readouterr()
+    parsed = [json.loads(line) for line in stderr.splitlines()]
+    assert [line["message"] for line in parsed] == ["Context trace", "Context debug", "Something broke"]
+    assert parsed[0]["flight_recorder"] is True
+    monkeypatch.delenv("LOG_FLIGHT_RECORDER_SIZE")
+    init_logging(logging.DEBUG)
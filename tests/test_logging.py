@@ -5,8 +5,18 @@ import logging
 import datetime
 import json
 import re
+import sys
 
-from libpvarki.logging import DEFAULT_LOG_FORMAT, init_logging, add_trace_and_audit
+import ecs_logging
+
+from libpvarki.logging import (
+    DEFAULT_LOG_FORMAT,
+    init_logging,
+    add_trace_and_audit,
+    ECSFormatter,
+    UTCISOFormatter,
+    labels_context,
+)
 
 
 def test_log_format() -> None:
@@ -41,7 +51,7 @@ def test_logging_ecs(capsys: Any, monkeypatch: Any) -> None:
     logging.getLogger(__name__).audit("Test message audit")  # type: ignore[attr-defined]  #  pylint: disable=E1101
 
     # Check that the log lines start as expected
-    (_, stderr) = capsys.readouterr()
+    _, stderr = capsys.readouterr()
     for line, level in zip(stderr.splitlines(), ("trace", "debug", "info", "warning", "error", "audit")):
         parsed = json.loads(line)
         assert parsed["log.level"] == level
@@ -65,10 +75,120 @@ def test_logging_oldskool(capsys: Any, monkeypatch: Any) -> None:
     logging.getLogger(__name__).audit("Test message audit")  # type: ignore[attr-defined]  #  pylint: disable=E1101
 
     # Check that the log lines start as expected
-    (_, stderr) = capsys.readouterr()
+    _, stderr = capsys.readouterr()
     assert re.search(isots_thismin_regex + re.escape("[TRACE]"), stderr, flags=re.MULTILINE)
     assert re.search(isots_thismin_regex + re.escape("[DEBUG]"), stderr, flags=re.MULTILINE)
     assert re.search(isots_thismin_regex + re.escape("[INFO]"), stderr, flags=re.MULTILINE)
     assert re.search(isots_thismin_regex + re.escape("[WARNING]"), stderr, flags=re.MULTILINE)
     assert re.search(isots_thismin_regex + re.escape("[ERROR]"), stderr, flags=re.MULTILINE)
     assert re.search(isots_thismin_regex + re.escape("[AUDIT]"), stderr, flags=re.MULTILINE)
+
+
+def test_ecs_formatter_compatible() -> None:
+    """Check that the native formatter gives the same output as ecs_logging"""
+    native = ECSFormatter()
+    reference = ecs_logging.StdlibFormatter()
+    record = logging.LogRecord("test.ecs", logging.INFO, __file__, 1, "Hello %s", ("wörld",), None, "func")
+    record.__dict__.update({"hierarchical.tag.value": "get", "http": {"method": "GET"}, "empty": None})
+    assert native.format(record) == reference.format(record)
+
+    try:
+        raise RuntimeError("oops")
+    except RuntimeError:
+        record = logging.LogRecord("test.ecs", logging.ERROR, __file__, 1, "Failed", None, sys.exc_info(), "func")
+    assert json.loads(native.format(record)) == json.loads(reference.format(record))
+    assert json.loads(native.format(record))["error"]["type"] == "RuntimeError"
+
+
+def test_ecs_formatter_static_extra() -> None:
+    """Static fields are added to all records"""
+    formatter = ECSFormatter(extra={"service.name": "testsvc"})
+    record = logging.LogRecord("test.ecs", logging.INFO, __file__, 1, "Hello", None, None)
+    record.__dict__["service.version"] = "1.0"
+    parsed = json.loads(formatter.format(record))
+    assert parsed["service"] == {"name": "testsvc", "version": "1.0"}
+
+
+def test_utc_timestamp_cache() -> None:
+    """Cached timestamps match the uncached ones, also with datefmt"""
+    cached = UTCISOFormatter()
+    uncached = UTCISOFormatter(cache_timestamps=False)
+    record = logging.LogRecord("test.utc", logging.INFO, __file__, 1, "Hello", None, None)
+    for created in (1700000000.0, 1700000000.9994, 1700000000.9999996, 1700000001.5, 1256636420.8549995):
+        record.created = created
+        for datefmt in (None, "%Y-%m-%d %H:%M:%S", "%H:%M:%S.%f"):
+            assert cached.formatTime(record, datefmt) == uncached.formatTime(record, datefmt)
+    record.created = 1700000000.25
+    assert cached.formatTime(record) == "2023-11-14T22:13:20.250Z"
+
+
+def test_logging_labels(capsys: Any, monkeypatch: Any) -> None:
+    """Check that global and context labels end up in the output"""
+    monkeypatch.setenv("LOG_GLOBAL_LABELS_JSON", '{"hierarchical.tag.value": "get", "another_global_tag": "ditto"}')
+    init_logging(logging.INFO)
+    logging.getLogger(__name__).info("Global labels only")
+    with labels_context({"http.request.id": "req1", "user.name": "KISSA23a"}):
+        logging.getLogger(__name__).info("With context labels")
+    logging.getLogger(__name__).info("Context labels gone")
+
+    _, stderr = capsys.readouterr()
+    lines = [json.loads(line) for line in stderr.splitlines()]
+    assert len(lines) == 3
+    for parsed in lines:
+        assert parsed["hierarchical"]["tag"]["value"] == "get"
+        assert parsed["another_global_tag"] == "ditto"
+    assert "http" not in lines[0]
+    assert lines[1]["http"]["request"]["id"] == "req1"
+    assert lines[1]["user"]["name"] == "KISSA23a"
+    assert "user" not in lines[2]
+
+
+def test_logging_labels_reset(capsys: Any, monkeypatch: Any) -> None:
+    """Re-init without the ENV removes the global labels"""
+    monkeypatch.delenv("LOG_GLOBAL_LABELS_JSON", raising=False)
+    init_logging(logging.INFO)
+    logging.getLogger(__name__).info("No labels")
+    _, stderr = capsys.readouterr()
+    assert "another_global_tag" not in json.loads(stderr.splitlines()[0])
+
+
+def test_custom_level_disabled_adapter() -> None:
+    """Disabled custom level on adapter does not process the call at all, enabled one keeps the defaults"""
+    add_trace_and_audit()
+
+    class CountingAdapter(logging.LoggerAdapter):  # type: ignore[type-arg]
+        """Count process() calls"""
+
+        calls = 0
+
+        def process(self, msg: Any, kwargs: Any) -> Any:
+            """Count and pass through"""
+            CountingAdapter.calls += 1
+            return msg, kwargs
+
+    logger = logging.getLogger("test.levels.adapter")
+    logger.setLevel(logging.INFO)
+    adapter = CountingAdapter(logger, {})
+    adapter.trace("disabled")  # type: ignore[attr-defined]  #  pylint: disable=E1101
+    assert CountingAdapter.calls == 0
+    logger.setLevel(logging.TRACE)  # type: ignore[attr-defined]  #  pylint: disable=E1101
+    adapter.trace("enabled")  # type: ignore[attr-defined]  #  pylint: disable=E1101
+    assert CountingAdapter.calls == 1
+    logger.setLevel(logging.NOTSET)
+
+
+def test_logging_labels_extra_collision(capsys: Any, monkeypatch: Any) -> None:
+    """Extras with the same key as a label win instead of blowing up the logging call"""
+    monkeypatch.setenv("LOG_GLOBAL_LABELS_JSON", '{"service.name": "global", "another_global_tag": "ditto"}')
+    init_logging(logging.INFO)
+    logger = logging.getLogger(__name__)
+    logger.info("Extra overrides global", extra={"service.name": "extra"})
+    with labels_context({"service.name": "context", "user.name": "KISSA23a"}):
+        logger.info("Context overrides global")
+        logger.info("Extra overrides context", extra={"user.name": "KOIRA42b"})
+
+    _, stderr = capsys.readouterr()
+    lines = [json.loads(line) for line in stderr.splitlines()]
+    assert [line["service"]["name"] for line in lines] == ["extra", "context", "context"]
+    assert [line["user"]["name"] for line in lines[1:]] == ["KISSA23a", "KOIRA42b"]
+    assert all(line["another_global_tag"] == "ditto" for line in lines)
@@ -0,0 +1,116 @@
+"""Test the metrics registry"""
+
+from typing import List
+import threading
+
+import pytest
+
+from libpvarki.metrics import Counter, Gauge, Histogram, MetricsRegistry, counter, gauge, histogram
+
+
+def test_counter_labels() -> None:
+    """Children per label values, exposition is sorted and escaped"""
+    registry = MetricsRegistry()
+    requests = counter("test_requests_total", "Requests", ("method",), registry=registry)
+    requests.labels(method="GET").inc()
+    requests.labels("GET").inc(2)
+    requests.labels(method='PO"ST').inc()
+    assert requests.labels(method="GET").value == 3
+    with pytest.raises(ValueError):
+        requests.labels(method="GET").inc(-1)
+    with pytest.raises(ValueError):
+        requests.labels("GET", "extra")
+    with pytest.raises(ValueError):
+        requests.labels(path="/")
+    assert registry.expose().splitlines() == [
+        "# HELP test_requests_total Requests",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{method="GET"} 3',
+        'test_requests_total{method="PO\\"ST"} 1',
+    ]
+
+
+def test_gauge() -> None:
+    """Up, down and set"""
+    registry = MetricsRegistry()
+    inflight = gauge("test_inflight", "In flight", registry=registry)
+    inflight.inc(3)
+    inflight.dec()
+    assert inflight.labels().value == 2
+    inflight.set(0.5)
+    assert registry.expose().splitlines()[-1] == "test_inflight 0.5"
+    inflight.set(float("nan"))
+    assert registry.expose().splitlines()[-1] == "test_inflight NaN"
+
+
+def test_histogram() -> None:
+    """Cumulative buckets with +Inf, sum and count"""
+    registry = MetricsRegistry()
+    latency = histogram("test_seconds", "Latency", ("op",), buckets=(1.0, 0.1), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.labels(op="x").observe(value)
+    with latency.time(op="y"):
+        pass
+
+    @latency.timed(op="z")
+    def work() -> int:
+        return 42
+
+    assert work() == 42
+    assert work.__name__ == "work"
+    lines = registry.expose().splitlines()
+    assert lines[2:7] == [
+        'test_seconds_bucket{op="x",le="0.1"} 2',
+        'test_seconds_bucket{op="x",le="1"} 3',
+        'test_seconds_bucket{op="x",le="+Inf"} 4',
+        'test_seconds_sum{op="x"} 3.65',
+        'test_seconds_count{op="x"} 4',
+    ]
+    assert 'test_seconds_count{op="y"} 1' in lines
+    assert 'test_seconds_count{op="z"} 1' in lines
+    latency.labels(op="nan").observe(float("nan"))
+    assert 'test_seconds_sum{op="nan"} NaN' in registry.expose().splitlines()
+
+
+def test_registry_get_or_create() -> None:
+    """Same name gives the same metric, another type is an error"""
+    registry = MetricsRegistry()
+    first = counter("test_total", "Doc", registry=registry)
+    assert counter("test_total", "Doc", registry=registry) is first
+    assert registry.get("test_total") is first
+    with pytest.raises(ValueError):
+        gauge("test_total", "Doc", registry=registry)
+    with pytest.raises(ValueError):
+        counter("test_total", "Doc", ("method",), registry=registry)
+    assert [type(metric) for metric in registry.metrics()] == [Counter]
+    assert isinstance(histogram("test_a", "Doc", registry=registry), Histogram)
+    assert isinstance(gauge("test_b", "Doc", registry=registry), Gauge)
+
+
+def test_help_escaping() -> None:
+    """HELP escapes backslashes and newlines but not quotes"""
+    registry = MetricsRegistry()
+    counter("test_total", 'Path "C:\\tmp"\nsecond line', registry=registry)
+    assert registry.expose().splitlines()[0] == '# HELP test_total Path "C:\\\\tmp"\\nsecond line'
+
+
+def test_concurrent_updates() -> None:
+    """No lost updates from threads"""
+    registry = MetricsRegistry()
+    hits = counter("test_hits_total", "Hits", ("worker",), registry=registry)
+    latency = histogram("test_latency_seconds", "Latency", registry=registry)
+
+    def work(worker: str) -> None:
+        for _ in range(2000):
+            hits.labels(worker=worker).inc()
+            hits.labels(worker="shared").inc()
+            latency.observe(0.01)
+
+    threads: List[threading.Thread] = [threading.Thread(target=work, args=(str(idx % 2),)) for idx in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert hits.labels(worker="shared").value == 8000
+    assert hits.labels(worker="0").value == 4000
+    assert latency.labels().snapshot()[2] == 8000
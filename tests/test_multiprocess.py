@@ -0,0 +1,101 @@
+"""Test the multi-process log aggregation"""
+
+from typing import Iterator, Tuple
+from pathlib import Path
+import json
+import logging
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from libpvarki.logging import AggregatingHandler, ECSFormatter, init_logging
+from libpvarki.logging.multiprocess import LogAggregator
+
+# pylint: disable=W0621
+RECORDS_PER_WORKER = 200
+WORKERS = 4
+
+
+@pytest.fixture
+def aggregator(tmp_path: Path) -> Iterator[Tuple[LogAggregator, threading.Thread]]:
+    """Aggregator serving in a thread, output to a file"""
+    output_fd = os.open(tmp_path / "output.log", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    server = LogAggregator(tmp_path / "log.sock", output_fd)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, thread
+    server.shutdown()
+    thread.join()
+    os.close(output_fd)
+
+
+def worker(socket_path: str, worker_no: int) -> None:
+    """Log big records through the aggregator"""
+    handler = AggregatingHandler(socket_path, batch_size=32, flush_interval=0.01)
+    handler.setFormatter(ECSFormatter())
+    logger = logging.getLogger(f"test.multiprocess.worker{worker_no}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    for idx in range(RECORDS_PER_WORKER):
+        logger.info("worker %d record %d %s", worker_no, idx, "x" * 8192)
+    handler.close()
+
+
+def test_workers_lines_stay_whole(aggregator: Tuple[LogAggregator, threading.Thread], tmp_path: Path) -> None:
+    """Big lines from many processes come out whole, with fewer writes than records"""
+    server, thread = aggregator
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=worker, args=(server.socket_path, worker_no)) for worker_no in range(WORKERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    server.shutdown()
+    thread.join()
+
+    lines = (tmp_path / "output.log").read_text(encoding="utf-8").splitlines()
+    messages = {json.loads(line)["message"].rsplit(" ", 1)[0] for line in lines}
+    assert len(lines) == WORKERS * RECORDS_PER_WORKER
+    assert messages == {
+        f"worker {worker_no} record {idx}" for worker_no in range(WORKERS) for idx in range(RECORDS_PER_WORKER)
+    }
+    assert server.counters["writes"] < len(lines)
+
+
+def test_fallback_without_aggregator(tmp_path: Path) -> None:
+    """Lines go to the fallback fd if the aggregator is not there"""
+    fallback_fd = os.open(tmp_path / "fallback.log", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    try:
+        handler = AggregatingHandler(tmp_path / "nothere.sock", fallback_fd=fallback_fd)
+        handler.handle(logging.LogRecord("test.multiprocess", logging.WARNING, __file__, 1, "hello", None, None))
+        handler.flush()
+        handler.close()
+    finally:
+        os.close(fallback_fd)
+    assert (tmp_path / "fallback.log").read_text(encoding="utf-8") == "hello\n"
+
+
+def test_init_logging_env(
+    aggregator: Tuple[LogAggregator, threading.Thread], monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """init_logging replaces the console handler when ENV is set"""
+    server, thread = aggregator
+    monkeypatch.setenv("LOG_AGGREGATOR_SOCKET", server.socket_path)
+    try:
+        init_logging(logging.DEBUG)
+        root = logging.getLogger()
+        console = next(handler for handler in root.handlers if handler.name == "console")
+        assert isinstance(console, AggregatingHandler)
+        logging.getLogger("test.multiprocess").info("via aggregator")
+        console.flush()
+    finally:
+        monkeypatch.delenv("LOG_AGGREGATOR_SOCKET")
+        init_logging(logging.DEBUG)
+    server.shutdown()
+    thread.join()
+    lines = (tmp_path / "output.log").read_text(encoding="utf-8").splitlines()
+    assert "via aggregator" in [json.loads(line)["message"] for line in lines]
@@ -0,0 +1,97 @@
+"""Test the rate-limiting filter"""
+
+from typing import Any, List
+import json
+import logging
+import time
+
+import pytest
+
+from libpvarki.logging import RateLimitFilter, init_logging
+
+from .conftest import FakeClock, RecordFactory
+
+
+def test_token_bucket_limits(fake_clock: FakeClock, make_record: RecordFactory) -> None:
+    """Burst passes, then one record per 1/rate seconds"""
+    clock = fake_clock
+    rlfilter = RateLimitFilter(rate=1.0, burst=3, summary_interval=1000, clock=clock)
+    passed = [rlfilter.filter(make_record("stderr: %s", idx)) for idx in range(10)]
+    assert passed == [True] * 3 + [False] * 7
+    # Other templates are not affected
+    assert rlfilter.filter(make_record("something else"))
+    clock.now += 1.0
+    assert rlfilter.filter(make_record("stderr: %s", 11))
+    assert not rlfilter.filter(make_record("stderr: %s", 12))
+    assert list(rlfilter.suppressed_counts().values()) == [8]
+
+
+def test_summary(caplog: pytest.LogCaptureFixture, fake_clock: FakeClock, make_record: RecordFactory) -> None:
+    """Summary is emitted through the original logger once the interval has passed"""
+    clock = fake_clock
+    rlfilter = RateLimitFilter(rate=1.0, burst=1, summary_interval=10, clock=clock)
+    logger = logging.getLogger("test.ratelimit.summary")
+    for idx in range(5):
+        rlfilter.filter(make_record("TLS failure %s", idx, name=logger.name))
+    clock.now += 11
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        assert rlfilter.filter(make_record("TLS failure %s", 99, name=logger.name))
+    summaries: List[logging.LogRecord] = [rec for rec in caplog.records if hasattr(rec, "suppressed_count")]
+    assert len(summaries) == 1
+    assert getattr(summaries[0], "suppressed_count") == 4
+    assert "Suppressed 4 similar records" in summaries[0].getMessage()
+    assert not rlfilter.suppressed_counts()
+
+
+def test_sampling(make_record: RecordFactory) -> None:
+    """Sampling rate 0 drops all, 1 keeps all"""
+    rlfilter = RateLimitFilter(rate=1000, burst=1000, sample_rates={"DEBUG": 0.0, logging.INFO: 1.0})
+    assert not any(rlfilter.filter(make_record("debug %s", idx, level=logging.DEBUG)) for idx in range(10))
+    assert all(rlfilter.filter(make_record("info %s", idx, level=logging.INFO)) for idx in range(10))
+    assert rlfilter.sampled_out == 10
+
+    with pytest.raises(ValueError):
+        RateLimitFilter(sample_rates={"NOSUCHLEVEL": 0.5})
+
+
+def test_init_logging_ratelimit(capsys: Any, monkeypatch: Any) -> None:
+    """Configure from ENV via init_logging"""
+    monkeypatch.setenv("LOG_RATELIMIT_JSON", '{"rate": 0.001, "burst": 2}')
+    init_logging(logging.INFO)
+    for idx in range(10):
+        logging.getLogger(__name__).warning("flapping %s", idx)
+    _, stderr = capsys.readouterr()
+    assert [json.loads(line)["message"] for line in stderr.splitlines()] == ["flapping 0", "flapping 1"]
+    monkeypatch.delenv("LOG_RATELIMIT_JSON")
+    init_logging(logging.DEBUG)
+
+
+def test_summary_after_silence(caplog: pytest.LogCaptureFixture, make_record: RecordFactory) -> None:
+    """A burst followed by no more records still gets its summary, from the timer"""
+    rlfilter = RateLimitFilter(rate=1.0, burst=1, summary_interval=0.05)
+    logger = logging.getLogger("test.ratelimit.silence")
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        for idx in range(5):
+            rlfilter.filter(make_record("TLS failure %s", idx, name=logger.name))
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            summaries = [rec for rec in caplog.records if hasattr(rec, "suppressed_count")]
+            if summaries:
+                break
+            time.sleep(0.01)
+    assert [getattr(rec, "suppressed_count") for rec in summaries] == [4]
+    rlfilter.close()
+
+
+def test_close_flushes(caplog: pytest.LogCaptureFixture, fake_clock: FakeClock, make_record: RecordFactory) -> None:
+    """Closing emits the pending summaries right away and stops the timer"""
+    clock = fake_clock
+    rlfilter = RateLimitFilter(rate=1.0, burst=1, summary_interval=1000, clock=clock)
+    logger = logging.getLogger("test.ratelimit.close")
+    for idx in range(3):
+        rlfilter.filter(make_record("TLS failure %s", idx, name=logger.name))
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        rlfilter.close()
+    summaries = [rec for rec in caplog.records if hasattr(rec, "suppressed_count")]
+    assert [getattr(rec, "suppressed_count") for rec in summaries] == [2]
+    assert rlfilter._timer is None  # pylint: disable=W0212
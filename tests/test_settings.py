@@ -0,0 +1,52 @@
+"""Test the settings snapshot"""
+
+from typing import List
+from pathlib import Path
+
+import pytest
+
+from libpvarki.settings import Settings, add_listener, get_settings, reload
+
+
+def test_defaults() -> None:
+    """Defaults match the old Config() defaults"""
+    settings = Settings.from_env({"PERSISTENT_DATA_PATH": "/tmp/data"})  # nosec
+    assert settings.local_ca_certs_path == Path("/ca_public")
+    assert settings.client_cert_path == Path("/tmp/data/public/mtlsclient.pem")  # nosec
+    assert settings.client_key_path == Path("/tmp/data/private/mtlsclient.key")  # nosec
+    assert settings.mtls_header_name == "x-clientcert-dn"
+    assert not settings.mtls_trust_l5d
+    assert not settings.mtls_trusted_ingress_identities
+
+
+def test_parsing() -> None:
+    """Values are cast and validated"""
+    settings = Settings.from_env(
+        {"MTLS_TRUST_L5D": "TRUE", "MTLS_REQUIRE_L5D": "0", "MTLS_TRUSTED_INGRESS_IDENTITIES": " a, b ,,"}
+    )
+    assert settings.mtls_trust_l5d and not settings.mtls_require_l5d
+    assert settings.mtls_trusted_ingress_identities == frozenset({"a", "b"})
+    with pytest.raises(ValueError):
+        Settings.from_env({"MTLS_TRUST_L5D": "yes please"})
+
+
+def test_snapshot_and_reload(datadir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Environment changes take effect on reload, listeners hear about actual changes only"""
+    seen: List[Settings] = []
+    remove = add_listener(seen.append)
+    try:
+        before = get_settings()
+        assert before.local_ca_certs_path == datadir / "ca_public"
+        assert get_settings() is before
+        monkeypatch.setenv("MTLS_HEADER_NAME", "X-Other")
+        assert get_settings().mtls_header_name == "x-clientcert-dn"
+        assert reload().mtls_header_name == "x-other"
+        reload()
+        assert len(seen) == 1 and seen[0] is get_settings()
+    finally:
+        remove()
+    monkeypatch.delenv("MTLS_HEADER_NAME")
+    reload()
+    assert len(seen) == 1
+    with pytest.raises(AttributeError):
+        get_settings().mtls_header_name = "nope"  # type: ignore[misc]
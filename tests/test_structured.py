@@ -0,0 +1,107 @@
+"""Test the lazy structured logging facade"""
+
+from typing import List
+import json
+import logging
+
+import pytest
+
+from libpvarki.logging import ECSFormatter, Lazy, RateLimitFilter, get_logger
+
+from .conftest import ListHandler
+
+
+class Expensive:  # pylint: disable=R0903
+    """Count how many times we get formatted"""
+
+    def __init__(self) -> None:
+        """init"""
+        self.formatted = 0
+
+    def __format__(self, format_spec: str) -> str:
+        """Count and return a constant"""
+        self.formatted += 1
+        return "expensive"
+
+
+def test_disabled_does_nothing() -> None:
+    """Nothing gets formatted or called when the level is disabled"""
+    logger = get_logger("test.structured.disabled")
+    logger.logger.setLevel(logging.INFO)
+    value = Expensive()
+    calls: List[int] = []
+    logger.debug("value={value} lazy={lazy}", value=value, lazy=Lazy(calls.append, 1))
+    logger.trace("value={value}", value=value)
+    assert value.formatted == 0
+    assert not calls
+    logger.logger.setLevel(logging.NOTSET)
+
+
+def test_enabled_record(caplog: pytest.LogCaptureFixture) -> None:
+    """Message is formatted from the template, fields become (dotted) extras, caller is the call site"""
+    logger = get_logger("test.structured.enabled")
+    calls: List[int] = []
+
+    def compute() -> int:
+        calls.append(1)
+        return 42
+
+    with caplog.at_level(logging.DEBUG, logger=logger.name):
+        logger.info("Wrote {file__path} ({size} bytes)", file__path="/tmp/foo", size=Lazy(compute), name="clash")
+    record = caplog.records[-1]
+    assert record.getMessage() == "Wrote /tmp/foo (42 bytes)"
+    assert record.getMessage() == "Wrote /tmp/foo (42 bytes)"
+    assert calls == [1]
+    assert getattr(record, "file.path") == "/tmp/foo"
+    assert getattr(record, "labels.name") == "clash"
+    assert record.name == logger.name
+    assert record.funcName == "test_enabled_record"
+    assert record.filename == "test_structured.py"
+
+
+def test_exception(caplog: pytest.LogCaptureFixture) -> None:
+    """exception() adds the exc_info"""
+    logger = get_logger("test.structured.exception")
+    with caplog.at_level(logging.DEBUG, logger=logger.name):
+        try:
+            raise ValueError("nope")
+        except ValueError:
+            logger.exception("Failed {what}", what="badly")
+    record = caplog.records[-1]
+    assert record.levelno == logging.ERROR
+    assert record.exc_info and record.exc_info[0] is ValueError
+
+
+def test_ecs_output(list_handler: ListHandler) -> None:
+    """ECS formatter outputs the fields as keys, lazy values resolved once"""
+    calls: List[int] = []
+
+    def compute() -> str:
+        calls.append(1)
+        return "computed"
+
+    logger = get_logger("test.structured.ecs")
+    logger.logger.addHandler(list_handler)
+    try:
+        logger.warning("{user__name} did {event__action}", user__name="KISSA23a", event__action=Lazy(compute))
+    finally:
+        logger.logger.removeHandler(list_handler)
+    parsed = json.loads(ECSFormatter().format(list_handler.records[0]))
+    assert parsed["message"] == "KISSA23a did computed"
+    assert parsed["user"] == {"name": "KISSA23a"}
+    assert parsed["event"] == {"action": "computed"}
+    assert calls == [1]
+
+
+def test_ratelimit_uses_template(list_handler: ListHandler) -> None:
+    """Structured records are grouped by their template"""
+    logger = get_logger("test.structured.ratelimit")
+    logger.logger.addHandler(list_handler)
+    try:
+        for idx in range(3):
+            logger.warning("first {idx}", idx=idx)
+            logger.warning("second {idx}", idx=idx)
+    finally:
+        logger.logger.removeHandler(list_handler)
+    keys = {RateLimitFilter.record_key(record) for record in list_handler.records}
+    assert {key[2] for key in keys} == {"first {idx}", "second {idx}"}